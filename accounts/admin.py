@@ -9,6 +9,7 @@ from django.shortcuts import redirect
 from django.urls import path, reverse
 from typing import Optional
 # ← ویجت شمسی
+from common.jalali import jalali_str
 from common.widgets import PersianDateWidget
 from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
 from django.core.serializers.json import DjangoJSONEncoder
@@ -106,17 +107,9 @@ def _looks_greg(s: str) -> bool:
     import re
     return bool(re.fullmatch(r"\d{4}-\d{2}-\d{2}", _fa2en(s or "")))
 
-# میلادی → شمسی (با jdatetime؛ در نبودش همون ورودی برمی‌گرده)
+# میلادی → شمسی (نامعتبر: همون ورودی برمی‌گرده)
 def _greg_to_jalali_str(greg: str) -> str:
-    try:
-        import datetime as _dt
-        import jdatetime as _jd  # pip install jdatetime
-        y, m, d = map(int, _fa2en(greg).split("-"))
-        dt = _dt.date(y, m, d)
-        j = _jd.date.fromgregorian(date=dt)
-        return j.strftime("%Y/%m/%d")
-    except Exception:
-        return greg
+    return jalali_str(greg) or greg
 
 # نرمال‌سازی ورودی کاربر: پذیرش ۱۴۰۳/۰۴/۱۰ یا 1993-01-30
 def _normalize_birth_input(value: str) -> str:
@@ -318,17 +311,11 @@ class PendingRejectWithSmsMixin:
 # فرم‌ها (نمایش شمسی با PersianDateWidget)
 # -------------------------------
 import datetime as _dt
-import jdatetime as _jd
 
 def _date_to_jalali_str(val) -> str:
     """datetime/date میلادی → 'YYYY/MM/DD' شمسی"""
-    if isinstance(val, _dt.datetime):
-        val = val.date()
     if isinstance(val, _dt.date):
-        try:
-            return _jd.date.fromgregorian(date=val).strftime("%Y/%m/%d")
-        except Exception:
-            return ""
+        return jalali_str(val) or ""
     return _normalize_birth_input(str(val or ""))
 
 class UserProfileAdminFormWithJalali(forms.ModelForm):
@@ -0,0 +1,92 @@
+# accounts/dashboard.py
+"""
+شمارنده‌های داشبورد باشگاه و هیئت.
+
+همهٔ شمارش‌ها و جمع مدال/امتیاز اعضا با یک کوئری aggregate شرطی حساب و برای مدت کوتاهی
+(DASHBOARD_CACHE_TIMEOUT) به‌ازای هر باشگاه/هیئت کش می‌شوند. ذخیرهٔ پروفایل (از جمله تأیید
+پروفایل‌های در انتظار)، تغییر باشگاه‌های مربی و ثبت نتیجهٔ مسابقه کش را باطل می‌کنند.
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+CACHE_PREFIX = "dashboard"
+
+MEDAL_FIELDS = (
+    "gold_medals", "silver_medals", "bronze_medals",
+    "gold_medals_country", "silver_medals_country", "bronze_medals_country",
+    "gold_medals_int", "silver_medals_int", "bronze_medals_int",
+)
+
+
+def _key(kind: str, pk: int) -> str:
+    return f"{CACHE_PREFIX}:{kind}:{pk}"
+
+
+def _cached(kind, pk, build):
+    key = _key(kind, pk)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, settings.DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def _medal_sums(members: Q) -> dict:
+    return {f: Sum(f, default=0, filter=members) for f in MEDAL_FIELDS}
+
+
+def club_counters(club) -> dict:
+    """شاگردان، مربیان (coaching_clubs)، جمع مدال‌ها و امتیاز اعضای باشگاه."""
+    from .models import UserProfile
+
+    def build():
+        members = Q(club=club)
+        coaches = Q(is_coach=True) & Q(Exists(
+            UserProfile.coaching_clubs.through.objects.filter(userprofile_id=OuterRef("pk"), tkdclub_id=club.pk)
+        ))
+        return UserProfile.objects.filter(members | coaches).aggregate(
+            student_count=Count("id", filter=members & Q(role="player")),
+            coach_count=Count("id", filter=coaches),
+            ranking_competition=Sum("ranking_competition", default=0, filter=members),
+            ranking_total=Sum("ranking_total", default=0, filter=members),
+            **_medal_sums(members),
+        )
+
+    return _cached("club", club.pk, build)
+
+
+def board_counters(board) -> dict:
+    """شاگردان، مربیان، داوران، باشگاه‌ها و جمع مدال‌های اعضای هیئت."""
+    from .models import TkdBoard, TkdClub
+
+    def build():
+        # پایهٔ کوئری خود هیئت است (LEFT JOIN اعضا) تا هیئت بی‌عضو هم یک ردیف بدهد؛
+        # شمار باشگاه‌ها زیرکوئری ثابتی است که در همان aggregate می‌آید.
+        clubs = (
+            TkdClub.objects.filter(tkd_board=board).order_by()
+            .values("tkd_board").annotate(c=Count("pk")).values("c")
+        )
+        return TkdBoard.objects.filter(pk=board.pk).aggregate(
+            student_count=Count("userprofile", filter=Q(userprofile__role="player")),
+            coach_count=Count("userprofile", filter=Q(userprofile__is_coach=True)),
+            referee_count=Count("userprofile", filter=Q(userprofile__is_referee=True)),
+            club_count=Coalesce(Max(Subquery(clubs)), 0),
+            **{f: Sum(f"userprofile__{f}", default=0) for f in MEDAL_FIELDS},
+        )
+
+    return _cached("board", board.pk, build)
+
+
+def invalidate_dashboards(club_ids: Iterable[int] = (), board_ids: Iterable[int] = ()) -> None:
+    """باطل‌کردن کش بعد از commit (تا خواننده‌ای دادهٔ قدیمی را دوباره کش نکند)."""
+    keys = [_key("club", pk) for pk in set(club_ids) if pk]
+    keys += [_key("board", pk) for pk in set(board_ids) if pk]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
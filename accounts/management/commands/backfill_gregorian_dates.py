@@ -0,0 +1,42 @@
+# accounts/management/commands/backfill_gregorian_dates.py
+"""
+همگام‌سازی ستون‌های میلادی (birth_date_greg، belt_certificate_date_greg) با رشته‌های شمسی پروفایل‌ها؛
+بعد از ویرایش‌های گروهی (queryset.update / import) که save را صدا نمی‌زنند اجرا شود:
+    python manage.py backfill_gregorian_dates
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "همگام‌سازی تاریخ‌های میلادی پروفایل‌ها از تاریخ‌های شمسی"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        size = opts["batch_size"]
+        fields = list(UserProfile.GREGORIAN_DATE_FIELDS.values())
+        qs = UserProfile.objects.order_by("pk").only("pk", *UserProfile.GREGORIAN_DATE_FIELDS, *fields)
+
+        total = fixed = 0
+        batch = []
+        for p in qs.iterator(chunk_size=size):
+            total += 1
+            if p.sync_gregorian_dates():
+                batch.append(p)
+            if len(batch) >= size:
+                fixed += self._flush(batch, fields)
+        fixed += self._flush(batch, fields)
+        self.stdout.write(self.style.SUCCESS(f"{fixed} از {total} پروفایل به‌روز شد"))
+
+    @staticmethod
+    def _flush(batch, fields):
+        n = len(batch)
+        if n:
+            with transaction.atomic():
+                UserProfile.objects.bulk_update(batch, fields)
+            batch.clear()
+        return n
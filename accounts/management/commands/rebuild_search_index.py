@@ -0,0 +1,20 @@
+# accounts/management/commands/rebuild_search_index.py
+"""
+ساخت دوبارهٔ ایندکس جست‌وجوی پروفایل‌ها (ProfileSearchToken)؛
+بعد از ویرایش‌های گروهی (queryset.update) که سیگنال ندارند اجرا شود:
+    python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+
+from accounts.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "بازسازی ایندکس جست‌وجوی کاربران"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        count = rebuild_index(batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"ایندکس {count} پروفایل ساخته شد"))
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.13 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_profilechangehistory'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tkdclub',
+            index=models.Index(fields=['tkd_board', 'club_name'], name='accounts_tk_tkd_boa_7f39c0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tkdclub',
+            index=models.Index(fields=['tkd_board', 'founder_name'], name='accounts_tk_tkd_boa_748a31_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.13 on 2026-10-18 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+import unicodedata
+
+
+# نسخهٔ ثابت نرمال‌سازی و توکن‌سازی accounts.search در زمان این مهاجرت؛
+# تغییرات بعدی آن نباید خروجی این مهاجرت را عوض کند.
+_FOLD = str.maketrans({
+    "\u064a": "\u06cc", "\u0649": "\u06cc", "\u0626": "\u06cc",
+    "\u0643": "\u06a9",
+    "\u0629": "\u0647", "\u06c0": "\u0647",
+    "\u0623": "\u0627", "\u0625": "\u0627", "\u0622": "\u0627", "\u0671": "\u0627",
+    "\u0624": "\u0648",
+    "\u200c": "", "\u200d": "", "\u0640": "",
+    **{c: str(i % 10) for i, c in enumerate("\u06f0\u06f1\u06f2\u06f3\u06f4\u06f5\u06f6\u06f7\u06f8\u06f9"
+                                           "\u0660\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668\u0669")},
+})
+_DIACRITICS = re.compile("[\u064B-\u065F\u0670]")
+_SEPARATORS = re.compile(r"[^\w]+")
+
+
+def _normalize(text):
+    s = unicodedata.normalize("NFKC", str(text or "")).translate(_FOLD)
+    s = _DIACRITICS.sub("", s).lower()
+    return " ".join(_SEPARATORS.sub(" ", s).split())
+
+
+def _normalize_phone(text):
+    digits = "".join(ch for ch in _normalize(text) if ch.isdigit())
+    if digits.startswith("0098"):
+        digits = "0" + digits[4:]
+    elif digits.startswith("98") and len(digits) == 12:
+        digits = "0" + digits[2:]
+    elif digits.startswith("9") and len(digits) == 10:
+        digits = "0" + digits
+    return digits
+
+
+def _profile_tokens(p):
+    tokens = set(_normalize(p.first_name).split()) | set(_normalize(p.last_name).split())
+    tokens.add("".join(_normalize(p.national_code).split()))
+    tokens.add(_normalize_phone(p.phone))
+    return {t[:64] for t in tokens if t}
+
+
+def build_search_index(apps, schema_editor):
+    UserProfile = apps.get_model("accounts", "UserProfile")
+    ProfileSearchToken = apps.get_model("accounts", "ProfileSearchToken")
+    batch = []
+    for p in UserProfile.objects.only("pk", "first_name", "last_name", "national_code", "phone").iterator(chunk_size=500):
+        batch.extend(ProfileSearchToken(profile_id=p.pk, token=t) for t in _profile_tokens(p))
+        if len(batch) >= 2000:
+            ProfileSearchToken.objects.bulk_create(batch)
+            batch = []
+    ProfileSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_tkdclub_board_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='accounts.userprofile')),
+            ],
+            options={
+                'verbose_name': 'کلمهٔ جست\u200cوجو',
+                'verbose_name_plural': 'ایندکس جست\u200cوجوی کاربران',
+                'indexes': [models.Index(fields=['token', 'profile'], name='accounts_pr_token_58ebb1_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='profilesearchtoken',
+            constraint=models.UniqueConstraint(fields=('profile', 'token'), name='uniq_profile_search_token'),
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
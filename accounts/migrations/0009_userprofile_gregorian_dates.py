@@ -0,0 +1,69 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:10
+
+import datetime
+import re
+
+import jdatetime
+from django.db import migrations, models
+
+
+# نسخهٔ ثابت تبدیل رشتهٔ تاریخ در زمان این مهاجرت (مستقل از common.jalali)
+_DIGITS = str.maketrans("\u06f0\u06f1\u06f2\u06f3\u06f4\u06f5\u06f6\u06f7\u06f8\u06f9"
+                        "\u0660\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668\u0669",
+                        "01234567890123456789")
+_BIDI = re.compile("[\u200c\u200e\u200f\u202a-\u202e]")
+_YMD = re.compile(r"(\d{4})[/\-.](\d{1,2})[/\-.](\d{1,2})")
+
+
+def parse_date(value):
+    """رشتهٔ «۱۴۰۳/۰۴/۱۰» / «2024-06-30» → datetime.date میلادی؛ نامعتبر → None."""
+    if not value:
+        return None
+    s = _BIDI.sub("", str(value)).translate(_DIGITS).strip()
+    if "T" in s:
+        s = s.split("T", 1)[0]
+    m = _YMD.fullmatch(s)
+    if not m:
+        return None
+    y, mo, d = map(int, m.groups())
+    try:
+        if y < 1700:
+            g = jdatetime.date(y, mo, d).togregorian()
+            return datetime.date(g.year, g.month, g.day)
+        return datetime.date(y, mo, d)
+    except ValueError:
+        return None
+
+
+def backfill_gregorian_dates(apps, schema_editor):
+    UserProfile = apps.get_model("accounts", "UserProfile")
+    batch = []
+    for p in UserProfile.objects.only("pk", "birth_date", "belt_certificate_date").iterator(chunk_size=500):
+        p.birth_date_greg = parse_date(p.birth_date)
+        p.belt_certificate_date_greg = parse_date(p.belt_certificate_date)
+        batch.append(p)
+        if len(batch) >= 500:
+            UserProfile.objects.bulk_update(batch, ["birth_date_greg", "belt_certificate_date_greg"])
+            batch = []
+    UserProfile.objects.bulk_update(batch, ["birth_date_greg", "belt_certificate_date_greg"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_profilesearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='belt_certificate_date_greg',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='تاریخ گواهی کمربند (میلادی)'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='birth_date_greg',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True, verbose_name='تاریخ تولد (میلادی)'),
+        ),
+        migrations.RunPython(backfill_gregorian_dates, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from accounts.utils.file_utils import clean_filename
+from common.jalali import parse_date
 
 User = get_user_model()
 
@@ -108,6 +109,11 @@ class TkdClub(models.Model):
                 name="uniq_club_name_city",
             ),
         ]
+        indexes = [
+            # فهرست باشگاه‌های هیئت: فیلتر هیئت + جست‌وجوی پیشوندی/مرتب‌سازی نام
+            models.Index(fields=["tkd_board", "club_name"]),
+            models.Index(fields=["tkd_board", "founder_name"]),
+        ]
 
 class PendingClub(models.Model):
     club_name = models.CharField("نام باشگاه", max_length=100)
@@ -193,6 +199,8 @@ class UserProfile(models.Model):
     father_name = models.CharField("نام پدر", max_length=50)
     national_code = models.CharField("کد ملی", max_length=10, unique=True)
     birth_date = models.CharField("تاریخ تولد", max_length=10, help_text="فرمت: ۱۴۰۳/۰۴/۱۰")
+    # نسخهٔ میلادیِ تاریخ‌های متنی (با save همگام می‌شوند) برای فیلتر بازهٔ سنی در SQL
+    birth_date_greg = models.DateField("تاریخ تولد (میلادی)", null=True, blank=True, editable=False, db_index=True)
     gender = models.CharField("جنسیت", max_length=10, choices=GENDER_CHOICES)
     phone = models.CharField("شماره موبایل", max_length=11, unique=True, db_index=True)
     role = models.CharField("نقش", max_length=10, choices=ROLE_CHOICES, default="player")
@@ -232,6 +240,7 @@ class UserProfile(models.Model):
     belt_certificate_date = models.CharField(
         "تاریخ گواهی کمربند", max_length=10, help_text="فرمت: ۱۴۰۳/۰۴/۱۰"
     )
+    belt_certificate_date_greg = models.DateField("تاریخ گواهی کمربند (میلادی)", null=True, blank=True, editable=False)
 
     is_coach = models.BooleanField("مربی است؟", default=False)
     coach_level = models.CharField("درجه مربیگری", max_length=20, choices=DEGREE_CHOICES, null=True, blank=True)
@@ -268,15 +277,61 @@ class UserProfile(models.Model):
     confirm_info = models.BooleanField("اطلاعات تأیید شده", default=False)
     created_at = models.DateTimeField("تاریخ ایجاد", auto_now_add=True)
 
+    # فیلد متنی شمسی → فیلد میلادی همگام
+    GREGORIAN_DATE_FIELDS = {
+        "birth_date": "birth_date_greg",
+        "belt_certificate_date": "belt_certificate_date_greg",
+    }
+
     def __str__(self):
         full = f"{self.first_name or ''} {self.last_name or ''}".strip()
         return full or (self.phone or f"کاربر #{self.pk}")
 
+    def sync_gregorian_dates(self):
+        """فیلدهای میلادی را از رشته‌های شمسی حساب می‌کند؛ نام فیلدهای تغییرکرده را برمی‌گرداند."""
+        changed = []
+        for src, dst in self.GREGORIAN_DATE_FIELDS.items():
+            value = parse_date(getattr(self, src))
+            if getattr(self, dst) != value:
+                setattr(self, dst, value)
+                changed.append(dst)
+        return changed
+
+    def save(self, *args, **kwargs):
+        self.sync_gregorian_dates()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            extra = [dst for src, dst in self.GREGORIAN_DATE_FIELDS.items() if src in update_fields]
+            kwargs["update_fields"] = list({*update_fields, *extra})
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "کاربر"
         verbose_name_plural = " کاربران"
 
 
+class ProfileSearchToken(models.Model):
+    """
+    ایندکس جست‌وجوی پروفایل‌ها: کلمه‌های نرمال‌شدهٔ نام/نام خانوادگی، کدملی و موبایل.
+    جست‌وجوی پیشوندی روی token از ایندکس استفاده می‌کند (accounts.search).
+    """
+    profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="search_tokens")
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        verbose_name = "کلمهٔ جست‌وجو"
+        verbose_name_plural = "ایندکس جست‌وجوی کاربران"
+        constraints = [
+            models.UniqueConstraint(fields=["profile", "token"], name="uniq_profile_search_token"),
+        ]
+        indexes = [
+            models.Index(fields=["token", "profile"]),
+        ]
+
+    def __str__(self):
+        return f"{self.token} → {self.profile_id}"
+
+
 # -----------------------------
 # ۴) ثبت‌نام در انتظار تأیید
 # -----------------------------
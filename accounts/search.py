@@ -0,0 +1,107 @@
+# accounts/search.py
+"""
+جست‌وجوی مشترک ورزشکاران/مربیان/داوران روی ایندکس ProfileSearchToken.
+
+متن‌ها نرمال می‌شوند (ي/ك عربی → ی/ک فارسی، حذف اعراب و نیم‌فاصله، ارقام فارسی/عربی → لاتین)
+و هر کلمهٔ جست‌وجو به‌صورت پیشوندی روی token ایندکس‌شده تطبیق داده می‌شود؛
+کلمه‌ها با هم AND می‌شوند. ایندکس با ذخیرهٔ پروفایل (accounts.signals) به‌روز می‌ماند
+و با دستور rebuild_search_index از صفر ساخته می‌شود.
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+
+SEARCH_FIELDS = ("first_name", "last_name", "national_code", "phone")
+TOKEN_MAX_LENGTH = 64
+MAX_QUERY_WORDS = 5
+
+_FOLD = str.maketrans({
+    "ي": "ی", "ى": "ی", "ئ": "ی",
+    "ك": "ک",
+    "ة": "ه", "ۀ": "ه",
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ؤ": "و",
+    "\u200c": "", "\u200d": "", "\u0640": "",  # نیم‌فاصله، اتصال، کشیده
+    **{c: str(i % 10) for i, c in enumerate("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩")},
+})
+_DIACRITICS = re.compile("[\u064B-\u065F\u0670]")
+_SEPARATORS = re.compile(r"[^\w]+")
+
+
+def normalize(text) -> str:
+    """متن نرمال‌شده با کلمه‌های جداشده با یک فاصله."""
+    s = unicodedata.normalize("NFKC", str(text or "")).translate(_FOLD)
+    s = _DIACRITICS.sub("", s).lower()
+    return " ".join(_SEPARATORS.sub(" ", s).split())
+
+
+def normalize_phone(text) -> str:
+    digits = "".join(ch for ch in normalize(text) if ch.isdigit())
+    if digits.startswith("0098"):
+        digits = "0" + digits[4:]
+    elif digits.startswith("98") and len(digits) == 12:
+        digits = "0" + digits[2:]
+    elif digits.startswith("9") and len(digits) == 10:
+        digits = "0" + digits
+    return digits
+
+
+def profile_tokens(profile) -> set:
+    tokens = set(normalize(profile.first_name).split()) | set(normalize(profile.last_name).split())
+    tokens.add("".join(normalize(profile.national_code).split()))
+    tokens.add(normalize_phone(profile.phone))
+    return {t[:TOKEN_MAX_LENGTH] for t in tokens if t}
+
+
+def index_profile(profile) -> None:
+    """فقط تفاوت توکن‌ها نوشته می‌شود؛ اگر چیزی عوض نشده باشد یک SELECT."""
+    from .models import ProfileSearchToken
+
+    wanted = profile_tokens(profile)
+    existing = set(ProfileSearchToken.objects.filter(profile=profile).values_list("token", flat=True))
+    if existing - wanted:
+        ProfileSearchToken.objects.filter(profile=profile, token__in=existing - wanted).delete()
+    if wanted - existing:
+        ProfileSearchToken.objects.bulk_create(
+            [ProfileSearchToken(profile=profile, token=t) for t in wanted - existing],
+            ignore_conflicts=True,
+        )
+
+
+def rebuild_index(batch_size: int = 500) -> int:
+    """ساخت دوبارهٔ کل ایندکس به‌صورت دسته‌ای؛ تعداد پروفایل‌ها."""
+    from django.db import transaction
+    from .models import ProfileSearchToken, UserProfile
+
+    ids = list(UserProfile.objects.order_by("pk").values_list("pk", flat=True))
+    for i in range(0, len(ids), batch_size):
+        chunk = ids[i:i + batch_size]
+        profiles = UserProfile.objects.filter(pk__in=chunk).only("pk", *SEARCH_FIELDS)
+        with transaction.atomic():
+            ProfileSearchToken.objects.filter(profile_id__in=chunk).delete()
+            ProfileSearchToken.objects.bulk_create(
+                [ProfileSearchToken(profile=p, token=t) for p in profiles for t in profile_tokens(p)],
+                batch_size=batch_size,
+            )
+    return len(ids)
+
+
+def query_words(query) -> list:
+    words = normalize(query).split()[:MAX_QUERY_WORDS]
+    return [w[:TOKEN_MAX_LENGTH] for w in words]
+
+
+def search_profiles(qs, query, through: str = "pk"):
+    """
+    qs را به پروفایل‌هایی محدود می‌کند که همهٔ کلمه‌های query پیشوند یکی از token هایشان باشد.
+    through: مسیر پروفایل هدف در qs (مثلاً "coach" برای جست‌وجوی نام مربیِ شاگردان).
+    """
+    from .models import ProfileSearchToken
+
+    for word in query_words(query):
+        qs = qs.filter(**{f"{through}__in": ProfileSearchToken.objects.filter(
+            token__istartswith=word,
+        ).values("profile_id")})
+    return qs
+
@@ -0,0 +1,75 @@
+# accounts/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .dashboard import invalidate_dashboards
+from .search import SEARCH_FIELDS, index_profile
+from .models import TkdClub, UserProfile
+
+
+# ───────── کش شمارنده‌های داشبورد باشگاه/هیئت ─────────
+# ساخت/ویرایش/حذف پروفایل (از جمله تأیید پروفایل در انتظار) و تغییر باشگاه‌های مربی.
+# جابه‌جایی باشگاه/هیئت هر دو طرف قدیم و جدید را باطل می‌کند؛ تغییر is_coach یا حذف مربی
+# شمارندهٔ باشگاه‌های coaching_clubs را هم.
+_DASHBOARD_FIELDS = ("club", "club_id", "tkd_board", "tkd_board_id", "is_coach")
+
+
+@receiver(pre_save, sender=UserProfile)
+def remember_dashboard_scope(sender, instance: UserProfile, raw=False, update_fields=None, **kwargs):
+    instance._dashboard_prev = None
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not set(_DASHBOARD_FIELDS) & set(update_fields):
+        return
+    instance._dashboard_prev = (
+        UserProfile.objects.filter(pk=instance.pk).values("club_id", "tkd_board_id", "is_coach").first()
+    )
+
+
+@receiver(pre_delete, sender=UserProfile)
+def remember_coaching_clubs(sender, instance: UserProfile, **kwargs):
+    # ردیف‌های coaching_clubs پیش از post_delete پاک می‌شوند
+    instance._dashboard_coaching = list(instance.coaching_clubs.values_list("pk", flat=True)) if instance.is_coach else []
+
+
+@receiver(post_save, sender=UserProfile)
+def invalidate_dashboard_on_profile(sender, instance: UserProfile, **kwargs):
+    club_ids = [instance.club_id]
+    board_ids = [instance.tkd_board_id]
+    prev = getattr(instance, "_dashboard_prev", None)
+    if prev:
+        club_ids.append(prev["club_id"])
+        board_ids.append(prev["tkd_board_id"])
+        if prev["is_coach"] != instance.is_coach:
+            club_ids.extend(instance.coaching_clubs.values_list("pk", flat=True))
+    invalidate_dashboards(club_ids=club_ids, board_ids=board_ids)
+
+
+@receiver(post_delete, sender=UserProfile)
+def invalidate_dashboard_on_profile_delete(sender, instance: UserProfile, **kwargs):
+    invalidate_dashboards(
+        club_ids=[instance.club_id, *getattr(instance, "_dashboard_coaching", ())],
+        board_ids=[instance.tkd_board_id],
+    )
+
+
+@receiver(m2m_changed, sender=UserProfile.coaching_clubs.through)
+def invalidate_dashboard_on_coaching_clubs(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:  # از سمت باشگاه
+        invalidate_dashboards(club_ids=[instance.pk])
+    else:
+        invalidate_dashboards(club_ids=pk_set or instance.coaching_clubs.values_list("pk", flat=True))
+
+
+@receiver([post_save, post_delete], sender=TkdClub)
+def invalidate_dashboard_on_club(sender, instance: TkdClub, **kwargs):
+    invalidate_dashboards(club_ids=[instance.pk], board_ids=[instance.tkd_board_id])
+
+
+# ───────── ایندکس جست‌وجوی پروفایل‌ها ─────────
+@receiver(post_save, sender=UserProfile)
+def index_profile_for_search(sender, instance: UserProfile, update_fields=None, **kwargs):
+    if update_fields is None or set(SEARCH_FIELDS) & set(update_fields):
+        index_profile(instance)
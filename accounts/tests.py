@@ -1,3 +1,234 @@
+from datetime import date
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import ProfileSearchToken, TkdBoard, TkdClub, UserProfile
+from accounts.search import normalize, search_profiles
+
+
+def _profile(i, **extra):
+    fields = dict(
+        first_name=f"کاربر{i}", last_name="تست", father_name="-",
+        national_code=f"{i:010d}", birth_date="1380/01/01", gender="male",
+        phone=f"09{i:09d}", address="-", province="-", county="-", city="-",
+        belt_grade="سبز", belt_certificate_number="1", belt_certificate_date="1400/01/01",
+    )
+    return UserProfile.objects.create(**{**fields, **extra})
+
+
+class DashboardCountersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.board = TkdBoard.objects.create(
+            name="هیئت", province="-", city="-", user=User.objects.create(username="board"),
+        )
+        self.club = TkdClub.objects.create(
+            club_name="باشگاه", founder_name="مؤسس", tkd_board=self.board,
+            user=User.objects.create(username="club"),
+        )
+        TkdClub.objects.create(club_name="باشگاه دیگر", tkd_board=self.board)
+        for i in range(1, 4):
+            _profile(i, role="player", club=self.club, tkd_board=self.board, gold_medals=i, ranking_total=1.5)
+        self.coach = _profile(10, role="coach", is_coach=True, is_referee=True, tkd_board=self.board)
+        self.coach.coaching_clubs.add(self.club)
+        self.client = APIClient()
+
+    def _get(self, role, user):
+        self.client.force_authenticate(user)
+        res = self.client.get(reverse("accounts:dashboard-combined", args=[role]), secure=True)
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def test_club_counters_come_from_one_cached_query(self):
+        with self.assertNumQueries(2):  # باشگاه + aggregate
+            data = self._get("club", self.club.user)
+        self.assertEqual((data["student_count"], data["coach_count"]), (3, 1))
+        self.assertEqual((data["gold_medals"], data["ranking_total"]), (6, 4.5))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self._get("club", self.club.user), data)
+
+    def test_heyat_counters(self):
+        with self.assertNumQueries(2):  # هیئت + aggregate (شمار باشگاه‌ها داخل همان)
+            data = self._get("heyat", self.board.user)
+        self.assertEqual(
+            [data[k] for k in ("student_count", "coach_count", "referee_count", "club_count", "gold_medals")],
+            [3, 1, 1, 2, 6],
+        )
+
+    def test_heyat_without_members_still_counts_clubs(self):
+        board = TkdBoard.objects.create(name="هیئت ۲", province="-", city="-", user=User.objects.create(username="b2"))
+        TkdClub.objects.create(club_name="باشگاه تازه", tkd_board=board)
+        data = self._get("heyat", board.user)
+        self.assertEqual((data["student_count"], data["club_count"], data["gold_medals"]), (0, 1, 0))
+
+    def test_profile_changes_invalidate_cache(self):
+        self._get("club", self.club.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            _profile(4, role="player", club=self.club, tkd_board=self.board)
+        self.assertEqual(self._get("club", self.club.user)["student_count"], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coach.coaching_clubs.clear()
+        self.assertEqual(self._get("club", self.club.user)["coach_count"], 0)
+
+    def test_moving_player_invalidates_old_and_new_scope(self):
+        board2 = TkdBoard.objects.create(name="هیئت ۲", province="-", city="-", user=User.objects.create(username="b2"))
+        club2 = TkdClub.objects.create(club_name="باشگاه ۲", tkd_board=board2, user=User.objects.create(username="c2"))
+        self._get("club", self.club.user)
+        self._get("club", club2.user)
+        self._get("heyat", self.board.user)
+        self._get("heyat", board2.user)
+
+        player = UserProfile.objects.filter(club=self.club).first()
+        player.club, player.tkd_board = club2, board2
+        with self.captureOnCommitCallbacks(execute=True):
+            player.save()
+
+        self.assertEqual(self._get("club", self.club.user)["student_count"], 2)
+        self.assertEqual(self._get("club", club2.user)["student_count"], 1)
+        self.assertEqual(self._get("heyat", self.board.user)["student_count"], 2)
+        self.assertEqual(self._get("heyat", board2.user)["student_count"], 1)
+
+    def test_toggling_is_coach_invalidates_coaching_clubs(self):
+        self.assertEqual(self._get("club", self.club.user)["coach_count"], 1)
+        self.coach.is_coach = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coach.save(update_fields=["is_coach"])
+        self.assertEqual(self._get("club", self.club.user)["coach_count"], 0)
+
+        self.coach.is_coach = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coach.save()
+        self.assertEqual(self._get("club", self.club.user)["coach_count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coach.delete()
+        self.assertEqual(self._get("club", self.club.user)["coach_count"], 0)
+
+
+
+class HeyatClubsListTests(TestCase):
+    def setUp(self):
+        self.board = TkdBoard.objects.create(
+            name="هیئت", province="-", city="-", user=User.objects.create(username="board"),
+        )
+        self.clubs = [
+            TkdClub.objects.create(club_name=f"باشگاه {i:02d}", founder_name=f"مؤسس {i}",
+                                   founder_phone=f"0912{i:07d}", city=str(i), tkd_board=self.board)
+            for i in range(12)
+        ]
+        n = 0
+        for k, club in enumerate(self.clubs[:3]):
+            for _ in range(k + 1):
+                n += 1
+                _profile(n, role="player", club=club)
+            coach = _profile(100 + k, role="coach", is_coach=True)
+            coach.coaching_clubs.add(*self.clubs[:k + 1])
+        self.client = APIClient()
+        self.client.force_authenticate(self.board.user)
+        self.url = reverse("accounts:heyat-clubs")
+
+    def test_counts_in_one_query_and_paginated(self):
+        with self.assertNumQueries(3):  # هیئت + count صفحه‌بندی + صفحه با شمارش‌ها
+            res = self.client.get(self.url, {"page": 1, "page_size": 5}, secure=True)
+        data = res.json()
+        self.assertEqual(data["count"], 12)
+        self.assertEqual(len(data["results"]), 5)
+        self.assertEqual(
+            [(r["student_count"], r["coach_count"]) for r in data["results"][:4]],
+            [(1, 3), (2, 2), (3, 1), (0, 0)],
+        )
+
+    def test_plain_list_without_page(self):
+        with self.assertNumQueries(2):  # هیئت + فهرست با شمارش‌ها
+            data = self.client.get(self.url, secure=True).json()
+        self.assertEqual(len(data), 12)
+        self.assertEqual((data[0]["student_count"], data[0]["coach_count"]), (1, 3))
+
+    def test_prefix_search(self):
+        res = self.client.get(self.url, {"search": "باشگاه 1"}, secure=True).json()
+        self.assertEqual([r["club_name"] for r in res], ["باشگاه 10", "باشگاه 11"])
+        res = self.client.get(self.url, {"search": "۰۹۱۲۰۰۰۰۰۰۳", "page": 1}, secure=True).json()
+        self.assertEqual([r["id"] for r in res["results"]], [self.clubs[3].id])
+
+
+
+class ProfileSearchTests(TestCase):
+    def setUp(self):
+        self.coach = _profile(1, first_name="علي", last_name="كريمي", is_coach=True)
+        self.player = _profile(2, first_name="زهرا", last_name="رضایی", coach=self.coach)
+        self.other = _profile(3, first_name="مریم", last_name="احمدی")
+
+    def _ids(self, query, through="pk", qs=None):
+        qs = qs if qs is not None else UserProfile.objects.all()
+        return set(search_profiles(qs, query, through=through).values_list("pk", flat=True))
+
+    def test_normalize_folds_arabic_letters_and_digits(self):
+        self.assertEqual(normalize("  علي‌رضا  كريمي ۱۲٣ "), "علیرضا کریمی 123")
+
+    def test_prefix_search_on_names_national_code_and_phone(self):
+        self.assertEqual(self._ids("علی کری"), {self.coach.pk})
+        self.assertEqual(self._ids("رضا"), {self.player.pk})
+        self.assertEqual(self._ids("۰۰۰۰۰۰۰۰۰۳"), {self.other.pk})
+        self.assertEqual(self._ids("09000000002"), {self.player.pk})
+        self.assertEqual(self._ids("علی احمدی"), set())
+        # نام مربیِ شاگرد
+        self.assertEqual(self._ids("كريمي", through="coach"), {self.player.pk})
+
+    def test_index_follows_profile_edits(self):
+        self.other.last_name = "محمدی"
+        self.other.save(update_fields=["last_name"])
+        self.assertEqual(self._ids("احمدی"), set())
+        self.assertEqual(self._ids("محمد"), {self.other.pk})
+        self.assertEqual(ProfileSearchToken.objects.filter(profile=self.other).count(), 4)
+
+
+
+class GregorianDatesTests(TestCase):
+    def test_synced_on_save_and_update_fields(self):
+        p = _profile(1, birth_date="۱۳۸۰/۰۱/۰۱")
+        self.assertEqual((p.birth_date_greg, p.belt_certificate_date_greg), (date(2001, 3, 21), date(2021, 3, 21)))
+
+        p.birth_date = "1390/1/1"
+        p.save(update_fields=["birth_date"])
+        p.refresh_from_db()
+        self.assertEqual(p.birth_date_greg, date(2011, 3, 21))
+
+        p.birth_date = "نامعتبر"
+        p.save()
+        self.assertIsNone(UserProfile.objects.get(pk=p.pk).birth_date_greg)
+
+    def test_backfill_command(self):
+        ok = _profile(1)
+        stale = _profile(2)
+        UserProfile.objects.filter(pk=stale.pk).update(birth_date="1385/06/15", birth_date_greg=None)
+        out = StringIO()
+        call_command("backfill_gregorian_dates", batch_size=1, stdout=out)
+        self.assertIn("1 از 2", out.getvalue())
+        self.assertEqual(UserProfile.objects.get(pk=stale.pk).birth_date_greg, date(2006, 9, 6))
+        self.assertEqual(UserProfile.objects.get(pk=ok.pk).birth_date_greg, date(2001, 3, 21))
+
+    def test_heyat_birth_range_uses_gregorian_column(self):
+        board = TkdBoard.objects.create(
+            name="هیئت", province="-", city="-", user=User.objects.create(username="board"),
+        )
+        for i, bd in enumerate(["1379/12/29", "1380/01/01", "1385/06/15", "1390/01/01"], start=1):
+            _profile(i, role="player", tkd_board=board, birth_date=bd)
+        client = APIClient()
+        client.force_authenticate(board.user)
+
+        def national_codes(**params):
+            res = client.get(reverse("accounts:heyat-students"), params, secure=True)
+            self.assertEqual(res.status_code, 200)
+            return sorted(r["national_code"] for r in res.json())
 
-# Create your tests here.
+        # «1380/1/1» با رشته‌ای از «1379/12/29» و «1380/01/01» نمی‌شد درست مقایسه شود
+        self.assertEqual(national_codes(birth_from="1380/1/1", birth_to="۱۳۸۵/۰۶/۱۵"), [f"{i:010d}" for i in (2, 3)])
+        self.assertEqual(national_codes(birth_to="2001-03-20"), [f"{1:010d}"])
@@ -11,9 +11,9 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, get_user_model
 from django.db import transaction, IntegrityError
 from django.db.models import (
-    CharField, Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+    Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
 )
-from django.db.models.functions import Coalesce, Concat
+from django.db.models.functions import Coalesce
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
@@ -24,6 +24,7 @@ from django.views.decorators.http import require_POST
 
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
@@ -45,6 +46,9 @@ from .serializers import (
 )
 
 from .utils import send_verification_code
+from .dashboard import board_counters, club_counters
+from .search import search_profiles
+from common.jalali import parse_date
 
 from django.utils.decorators import method_decorator
 
@@ -53,7 +57,6 @@ User = get_user_model()
 
 # ---------- Constants / Helpers ----------
 
-ELIGIBLE_ENROLL_STATUSES = ('paid', 'confirmed', 'accepted', 'completed')
 
 
 def _normalize_digits(s: str) -> str:
@@ -64,6 +67,23 @@ def _normalize_digits(s: str) -> str:
     )
 
 
+def _filter_birth_range(qs, request):
+    """
+    birth_from / birth_to (شمسی یا میلادی) روی ستون ایندکس‌شدهٔ birth_date_greg؛
+    ورودی غیرقابل‌تبدیل مثل قبل با مقایسهٔ رشته‌ای روی birth_date.
+    """
+    for param, op in (("birth_from", "gte"), ("birth_to", "lte")):
+        raw = request.GET.get(param)
+        if not raw:
+            continue
+        value = parse_date(raw)
+        if value:
+            qs = qs.filter(**{f"birth_date_greg__{op}": value})
+        else:
+            qs = qs.filter(**{f"birth_date__{op}": raw})
+    return qs
+
+
 def _detect_role(user):
     prof = getattr(user, "profile", None)
     if prof:
@@ -76,25 +96,17 @@ def _detect_role(user):
 
 
 def annotate_student_stats(qs):
-    enr = Enrollment.objects.filter(
-        player_id=OuterRef('pk'), status__in=ELIGIBLE_ENROLL_STATUSES
-    )
-    enr_subq = (
-        enr.order_by()
-           .values('player_id')
-           .annotate(c=Count('competition_id', distinct=True))
-           .values('c')[:1]
-    )
+    """آمار شاگردان از جدول PlayerStats (یک JOIN) + مدال‌های کشوری/بین‌المللی ثبت‌شده روی پروفایل."""
     zero_int = Value(0, output_field=IntegerField())
     return qs.annotate(
-        competitions_count=Coalesce(Subquery(enr_subq, output_field=IntegerField()), zero_int),
-        gold_total=Coalesce(F('gold_medals'), zero_int)
+        competitions_count=Coalesce(F('stats__competitions'), zero_int),
+        gold_total=Coalesce(F('stats__gold'), zero_int)
                    + Coalesce(F('gold_medals_country'), zero_int)
                    + Coalesce(F('gold_medals_int'), zero_int),
-        silver_total=Coalesce(F('silver_medals'), zero_int)
+        silver_total=Coalesce(F('stats__silver'), zero_int)
                      + Coalesce(F('silver_medals_country'), zero_int)
                      + Coalesce(F('silver_medals_int'), zero_int),
-        bronze_total=Coalesce(F('bronze_medals'), zero_int)
+        bronze_total=Coalesce(F('stats__bronze'), zero_int)
                      + Coalesce(F('bronze_medals_country'), zero_int)
                      + Coalesce(F('bronze_medals_int'), zero_int),
     )
@@ -580,29 +592,17 @@ class ClubStudentsView(APIView):
 
         coach = request.GET.get("coach")
         if coach and coach != "مربی":
-            students = students.annotate(
-                full_name=Concat('coach__first_name', Value(' '), 'coach__last_name', output_field=CharField())
-            ).filter(full_name__icontains=coach)
+            students = search_profiles(students, coach, through="coach")
 
         belt = request.GET.get("belt")
         if belt and belt != "درجه کمربند":
             students = students.filter(belt_grade=belt)
 
-        birth_from = request.GET.get("birth_from")
-        if birth_from:
-            students = students.filter(birth_date__gte=birth_from)
-
-        birth_to = request.GET.get("birth_to")
-        if birth_to:
-            students = students.filter(birth_date__lte=birth_to)
+        students = _filter_birth_range(students, request)
 
         search = request.GET.get("search")
         if search:
-            students = students.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(national_code__icontains=search)
-            )
+            students = search_profiles(students, search)
 
         students = annotate_student_stats(students)
         serialized = ClubStudentSerializer(students, many=True)
@@ -642,14 +642,9 @@ class ClubAllCoachesView(APIView):
 
 
 def with_competitions_count(qs):
-    subq = (
-        Enrollment.objects
-        .filter(player_id=OuterRef('pk'), status__in=ELIGIBLE_ENROLL_STATUSES)
-        .values('player')
-        .annotate(c=Count('id'))
-        .values('c')[:1]
+    return qs.annotate(
+        competitions_count=Coalesce(F('stats__competitions'), Value(0, output_field=IntegerField()))
     )
-    return qs.annotate(competitions_count=Subquery(subq, output_field=IntegerField()))
 
 
 class DashboardCombinedView(APIView):
@@ -661,92 +656,31 @@ class DashboardCombinedView(APIView):
         if role == 'club':
             try:
                 club = TkdClub.objects.get(user=user)
-                members = UserProfile.objects.filter(club=club)
-
-                student_count = members.filter(role='player').count()
-                coach_count = UserProfile.objects.filter(coaching_clubs=club, is_coach=True).count()
-
-                medals = members.aggregate(
-                    gold_medals=Sum('gold_medals', default=0),
-                    silver_medals=Sum('silver_medals', default=0),
-                    bronze_medals=Sum('bronze_medals', default=0),
-                    gold_medals_country=Sum('gold_medals_country', default=0),
-                    silver_medals_country=Sum('silver_medals_country', default=0),
-                    bronze_medals_country=Sum('bronze_medals_country', default=0),
-                    gold_medals_int=Sum('gold_medals_int', default=0),
-                    silver_medals_int=Sum('silver_medals_int', default=0),
-                    bronze_medals_int=Sum('bronze_medals_int', default=0),
-                )
-
-                rankings = members.aggregate(
-                    ranking_competition=Sum('ranking_competition', default=0),
-                    ranking_total=Sum('ranking_total', default=0),
-                )
-
-                return Response({
-                    "role": "club",
-                    "club_name": club.club_name,
-                    "founder_name": club.founder_name,
-                    "student_count": student_count,
-                    "coach_count": coach_count,
-                    "matches_participated": club.matches_participated,
-                    "gold_medals": medals["gold_medals"] or 0,
-                    "silver_medals": medals["silver_medals"] or 0,
-                    "bronze_medals": medals["bronze_medals"] or 0,
-                    "gold_medals_country": medals["gold_medals_country"] or 0,
-                    "silver_medals_country": medals["silver_medals_country"] or 0,
-                    "bronze_medals_country": medals["bronze_medals_country"] or 0,
-                    "gold_medals_int": medals["gold_medals_int"] or 0,
-                    "silver_medals_int": medals["silver_medals_int"] or 0,
-                    "bronze_medals_int": medals["bronze_medals_int"] or 0,
-                    "ranking_competition": rankings["ranking_competition"] or 0,
-                    "ranking_total": rankings["ranking_total"] or 0,
-                })
             except TkdClub.DoesNotExist:
                 return Response({"detail": "پروفایل باشگاه یافت نشد."}, status=404)
 
+            counters = club_counters(club)
+            return Response({
+                "role": "club",
+                "club_name": club.club_name,
+                "founder_name": club.founder_name,
+                "matches_participated": club.matches_participated,
+                **counters,
+            })
+
         elif role == 'heyat':
             try:
                 board = TkdBoard.objects.get(user=user)
-                members = UserProfile.objects.filter(tkd_board=board)
-
-                student_count = members.filter(role='player').count()
-                coach_count = members.filter(is_coach=True).count()
-                referee_count = members.filter(is_referee=True).count()
-                club_count = TkdClub.objects.filter(tkd_board=board).count()
-
-                medals = members.aggregate(
-                    gold_medals=Sum('gold_medals', default=0),
-                    silver_medals=Sum('silver_medals', default=0),
-                    bronze_medals=Sum('bronze_medals', default=0),
-                    gold_medals_country=Sum('gold_medals_country', default=0),
-                    silver_medals_country=Sum('silver_medals_country', default=0),
-                    bronze_medals_country=Sum('bronze_medals_country', default=0),
-                    gold_medals_int=Sum('gold_medals_int', default=0),
-                    silver_medals_int=Sum('silver_medals_int', default=0),
-                    bronze_medals_int=Sum('bronze_medals_int', default=0),
-                )
-
-                return Response({
-                    "role": "heyat",
-                    "board_name": board.name,
-                    "student_count": student_count,
-                    "coach_count": coach_count,
-                    "referee_count": referee_count,
-                    "club_count": club_count,
-                    "gold_medals": medals["gold_medals"] or 0,
-                    "silver_medals": medals["silver_medals"] or 0,
-                    "bronze_medals": medals["bronze_medals"] or 0,
-                    "gold_medals_country": medals["gold_medals_country"] or 0,
-                    "silver_medals_country": medals["silver_medals_country"] or 0,
-                    "bronze_medals_country": medals["bronze_medals_country"] or 0,
-                    "gold_medals_int": medals["gold_medals_int"] or 0,
-                    "silver_medals_int": medals["silver_medals_int"] or 0,
-                    "bronze_medals_int": medals["bronze_medals_int"] or 0,
-                })
             except TkdBoard.DoesNotExist:
                 return Response({"detail": "هیئت مربوط به کاربر یافت نشد."}, status=404)
 
+            counters = board_counters(board)
+            return Response({
+                "role": "heyat",
+                "board_name": board.name,
+                **counters,
+            })
+
         # player/coach/referee/both
         try:
             profile = UserProfile.objects.get(user=user)
@@ -1048,21 +982,11 @@ class CoachStudentsAPIView(APIView):
         if belt and belt != "درجه کمربند":
             students = students.filter(belt_grade=belt)
 
-        birth_from = request.GET.get("birth_from")
-        if birth_from:
-            students = students.filter(birth_date__gte=birth_from)
-
-        birth_to = request.GET.get("birth_to")
-        if birth_to:
-            students = students.filter(birth_date__lte=birth_to)
+        students = _filter_birth_range(students, request)
 
         search = request.GET.get("search")
         if search:
-            students = students.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(national_code__icontains=search)
-            )
+            students = search_profiles(students, search)
 
         students = annotate_student_stats(students)
         serialized = ClubStudentSerializer(students, many=True)
@@ -1243,9 +1167,7 @@ class HeyatStudentsAPIView(APIView):
 
         coach = request.GET.get("coach")
         if coach and coach != "مربی":
-            students = students.annotate(
-                full_name=Concat('coach__first_name', Value(' '), 'coach__last_name', output_field=CharField())
-            ).filter(full_name__icontains=coach)
+            students = search_profiles(students, coach, through="coach")
 
         club = request.GET.get("club")
         if club and club != "باشگاه":
@@ -1255,21 +1177,11 @@ class HeyatStudentsAPIView(APIView):
         if belt and belt != "درجه کمربند":
             students = students.filter(belt_grade=belt)
 
-        birth_from = request.GET.get("birth_from")
-        if birth_from:
-            students = students.filter(birth_date__gte=birth_from)
-
-        birth_to = request.GET.get("birth_to")
-        if birth_to:
-            students = students.filter(birth_date__lte=birth_to)
+        students = _filter_birth_range(students, request)
 
         search = request.GET.get("search")
         if search:
-            students = students.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(national_code__icontains=search)
-            )
+            students = search_profiles(students, search)
 
         students = annotate_student_stats(students)
         serialized = ClubStudentSerializer(students, many=True)
@@ -1314,13 +1226,7 @@ class HeyatCoachesAPIView(APIView):
         if belt and belt != "همه":
             coaches = coaches.filter(belt_grade=belt)
 
-        birth_from = request.GET.get("birth_from")
-        if birth_from:
-            coaches = coaches.filter(birth_date__gte=birth_from)
-
-        birth_to = request.GET.get("birth_to")
-        if birth_to:
-            coaches = coaches.filter(birth_date__lte=birth_to)
+        coaches = _filter_birth_range(coaches, request)
 
         national_level = request.GET.get("national_level")
         if national_level and national_level != "همه":
@@ -1332,11 +1238,7 @@ class HeyatCoachesAPIView(APIView):
 
         search = request.GET.get("search")
         if search:
-            coaches = coaches.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(national_code__icontains=search)
-            )
+            coaches = search_profiles(coaches, search)
 
         result = []
         for coach in coaches.distinct():
@@ -1371,21 +1273,11 @@ class HeyatRefereesAPIView(APIView):
         if belt and belt != "همه":
             referees = referees.filter(belt_grade=belt)
 
-        birth_from = request.GET.get("birth_from")
-        if birth_from:
-            referees = referees.filter(birth_date__gte=birth_from)
-
-        birth_to = request.GET.get("birth_to")
-        if birth_to:
-            referees = referees.filter(birth_date__lte=birth_to)
+        referees = _filter_birth_range(referees, request)
 
         search = request.GET.get("search")
         if search:
-            referees = referees.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(national_code__icontains=search)
-            )
+            referees = search_profiles(referees, search)
 
         referee_field = request.GET.get("referee_field")
         if referee_field and referee_field != "همه":
@@ -1440,6 +1332,20 @@ class HeyatRefereesAPIView(APIView):
         return Response(result)
 
 
+class HeyatClubsPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+def _count_subquery(qs, link):
+    return Coalesce(
+        Subquery(qs.filter(**{link: OuterRef("pk")}).order_by().values(link)
+                 .annotate(c=Count("pk")).values("c")[:1]),
+        Value(0), output_field=IntegerField(),
+    )
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def heyat_clubs_list(request):
@@ -1450,30 +1356,44 @@ def heyat_clubs_list(request):
 
     clubs = TkdClub.objects.filter(tkd_board=board)
 
-    search = request.GET.get("search")
+    # جست‌وجوی پیشوندی تا ایندکس‌های (هیئت، نام) و founder_phone استفاده شوند
+    search = (request.GET.get("search") or "").strip()
     if search:
-        clubs = clubs.filter(
-            Q(club_name__icontains=search) |
-            Q(founder_name__icontains=search) |
-            Q(founder_phone__icontains=search)
+        cond = Q(club_name__istartswith=search) | Q(founder_name__istartswith=search)
+        digits = _normalize_digits(search)
+        if digits.isdigit():
+            cond |= Q(founder_phone__istartswith=digits)
+        clubs = clubs.filter(cond)
+
+    clubs = (
+        clubs.order_by("club_name", "id")
+        .only("id", "club_name", "founder_name", "phone", "founder_phone")
+        .annotate(
+            student_count_live=_count_subquery(UserProfile.objects.filter(role="player"), "club"),
+            coach_count_live=_count_subquery(
+                UserProfile.coaching_clubs.through.objects.filter(userprofile__is_coach=True), "tkdclub",
+            ),
         )
+    )
 
-    data = []
-    for club in clubs:
-        student_count = UserProfile.objects.filter(club=club, role="player").count()
-        coach_count = UserProfile.objects.filter(coaching_clubs=club, is_coach=True).count()
-
-        data.append({
+    def rows(items):
+        return [{
             "id": club.id,
             "club_name": club.club_name,
             "manager_name": club.founder_name,
             "phone": club.phone,
             "manager_phone": club.founder_phone,
-            "student_count": student_count,
-            "coach_count": coach_count
-        })
+            "student_count": club.student_count_live,
+            "coach_count": club.coach_count_live,
+        } for club in items]
+
+    # بدون page همان فهرست ساده (سازگار با HeyatClubsTable که سمت کاربر صفحه‌بندی می‌کند)
+    if "page" not in request.GET:
+        return Response(rows(clubs))
 
-    return Response(data, status=200)
+    paginator = HeyatClubsPagination()
+    page = paginator.paginate_queryset(clubs, request)
+    return paginator.get_paginated_response(rows(page))
 
 
 class KyorugiCompetitionListView(APIView):
@@ -0,0 +1,34 @@
+# common/cache_versions.py
+# -*- coding: utf-8 -*-
+"""
+شمارندهٔ نسخه (generation) برای کش‌هایی که پس از commit باطل می‌شوند.
+
+خواننده پیش از ساختن داده نسخه را می‌خواند و نتیجه را زیر کلیدِ همان نسخه ذخیره می‌کند؛
+باطل‌کردن فقط نسخه را یکی بالا می‌برد. ساختی که از دادهٔ پیش از commit شروع شده و بعد از
+باطل‌شدن ذخیره می‌شود، زیر نسخهٔ مرده می‌نشیند و دیگر خوانده نمی‌شود.
+"""
+from __future__ import annotations
+
+import secrets
+
+from django.core.cache import cache
+
+
+def _initial() -> int:
+    # مقدار آغازین تصادفی: اگر کلید نسخه از کش بیرون برود، نسخه‌های قدیمی دوباره زنده نمی‌شوند
+    return secrets.randbits(48)
+
+
+def current_version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:  # کلید وجود ندارد؛ خواننده‌ها با هر مقدار تازه‌ای از نو می‌سازند
+        cache.add(key, _initial(), None)
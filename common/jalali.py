@@ -0,0 +1,120 @@
+# common/jalali.py
+# -*- coding: utf-8 -*-
+"""
+تبدیل مشترک تاریخ شمسی ↔ میلادی.
+
+- parse_date: date/datetime/jdatetime یا رشتهٔ «۱۴۰۳/۰۴/۱۰» / «2024-06-30» → datetime.date میلادی
+- to_jalali: همان ورودی‌ها → jdatetime.date
+- jalali_str: همان ورودی‌ها → «YYYY/MM/DD» شمسی
+- parse_dates / jalali_strs: نسخهٔ فهرستی برای سطرهای زیاد (هر مقدار یکتا یک‌بار تبدیل می‌شود)
+
+ارقام فارسی/عربی و نویسه‌های جهت‌نما حذف/لاتین می‌شوند و جداکننده‌های «/»، «-» و «.» پذیرفته‌اند.
+سال کمتر از 1700 شمسی فرض می‌شود، بقیه میلادی. datetime آگاه به زمان محلی برده می‌شود.
+نتیجهٔ تبدیل رشته→تاریخ و تاریخ→شمسی در کش LRU محدود (CACHE_SIZE) نگه داشته می‌شود؛
+ورودی‌ها تغییرناپذیرند، پس کش هیچ‌وقت کهنه نمی‌شود.
+"""
+from __future__ import annotations
+
+import datetime
+import re
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import jdatetime
+from django.utils import timezone
+
+CACHE_SIZE = 8192
+
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+_BIDI = re.compile("[\u200c\u200e\u200f\u202a-\u202e]")
+_YMD = re.compile(r"(\d{4})[/\-.–—−](\d{1,2})[/\-.–—−](\d{1,2})(?!\d)")
+
+
+def to_en_digits(value) -> str:
+    return _BIDI.sub("", str(value)).translate(_DIGITS).strip()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_str(value: str) -> Optional[datetime.date]:
+    s = to_en_digits(value).strip("\"'")
+    m = _YMD.match(s)
+    if not m:
+        return None
+    y, mo, d = map(int, m.groups())
+    try:
+        if y < 1700:
+            g = jdatetime.date(y, mo, d).togregorian()
+            return datetime.date(g.year, g.month, g.day)
+        return datetime.date(y, mo, d)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _to_jalali(d: datetime.date) -> jdatetime.date:
+    return jdatetime.date.fromgregorian(date=d)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _format(d: datetime.date, sep: str) -> str:
+    j = _to_jalali(d)
+    return f"{j.year:04d}{sep}{j.month:02d}{sep}{j.day:02d}"
+
+
+def parse_date(value) -> Optional[datetime.date]:
+    """هر ورودی شبیه تاریخ → datetime.date میلادی؛ نامعتبر → None."""
+    if not value:
+        return None
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if isinstance(value, jdatetime.date):
+        g = value.togregorian()
+        return g.date() if isinstance(g, datetime.datetime) else g
+    return _parse_str(str(value))
+
+
+def to_jalali(value) -> Optional[jdatetime.date]:
+    d = parse_date(value)
+    return _to_jalali(d) if d else None
+
+
+def jalali_str(value, sep: str = "/") -> Optional[str]:
+    """«YYYY/MM/DD» شمسی؛ نامعتبر → None."""
+    d = parse_date(value)
+    return _format(d, sep) if d else None
+
+
+def _each_unique(values: Iterable, convert) -> list:
+    """convert برای هر مقدار یکتا یک‌بار؛ مقدارهای hash‌نشدنی هر بار."""
+    memo = {}
+    out = []
+    for v in values:
+        try:
+            r = memo[v]
+        except KeyError:
+            r = memo[v] = convert(v)
+        except TypeError:
+            r = convert(v)
+        out.append(r)
+    return out
+
+
+def parse_dates(values: Iterable) -> list:
+    """parse_date برای یک فهرست؛ مقدارهای تکراری یک‌بار تبدیل می‌شوند."""
+    return _each_unique(values, parse_date)
+
+
+def jalali_strs(values: Iterable, sep: str = "/") -> list:
+    """jalali_str برای یک فهرست (مثلاً ستون تاریخ همهٔ سطرهای یک گزارش)."""
+    return _each_unique(values, lambda v: jalali_str(v, sep))
+
+
+def cache_info() -> dict:
+    return {f.__name__: f.cache_info() for f in (_parse_str, _to_jalali, _format)}
+
+
+def clear_caches() -> None:
+    for f in (_parse_str, _to_jalali, _format):
+        f.cache_clear()
@@ -9,6 +9,8 @@ import jdatetime
 from django import forms
 from django.utils.safestring import mark_safe
 
+from .jalali import jalali_str, parse_date
+
 
 def _to_jalali_str(value: Any) -> str:
     """
@@ -23,20 +25,9 @@ def _to_jalali_str(value: Any) -> str:
         v = value.strip()
         if "/" in v and "-" not in v:
             return v
-        try:
-            value = datetime.date.fromisoformat(v)
-        except Exception:
-            return v
-
-    # اگر datetime بود، فقط قسمت date مهمه
-    if isinstance(value, datetime.datetime):
-        value = value.date()
+        return jalali_str(v) or v
 
-    try:
-        j = jdatetime.date.fromgregorian(date=value)
-        return j.strftime("%Y/%m/%d")
-    except Exception:
-        return ""
+    return jalali_str(value) or ""
 
 
 def _to_gregorian_date(value: str):
@@ -44,18 +35,7 @@ def _to_gregorian_date(value: str):
     تبدیل رشته شمسی (YYYY/MM/DD) به تاریخ میلادی (datetime.date)
     اگر خالی یا نامعتبر باشد، None برمی‌گرداند.
     """
-    if not value:
-        return None
-    v = value.strip().replace("-", "/")
-    try:
-        y, m, d = [int(x) for x in v.split("/")]
-        return jdatetime.date(y, m, d).togregorian()
-    except Exception:
-        # اگر نشد، شاید فرمت ISO میلادی باشد
-        try:
-            return datetime.date.fromisoformat(v)
-        except Exception:
-            return None
+    return parse_date(value)
 
 
 class _BasePersianWidget(forms.TextInput):
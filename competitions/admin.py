@@ -38,6 +38,7 @@ User = get_user_model()
 import jdatetime
 
 # ویجت جدید ما (بدون دردسر)
+from common.jalali import jalali_str
 from common.widgets import PersianDateWidget, PersianDateTimeWidget
 
 # ============================ مدل‌ها ============================
@@ -54,11 +55,14 @@ from .models import (
 
 
 # سرویس‌ها
-from .services.draw_service import create_draw_for_group
-from .services.results_service import apply_results_and_points
+from .services.draw_service import (
+    create_draw_for_group, create_draws_for_competition, SOLVER_OPTIMAL, SOLVER_RANDOM,
+)
+from .services.results_service import apply_competition_results, apply_results
 from competitions.services.numbering_service import (
     number_matches_for_competition,
     clear_match_numbers_for_competition,
+    materialize_rounds_for_competition,
 )
 
 ELIGIBLE_STATUSES = ("paid", "confirmed", "accepted", "completed")
@@ -193,19 +197,13 @@ def _to_jalali_str(value):
     """گرگوری(تاریخ/زمان/رشته) → رشتهٔ شمسی YYYY/MM/DD (نمایش امن بدون اختلاف روز)."""
     if not value:
         return "-"
-    try:
-        # رشته‌ها هم پشتیبانی شوند
-        if isinstance(value, str):
-            dt = parse_datetime(value) or parse_date(value)
-        else:
-            dt = value
-        d = _localdate(dt)
-        if not d:
+    # رشته‌ها هم پشتیبانی شوند
+    if isinstance(value, str):
+        try:
+            value = parse_datetime(value) or parse_date(value)
+        except ValueError:
             return "-"
-        j = jdatetime.date.fromgregorian(date=d)
-        return j.strftime("%Y/%m/%d")
-    except Exception:
-        return "-"
+    return jalali_str(_localdate(value)) or "-"
 
 def _to_jalali_dt_str(val):
     """گرگوری → رشتهٔ شمسی YYYY/MM/DD HH:MM (برای نمایش تاریخ-زمان به‌صورت محلی)."""
@@ -390,6 +388,24 @@ def _registration_open_col(obj):
     return bool(getattr(obj, "registration_open_effective", False))
 
 
+@admin.action(description="قرعه‌کشی همهٔ اوزان (یکجا)")
+def create_all_draws(modeladmin, request, queryset):
+    for comp in queryset:
+        try:
+            res = create_draws_for_competition(comp.id)
+        except Exception as e:
+            messages.error(request, f"خطا در قرعه‌کشی «{comp}»: {e}")
+            continue
+        messages.success(request, f"«{comp}»: {len(res['draws'])} جدول ساخته شد.")
+        if res["locked"]:
+            messages.warning(request, f"«{comp}»: {len(res['locked'])} جدول قفل‌شده دست نخورد.")
+
+@admin.action(description="اعمال دوبارهٔ امتیاز نتایج (یکجا)")
+def reapply_competition_results(modeladmin, request, queryset):
+    for comp in queryset:
+        count = apply_competition_results(comp)
+        messages.success(request, f"«{comp}»: امتیاز {count} نتیجه اعمال شد.")
+
 @admin.register(KyorugiCompetition)
 class KyorugiCompetitionAdmin(admin.ModelAdmin):
     form = KyorugiCompetitionAdminForm
@@ -408,7 +424,7 @@ class KyorugiCompetitionAdmin(admin.ModelAdmin):
         ("registration_start", admin.DateFieldListFilter),
         ("registration_end", admin.DateFieldListFilter),
     )
-    actions = []
+    actions = [create_all_draws, reapply_competition_results]
     inlines = [MatAssignmentInline, CompetitionImageInline, CompetitionFileInline, CoachApprovalInline]
     readonly_fields = ("public_id",)
     ordering = ("-competition_date", "-id")
@@ -730,6 +746,11 @@ class DrawStartForm(forms.Form):
         help_text="اگر تعداد ≥ این مقدار باشد قانون هم‌باشگاهی در دور اول اعمال می‌شود."
     )
     seed = forms.CharField(label="Seed (اختیاری)", required=False)
+    solver = forms.ChoiceField(
+        label="روش چیدمان", required=False, initial=SOLVER_OPTIMAL,
+        choices=[(SOLVER_OPTIMAL, "بهینه (قطعی)"), (SOLVER_RANDOM, "تصادفی (بر اساس Seed)")],
+        help_text="بهینه: کمترین تکرار حریف و هم‌باشگاهی در دور اول. تصادفی: رفتار قبلی، قابل تکرار با Seed."
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -804,6 +825,7 @@ class DrawStartAdmin(admin.ModelAdmin):
                 manual        = form.cleaned_data.get("manual") or False
                 size_override = form.cleaned_data.get("size_override")
                 ct_manual     = form.cleaned_data.get("club_threshold")
+                solver        = (form.cleaned_data.get("solver") if manual else None) or SOLVER_OPTIMAL
 
                 final_size = (size_override if (manual and size_override) else size)
                 final_th   = (ct_manual if (manual and ct_manual) else (8 if count >= 8 else 9999))
@@ -820,6 +842,7 @@ class DrawStartAdmin(admin.ModelAdmin):
                             club_threshold=int(final_th),
                             seed=seed,
                             size_override=final_size,
+                            solver=solver,
                         )
                         messages.success(request, "قرعه‌کشی انجام شد.")
                     except Exception as e:
@@ -886,9 +909,7 @@ def kyorugi_results_view(request):
             result.bronze1_enrollment = form.cleaned_data["bronze1"]
             result.bronze2_enrollment = form.cleaned_data["bronze2"]
             result.notes = form.cleaned_data["notes"]
-            result.save()
-
-            apply_results_and_points(result.id)
+            result.save()  # دفتر امتیاز همین‌جا (idempotent) به‌روز می‌شود
 
             messages.success(request, "نتیجه ذخیره شد.")
             qs = request.META.get("QUERY_STRING", "")
@@ -1019,10 +1040,13 @@ def numbering_view(request):
                              or f"{getattr(m.player_b,'first_name','')} {getattr(m.player_b,'last_name','')}".strip()
                              or ""),
                 "match_number": m.match_number,
+                "scheduled_at": (timezone.localtime(m.scheduled_at).strftime("%H:%M")
+                                 if m.scheduled_at else None),
             })
     
-        mat_no = None
-        for ma in mat_assignments:
+        # زمینی که زمان‌بندی برای این جدول انتخاب کرده؛ وگرنه اولین زمین تخصیص‌یافته
+        mat_no = next((m.mat_no for m in ms if m.mat_no), None)
+        for ma in ([] if mat_no else mat_assignments):
             if ma.weights.filter(id=dr.weight_category_id).exists():
                 mat_no = ma.mat_number
                 break
@@ -1065,6 +1089,8 @@ def numbering_publish_view(request):
             comp.save(update_fields=["bracket_published_at"])
         messages.info(request, "جدول از پنل کاربر پنهان شد.")
     else:
+        # اسکلت کامل جدول پیش از انتشار (راندهای جاافتاده با یک bulk_create)
+        materialize_rounds_for_competition(comp.id)
         has_unnumbered = (
             Match.objects
             .filter(draw__competition=comp, is_bye=False, match_number__isnull=True)
@@ -2034,6 +2060,12 @@ class KyorugiResultAdminForm(forms.ModelForm):
 @admin.register(KyorugiResult)
 class KyorugiResultAdmin(admin.ModelAdmin):
     form = KyorugiResultAdminForm
+    actions = ["reapply_points"]
+
+    @admin.action(description="اعمال دوبارهٔ امتیاز نتایج انتخاب‌شده")
+    def reapply_points(self, request, queryset):
+        count = apply_results(queryset)
+        self.message_user(request, f"امتیاز {count} نتیجه اعمال شد.", level=messages.SUCCESS)
 
     def get_form(self, request, obj=None, **kwargs):
         BaseForm = super().get_form(request, obj, **kwargs)
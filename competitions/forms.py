@@ -5,6 +5,8 @@ from datetime import date as gdate
 import jdatetime
 import django_jalali.admin as jadmin
 
+from common.jalali import jalali_str
+
 from .models import AgeCategory, KyorugiCompetition
 
 
@@ -52,8 +54,7 @@ def _set_initial_jalali(field, instance_date):
     مقدار میلادی ذخیره‌شده را به شمسی برای نمایش اولیه در فرم تبدیل می‌کند.
     """
     if instance_date:
-        j = jdatetime.date.fromgregorian(date=instance_date)
-        field.initial = j.strftime("%Y/%m/%d")
+        field.initial = jalali_str(instance_date)
 
 
 # ---------------- AgeCategory ----------------
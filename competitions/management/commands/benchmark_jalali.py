@@ -0,0 +1,115 @@
+# competitions/management/commands/benchmark_jalali.py
+"""
+سنجش سرعت تبدیل تاریخ در یک فهرست داشبورد (پیش‌فرض ۱۰هزار سطر، بدون پایگاه‌داده):
+هر سطر تاریخ تولد و تاریخ کمربند شمسی (رشته) و چهار تاریخ میلادی مسابقه دارد که برای نمایش
+به شمسی برده می‌شوند. روش قدیمی (پارس و jdatetime برای هر فیلد هر سطر) با common.jalali
+(کش LRU) و نسخهٔ ستونی آن (jalali_strs) مقایسه می‌شود:
+    python manage.py benchmark_jalali --rows 10000
+"""
+import random
+import re
+import time
+from datetime import date, timedelta
+
+import jdatetime
+from django.core.management.base import BaseCommand
+
+from common.jalali import clear_caches, jalali_str, jalali_strs
+
+COMP_FIELDS = ("registration_start", "registration_end", "weigh_date", "competition_date")
+_FA = str.maketrans("0123456789", "۰۱۲۳۴۵۶۷۸۹")
+
+
+def _legacy_parse(s):
+    """نسخهٔ تکراری پیشین (_parse_jalali_str و مشابه‌ها)."""
+    t = re.sub(r"[\u200e\u200f\u200c\u202a-\u202e]", "", str(s))
+    t = t.translate(str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")).strip().replace("-", "/")
+    try:
+        y, m, d = [int(x) for x in t.split("/")[:3]]
+        if y >= 1700:
+            return jdatetime.date.fromgregorian(date=date(y, m, d))
+        return jdatetime.date(y, m, d)
+    except Exception:
+        return None
+
+
+def _legacy_str(d):
+    try:
+        return jdatetime.date.fromgregorian(date=d).strftime("%Y/%m/%d")
+    except Exception:
+        return None
+
+
+def build_rows(n, seed=1):
+    rng = random.Random(seed)
+    comps = []
+    for _ in range(20):
+        start = date(2024, 1, 1) + timedelta(days=rng.randrange(700))
+        comps.append(dict(zip(COMP_FIELDS, (start, start + timedelta(10), start + timedelta(11), start + timedelta(13)))))
+    rows = []
+    for _ in range(n):
+        bd = jdatetime.date(1370, 1, 1) + timedelta(days=rng.randrange(20 * 365))
+        cd = jdatetime.date(1395, 1, 1) + timedelta(days=rng.randrange(8 * 365))
+        birth = bd.strftime("%Y/%m/%d")
+        rows.append({
+            "birth_date": birth.translate(_FA) if rng.random() < 0.5 else birth,
+            "belt_certificate_date": cd.strftime("%Y/%m/%d"),
+            **rng.choice(comps),
+        })
+    return rows
+
+
+def legacy_listing(rows):
+    out = []
+    for r in rows:
+        item = {f: _legacy_str(r[f]) for f in COMP_FIELDS}
+        for f in ("birth_date", "belt_certificate_date"):
+            j = _legacy_parse(r[f])
+            item[f] = f"{j.year:04d}/{j.month:02d}/{j.day:02d}" if j else None
+        out.append(item)
+    return out
+
+
+def cached_listing(rows):
+    return [{f: jalali_str(r[f]) for f in (*COMP_FIELDS, "birth_date", "belt_certificate_date")} for r in rows]
+
+
+def columnar_listing(rows):
+    fields = (*COMP_FIELDS, "birth_date", "belt_certificate_date")
+    columns = [jalali_strs(r[f] for r in rows) for f in fields]
+    return [dict(zip(fields, values)) for values in zip(*columns)]
+
+
+class Command(BaseCommand):
+    help = "سنجش سرعت تبدیل تاریخ شمسی/میلادی در یک فهرست بزرگ"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **opts):
+        rows = build_rows(opts["rows"])
+        expected = legacy_listing(rows)
+
+        results = []
+        for label, fn, cold in (
+            ("legacy", legacy_listing, False),
+            ("cached (cold)", cached_listing, True),
+            ("cached (warm)", cached_listing, False),
+            ("columnar (warm)", columnar_listing, False),
+        ):
+            best = None
+            for _ in range(opts["repeat"]):
+                if cold:
+                    clear_caches()
+                t0 = time.perf_counter()
+                got = fn(rows)
+                elapsed = time.perf_counter() - t0
+                best = elapsed if best is None else min(best, elapsed)
+            if got != expected:
+                self.stderr.write(self.style.ERROR(f"{label}: خروجی با روش قدیمی یکسان نیست"))
+            results.append((label, best))
+
+        base = results[0][1]
+        for label, best in results:
+            self.stdout.write(f"{label:<16} {best * 1000:9.1f} ms   x{base / best:5.1f}")
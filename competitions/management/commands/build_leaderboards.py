@@ -0,0 +1,17 @@
+# competitions/management/commands/build_leaderboards.py
+"""
+ساخت snapshot جدول‌های رده‌بندی (LeaderboardEntry) از دفتر امتیاز.
+به‌صورت دوره‌ای (cron) اجرا شود:
+    python manage.py build_leaderboards
+"""
+from django.core.management.base import BaseCommand
+
+from competitions.services.leaderboard_service import build_leaderboards
+
+
+class Command(BaseCommand):
+    help = "ساخت جدول‌های رده‌بندی از RankingTransaction"
+
+    def handle(self, *args, **opts):
+        written = build_leaderboards()
+        self.stdout.write(self.style.SUCCESS(f"{written} ردیف رده‌بندی ساخته شد"))
@@ -1,19 +1,43 @@
 # competitions/management/commands/cleanup_pair_history.py
+"""
+نگهداری تاریخچهٔ برخورد دور اول؛ برای اجرای روزانه با cron، مثلاً:
+    15 3 * * *  python manage.py cleanup_pair_history
+پیش‌فرض‌ها از settings.PAIR_HISTORY_RETENTION خوانده می‌شوند.
+"""
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from competitions.models import FirstRoundPairHistory
-import jdatetime
+
+from competitions.services.draw_service import (
+    RETENTION_MODES, RETENTION_PERSIAN_YEAR, pair_history_cutoff, purge_pair_history,
+)
+
 
 class Command(BaseCommand):
-    help = "حذف کامل تاریخچه برخورد دور اول در ابتدای هر سال شمسی"
+    help = "حذف تاریخچهٔ قدیمی برخورد دور اول (ابتدای سال شمسی یا قدیمی‌تر از N ماه)"
+
+    def add_arguments(self, parser):
+        conf = getattr(settings, "PAIR_HISTORY_RETENTION", {}) or {}
+        parser.add_argument(
+            "--mode", choices=RETENTION_MODES, default=conf.get("MODE", RETENTION_PERSIAN_YEAR),
+            help="persian_year: هرچه قبل از ۱ فروردین امسال است | months: قدیمی‌تر از --months ماه",
+        )
+        parser.add_argument("--months", type=int, default=conf.get("MONTHS", 12))
+        parser.add_argument(
+            "--keep-last", type=int, default=conf.get("KEEP_LAST", 5),
+            help="در حالت months، برخوردهای این تعداد مسابقهٔ آخر همیشه نگه داشته می‌شوند.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="فقط شمارش، بدون حذف")
 
     def handle(self, *args, **opts):
-        today = jdatetime.date.today()
-        if today.month == 1 and today.day == 1:
-            deleted, _ = FirstRoundPairHistory.objects.all().delete()
-            self.stdout.write(self.style.SUCCESS(
-                f"Done. Deleted {deleted} history rows for new Persian year {today.year}."
-            ))
-        else:
-            self.stdout.write(self.style.WARNING(
-                f"Not Now — today is {today.strftime('%Y/%m/%d')} (only runs on 01 Farvardin)"
-            ))
+        mode = opts["mode"]
+        cutoff = pair_history_cutoff(mode=mode, months=opts["months"])
+        count = purge_pair_history(
+            mode=mode,
+            months=opts["months"],
+            keep_last=opts["keep_last"],
+            dry_run=opts["dry_run"],
+        )
+        verb = "قابل حذف" if opts["dry_run"] else "حذف شد"
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} رکورد تاریخچه {verb} (mode={mode}, قبل از {cutoff:%Y-%m-%d %H:%M})."
+        ))
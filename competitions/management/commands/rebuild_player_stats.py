@@ -0,0 +1,20 @@
+# competitions/management/commands/rebuild_player_stats.py
+"""
+بازسازی کامل جدول PlayerStats از روی ثبت‌نام‌ها، دفتر امتیاز و جوایز مشارکت.
+بعد از مهاجرت اولیه یا هر اصلاح دستی داده‌ها اجرا شود:
+    python manage.py rebuild_player_stats
+"""
+from django.core.management.base import BaseCommand
+
+from competitions.services.player_stats_service import BATCH_SIZE, rebuild_player_stats
+
+
+class Command(BaseCommand):
+    help = "بازسازی آمار تجمیعی بازیکنان (PlayerStats)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **opts):
+        written = rebuild_player_stats(batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{written} ردیف آمار بازیکن بازسازی شد"))
@@ -0,0 +1,23 @@
+# competitions/management/commands/reconcile_rankings.py
+"""
+آشتی امتیازهای ذخیره‌شده (ranking_competition / ranking_total) با دفتر امتیاز و جوایز مشارکت:
+    python manage.py reconcile_rankings [--dry-run] [--batch-size 500]
+"""
+from django.core.management.base import BaseCommand
+
+from competitions.services.leaderboard_service import reconcile_ranking_totals
+
+
+class Command(BaseCommand):
+    help = "بازمحاسبهٔ دسته‌ای امتیاز کل بازیکنان/مربیان/باشگاه‌ها/هیئت‌ها از روی دفتر امتیاز"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="فقط گزارش ناهمخوانی، بدون نوشتن")
+
+    def handle(self, *args, **opts):
+        fixed = reconcile_ranking_totals(batch_size=opts["batch_size"], dry_run=opts["dry_run"])
+        verb = "ناهمخوان" if opts["dry_run"] else "اصلاح شد"
+        for model, count in fixed.items():
+            self.stdout.write(f"{model}: {count} ردیف {verb}")
+        self.stdout.write(self.style.SUCCESS("پایان"))
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0013_seminarregistration_bank_ref_code_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['is_paid', 'paid_at'], name='competition_is_paid_172905_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='poomsaeenrollment',
+            index=models.Index(fields=['is_paid', 'paid_at'], name='competition_is_paid_b2b6d1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='seminarregistration',
+            index=models.Index(fields=['is_paid', 'paid_at'], name='competition_is_paid_3aebb4_idx'),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.13 on 2026-10-18 10:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# نسخهٔ ثابت محاسبهٔ player_stats_service در زمان این مهاجرت، با مدل‌های تاریخی
+ELIGIBLE_ENROLL_STATUSES = ("paid", "confirmed", "accepted", "completed")
+BATCH_SIZE = 500
+
+
+def fill_player_stats(apps, schema_editor):
+    from django.db.models import Count, Q, Sum
+
+    UserProfile = apps.get_model("accounts", "UserProfile")
+    Enrollment = apps.get_model("competitions", "Enrollment")
+    PlayerStats = apps.get_model("competitions", "PlayerStats")
+    RankingAward = apps.get_model("competitions", "RankingAward")
+    RankingTransaction = apps.get_model("competitions", "RankingTransaction")
+
+    ids = list(UserProfile.objects.order_by("pk").values_list("pk", flat=True))
+    PlayerStats.objects.all().delete()
+    for i in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[i:i + BATCH_SIZE]
+        comps = dict(
+            Enrollment.objects.filter(player_id__in=chunk, status__in=ELIGIBLE_ENROLL_STATUSES)
+            .order_by().values("player_id")
+            .annotate(c=Count("competition_id", distinct=True))
+            .values_list("player_id", "c")
+        )
+        ledger = {
+            r["subject_id"]: r
+            for r in RankingTransaction.objects.filter(
+                subject_type="player", subject_id__in=chunk,
+            ).order_by().values("subject_id").annotate(
+                points=Sum("points"),
+                gold=Count("id", filter=Q(medal="gold")),
+                silver=Count("id", filter=Q(medal="silver")),
+                bronze=Count("id", filter=Q(medal="bronze")),
+            )
+        }
+        awards = dict(
+            RankingAward.objects.filter(player_id__in=chunk)
+            .order_by().values("player_id")
+            .annotate(s=Sum("points_player"))
+            .values_list("player_id", "s")
+        )
+        rows = []
+        for pid in chunk:
+            led = ledger.get(pid, {})
+            rows.append(PlayerStats(
+                player_id=pid,
+                competitions=comps.get(pid, 0),
+                gold=led.get("gold", 0),
+                silver=led.get("silver", 0),
+                bronze=led.get("bronze", 0),
+                ranking_points=float(led.get("points") or 0.0),
+                award_points=float(awards.get(pid) or 0.0),
+            ))
+        PlayerStats.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_alter_pendingeditprofile_profile_image_and_more'),
+        ('competitions', '0014_payment_report_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('player', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='accounts.userprofile')),
+                ('competitions', models.PositiveIntegerField(default=0, verbose_name='تعداد مسابقات')),
+                ('gold', models.PositiveIntegerField(default=0, verbose_name='طلا')),
+                ('silver', models.PositiveIntegerField(default=0, verbose_name='نقره')),
+                ('bronze', models.PositiveIntegerField(default=0, verbose_name='برنز')),
+                ('ranking_points', models.FloatField(default=0.0, verbose_name='امتیاز نتایج')),
+                ('award_points', models.FloatField(default=0.0, verbose_name='امتیاز مشارکت')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'آمار بازیکن',
+                'verbose_name_plural': 'آمار بازیکنان',
+                'indexes': [models.Index(fields=['ranking_points'], name='competition_ranking_a549f2_idx')],
+            },
+        ),
+        migrations.RunPython(fill_player_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.13 on 2026-10-18 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('competitions', '0015_playerstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_type', models.CharField(choices=[('player', 'بازیکن'), ('coach', 'مربی'), ('club', 'باشگاه'), ('board', 'هیئت')], max_length=16)),
+                ('subject_id', models.IntegerField()),
+                ('scope', models.CharField(choices=[('overall', 'کل'), ('season', 'فصل'), ('competition', 'مسابقه')], max_length=16)),
+                ('scope_key', models.CharField(blank=True, default='', max_length=32)),
+                ('gender', models.CharField(blank=True, default='', max_length=10)),
+                ('rank', models.PositiveIntegerField(verbose_name='رتبه')),
+                ('points', models.FloatField(default=0.0, verbose_name='امتیاز')),
+                ('gold', models.PositiveIntegerField(default=0, verbose_name='طلا')),
+                ('silver', models.PositiveIntegerField(default=0, verbose_name='نقره')),
+                ('bronze', models.PositiveIntegerField(default=0, verbose_name='برنز')),
+                ('generated_at', models.DateTimeField()),
+                ('age_category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='competitions.agecategory')),
+            ],
+            options={
+                'verbose_name': 'ردیف رده‌بندی',
+                'verbose_name_plural': 'جدول‌های رده‌بندی',
+                'indexes': [models.Index(fields=['subject_type', 'scope', 'scope_key', 'gender', 'age_category', 'rank'], name='competition_subject_679b60_idx')],
+            },
+        ),
+    ]
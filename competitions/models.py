@@ -18,6 +18,7 @@ from typing import List, Optional
 from django.utils.translation import gettext_lazy as _
 
 from accounts.models import UserProfile, TkdClub, TkdBoard
+from common.jalali import jalali_str
 from django.conf import settings
 
 from django.db import models
@@ -281,9 +282,8 @@ class KyorugiCompetition(RegistrationManualMixin, models.Model):
 
     # اوزان مجاز این مسابقه از روی تخصیص زمین‌ها
     def allowed_weight_ids(self) -> set[int]:
-        return set(
-            self.mat_assignments.values_list('weights__id', flat=True)
-        )
+        from .services.eligibility import eligibility_for
+        return eligibility_for(self).weight_ids
 
 # =========================
 # سایر موجودیت‌های مسابقه
@@ -543,6 +543,7 @@ class Enrollment(models.Model):
             models.Index(fields=["club"]),
             models.Index(fields=["board"]),
             models.Index(fields=["discount_code"]),
+            models.Index(fields=["is_paid", "paid_at"]),  # گزارش مالی
         ]
 
 
@@ -710,7 +711,8 @@ class RankingAward(models.Model):
     def __str__(self):
         return f"Award(enrollment={self.enrollment_id})"
 
-def _award_points_after_payment(enrollment):
+def _award_defaults(enrollment):
+    """فیلدهای RankingAward یک ثبت‌نام (مربی/باشگاه/هیئت در نبودِ اسنپ‌شات از پروفایل بازیکن)."""
     player = enrollment.player
 
     coach = enrollment.coach or (player.coach if getattr(player, "coach_id", None) else None)
@@ -721,7 +723,7 @@ def _award_points_after_payment(enrollment):
         or (player.tkd_board if getattr(player, "tkd_board_id", None) else None)
     )
 
-    defaults = dict(
+    return dict(
         player=player, coach=coach, club=club, board=board,
         player_name=f"{getattr(player,'first_name','')} {getattr(player,'last_name','')}".strip(),
         coach_name=(f"{getattr(coach,'first_name','')} {getattr(coach,'last_name','')}".strip() if coach else ""),
@@ -733,6 +735,11 @@ def _award_points_after_payment(enrollment):
         points_board=0.5 if board else 0.0,
     )
 
+
+def _award_points_after_payment(enrollment):
+    defaults = _award_defaults(enrollment)
+    player, coach, club, board = (defaults[k] for k in ("player", "coach", "club", "board"))
+
     try:
         award, created = RankingAward.objects.get_or_create(
             enrollment=enrollment,
@@ -762,6 +769,53 @@ def _award_points_after_payment(enrollment):
             ranking_total=F("ranking_total") + award.points_board
         )
 
+    from accounts.dashboard import invalidate_dashboards
+    invalidate_dashboards(
+        club_ids=[getattr(club, "pk", None), player.club_id],
+        board_ids=[getattr(board, "pk", None), player.tkd_board_id],
+    )
+
+
+def award_points_for_enrollments(enrollment_ids):
+    """
+    نسخهٔ گروهی _award_points_after_payment برای ثبت‌نام‌هایی که با bulk_create ساخته شده‌اند
+    (بدون سیگنال): ثبت‌نام‌ها با یک کوئری خوانده، جوایز یک‌جا ساخته و امتیازها با
+    _apply_ledger_deltas (یک UPDATE گروهی به‌ازای هر جدول) اعمال می‌شوند.
+    """
+    from collections import defaultdict
+
+    enrollments = (
+        Enrollment.objects.filter(pk__in=list(enrollment_ids), is_paid=True, ranking_award__isnull=True)
+        .select_related(
+            "player__coach", "player__club__tkd_board", "player__tkd_board",
+            "coach", "club__tkd_board", "board",
+        )
+    )
+    awards, deltas = [], defaultdict(float)
+    club_ids, board_ids = set(), set()
+    for enrollment in enrollments:
+        award = RankingAward(enrollment=enrollment, **_award_defaults(enrollment))
+        awards.append(award)
+        for subject_type, subject, points in (
+            (RankingTransaction.SUBJECT_PLAYER, award.player, award.points_player),
+            (RankingTransaction.SUBJECT_COACH, award.coach, award.points_coach),
+            (RankingTransaction.SUBJECT_CLUB, award.club, award.points_club),
+            (RankingTransaction.SUBJECT_BOARD, award.board, award.points_board),
+        ):
+            if subject:
+                deltas[(subject_type, subject.pk)] += points
+        club_ids.add(award.player.club_id)
+        board_ids.add(award.player.tkd_board_id)
+
+    if not awards:
+        return 0
+    RankingAward.objects.bulk_create(awards)
+    _apply_ledger_deltas(deltas)
+
+    from accounts.dashboard import invalidate_dashboards
+    invalidate_dashboards(club_ids=club_ids, board_ids=board_ids)
+    return len(awards)
+
 
 
 class KyorugiResult(models.Model):
@@ -856,138 +910,156 @@ class KyorugiResult(models.Model):
         self.full_clean()
         super().save(*args, **kwargs)
 
-        # idempotent: اول rollback، بعد اعمال جدید
-        _rollback_result_points(self)
-        _apply_result_points(self)
+        # idempotent: اول rollback، بعد اعمال جدید (فقط تغییر خالص نوشته می‌شود)
+        from .services.player_stats_service import refresh_player_stats
+        refresh_player_stats(sync_result_points([self]))
 
 
-def _rollback_result_points(result: "KyorugiResult"):
-    """
-    تراکنش‌های قبلی همین result را از ranking_total کم می‌کند و حذف می‌کند.
-    """
-    txs = RankingTransaction.objects.filter(result=result)
-    if not txs.exists():
-        return
+# مقام‌های نتیجه → (مدال، امتیاز بازیکن)
+RESULT_MEDAL_POINTS = (
+    ("gold_enrollment",    "gold",   3.0),
+    ("silver_enrollment",  "silver", 2.0),
+    ("bronze1_enrollment", "bronze", 1.0),
+    ("bronze2_enrollment", "bronze", 1.0),
+)
+# سهم مربی/باشگاه/هیئت از امتیاز بازیکن
+LEDGER_SHARES = (("coach", 0.30), ("club", 0.20), ("board", 0.20))
+LEDGER_UPDATE_CHUNK = 500
 
-    for tx in txs:
-        pts = float(tx.points or 0.0)
-        if pts == 0:
-            continue
 
-        if tx.subject_type == RankingTransaction.SUBJECT_PLAYER:
-            UserProfile.objects.filter(pk=tx.subject_id).update(
-                ranking_competition=F("ranking_competition") - pts,
-                ranking_total=F("ranking_total") - pts,
-            )
-        elif tx.subject_type == RankingTransaction.SUBJECT_COACH:
-            UserProfile.objects.filter(pk=tx.subject_id).update(
-                ranking_total=F("ranking_total") - pts
-            )
-        elif tx.subject_type == RankingTransaction.SUBJECT_CLUB:
-            TkdClub.objects.filter(pk=tx.subject_id).update(
-                ranking_total=F("ranking_total") - pts
-            )
-        elif tx.subject_type == RankingTransaction.SUBJECT_BOARD:
-            TkdBoard.objects.filter(pk=tx.subject_id).update(
-                ranking_total=F("ranking_total") - pts
-            )
+def _rollback_result_points(results, deltas):
+    """
+    اثر تراکنش‌های قبلی این نتایج را (با یک کوئری گروهی) از deltas کم و تراکنش‌ها را حذف می‌کند.
+    بازیکنانی را که قبلاً از این نتایج امتیاز گرفته بودند برمی‌گرداند.
+    """
+    txs = RankingTransaction.objects.filter(result__in=results)
+    rows = list(txs.order_by().values("subject_type", "subject_id").annotate(total=models.Sum("points")))
+    if not rows:
+        return set()
 
+    for row in rows:
+        deltas[(row["subject_type"], row["subject_id"])] -= float(row["total"] or 0.0)
     txs.delete()
+    return {r["subject_id"] for r in rows if r["subject_type"] == RankingTransaction.SUBJECT_PLAYER}
 
 
-def _apply_result_points(result: "KyorugiResult"):
+def _apply_result_points(results, deltas):
     """
     امتیازدهی مطابق نیاز:
     gold=3, silver=2, bronze=1, bronze2=1
     coach=30% of player points
     club=20% of player points
     board=20% of player points
+
+    تراکنش‌های دفتر امتیاز یک‌جا ساخته و جمعشان به deltas اضافه می‌شود
+    (بازیکنان امتیازگرفته برگردانده می‌شوند).
     """
-    medal_map = [
-        ("gold",   result.gold_enrollment,   3.0),
-        ("silver", result.silver_enrollment, 2.0),
-        ("bronze", result.bronze1_enrollment, 1.0),
-        ("bronze", result.bronze2_enrollment, 1.0),
-    ]
+    en_ids = {
+        getattr(r, f"{field}_id")
+        for r in results for field, _, _ in RESULT_MEDAL_POINTS
+        if getattr(r, f"{field}_id")
+    }
+    enrollments = {
+        e["pk"]: e
+        for e in Enrollment.objects.filter(pk__in=en_ids)
+        .values("pk", "player_id", "coach_id", "club_id", "board_id")
+    }
 
     tx_bulk = []
-
-    for medal, en, p_points in medal_map:
-        if not en:
-            continue
-
-        player = en.player
-        coach  = en.coach
-        club   = en.club
-        board  = en.board
-
-        coach_points = round(p_points * 0.30, 2) if coach else 0.0
-        club_points  = round(p_points * 0.20, 2) if club else 0.0
-        board_points = round(p_points * 0.20, 2) if board else 0.0
-
-        # دفتر امتیاز (ledger)
-        tx_bulk.append(RankingTransaction(
-            competition=result.competition,
-            result=result,
-            subject_type=RankingTransaction.SUBJECT_PLAYER,
-            subject_id=player.pk,
-            medal=medal,
-            points=p_points,
-        ))
-
-        if coach and coach_points:
-            tx_bulk.append(RankingTransaction(
-                competition=result.competition,
-                result=result,
-                subject_type=RankingTransaction.SUBJECT_COACH,
-                subject_id=coach.pk,
-                medal=medal,
-                points=coach_points,
-            ))
-
-        if club and club_points:
-            tx_bulk.append(RankingTransaction(
-                competition=result.competition,
-                result=result,
-                subject_type=RankingTransaction.SUBJECT_CLUB,
-                subject_id=club.pk,
-                medal=medal,
-                points=club_points,
-            ))
-
-        if board and board_points:
-            tx_bulk.append(RankingTransaction(
-                competition=result.competition,
-                result=result,
-                subject_type=RankingTransaction.SUBJECT_BOARD,
-                subject_id=board.pk,
-                medal=medal,
-                points=board_points,
-            ))
-
-        # اعمال به totals
-        UserProfile.objects.filter(pk=player.pk).update(
-            ranking_competition=F("ranking_competition") + p_points,
-            ranking_total=F("ranking_total") + p_points,
-        )
-        if coach and coach_points:
-            UserProfile.objects.filter(pk=coach.pk).update(
-                ranking_total=F("ranking_total") + coach_points
-            )
-        if club and club_points:
-            TkdClub.objects.filter(pk=club.pk).update(
-                ranking_total=F("ranking_total") + club_points
-            )
-        if board and board_points:
-            TkdBoard.objects.filter(pk=board.pk).update(
-                ranking_total=F("ranking_total") + board_points
-            )
+    players = set()
+    for result in results:
+        for field, medal, p_points in RESULT_MEDAL_POINTS:
+            en = enrollments.get(getattr(result, f"{field}_id"))
+            if not en:
+                continue
+            subjects = [(RankingTransaction.SUBJECT_PLAYER, en["player_id"], p_points)]
+            for subject_type, share in LEDGER_SHARES:
+                subject_id = en[f"{subject_type}_id"]
+                if subject_id:
+                    subjects.append((subject_type, subject_id, round(p_points * share, 2)))
+
+            for subject_type, subject_id, points in subjects:
+                tx_bulk.append(RankingTransaction(
+                    competition_id=result.competition_id,
+                    result=result,
+                    subject_type=subject_type,
+                    subject_id=subject_id,
+                    medal=medal,
+                    points=points,
+                ))
+                deltas[(subject_type, subject_id)] += points
+            players.add(en["player_id"])
 
     if tx_bulk:
         RankingTransaction.objects.bulk_create(tx_bulk)
+    return players
 
 
-    
+def _delta_case(by_pk):
+    return models.Case(
+        *[models.When(pk=pk, then=models.Value(d)) for pk, d in by_pk.items()],
+        default=models.Value(0.0),
+        output_field=models.FloatField(),
+    )
+
+
+def _apply_ledger_deltas(deltas):
+    """
+    تغییر خالص هر (subject_type, subject_id) را با یک UPDATE گروهی به‌ازای هر جدول اعمال می‌کند:
+    بازیکن → ranking_competition و ranking_total، مربی → ranking_total (هر دو روی UserProfile)،
+    باشگاه و هیئت → ranking_total. شناسه‌ها مرتب قفل می‌شوند تا ترتیب قفل‌ها ثابت بماند.
+    """
+    profile_total, profile_comp, clubs, boards = {}, {}, {}, {}
+    for (subject_type, subject_id), delta in deltas.items():
+        delta = round(delta, 6)
+        if not subject_id or not delta:
+            continue
+        if subject_type == RankingTransaction.SUBJECT_PLAYER:
+            profile_comp[subject_id] = profile_comp.get(subject_id, 0.0) + delta
+            profile_total[subject_id] = profile_total.get(subject_id, 0.0) + delta
+        elif subject_type == RankingTransaction.SUBJECT_COACH:
+            profile_total[subject_id] = profile_total.get(subject_id, 0.0) + delta
+        elif subject_type == RankingTransaction.SUBJECT_CLUB:
+            clubs[subject_id] = delta
+        elif subject_type == RankingTransaction.SUBJECT_BOARD:
+            boards[subject_id] = delta
+
+    for model, ids in ((UserProfile, profile_total), (TkdClub, clubs), (TkdBoard, boards)):
+        ids = sorted(ids)
+        for i in range(0, len(ids), LEDGER_UPDATE_CHUNK):
+            chunk = ids[i:i + LEDGER_UPDATE_CHUNK]
+            if model is UserProfile:
+                comp = {pk: profile_comp[pk] for pk in chunk if pk in profile_comp}
+                fields = {"ranking_total": F("ranking_total") + _delta_case({pk: profile_total[pk] for pk in chunk})}
+                if comp:
+                    fields["ranking_competition"] = F("ranking_competition") + _delta_case(comp)
+            else:
+                source = clubs if model is TkdClub else boards
+                fields = {"ranking_total": F("ranking_total") + _delta_case({pk: source[pk] for pk in chunk})}
+            model.objects.filter(pk__in=chunk).update(**fields)
+
+    # شمارنده‌های داشبورد باشگاه/هیئت (جمع امتیاز اعضا)
+    from accounts.dashboard import invalidate_dashboards
+    invalidate_dashboards(club_ids=clubs, board_ids=boards)
+
+
+@transaction.atomic
+def sync_result_points(results) -> set:
+    """
+    دفتر امتیاز نتایج داده‌شده را (idempotent) بازنویسی می‌کند: تراکنش‌های قبلی حذف و
+    تراکنش‌های جدید ساخته می‌شوند و فقط تغییر خالص هر شخص/باشگاه/هیئت اعمال می‌شود.
+    بازیکنان درگیر (قبلی و جدید) را برای بازسازی PlayerStats برمی‌گرداند.
+    """
+    from collections import defaultdict
+
+    results = [r for r in results if r.pk]
+    if not results:
+        return set()
+    deltas = defaultdict(float)
+    players = _rollback_result_points(results, deltas)
+    players |= _apply_result_points(results, deltas)
+    _apply_ledger_deltas(deltas)
+    return players
 
 
 # competitions/models.py (افزودنی)
@@ -1017,6 +1089,74 @@ class RankingTransaction(models.Model):
             models.Index(fields=["result"]),
         ]
 
+
+class PlayerStats(models.Model):
+    """
+    آمار تجمیعی هر بازیکن (یک ردیف به‌ازای هر پروفایل) که داشبوردها و گزارش‌ها می‌خوانند.
+    با services.player_stats_service به‌صورت افزایشی (نتایج، دفتر امتیاز، پرداخت ثبت‌نام)
+    نگه‌داری و با دستور rebuild_player_stats از صفر ساخته می‌شود.
+    """
+    player = models.OneToOneField(
+        UserProfile, on_delete=models.CASCADE, primary_key=True, related_name="stats",
+    )
+    competitions   = models.PositiveIntegerField("تعداد مسابقات", default=0)  # مسابقات با ثبت‌نام معتبر
+    gold           = models.PositiveIntegerField("طلا", default=0)
+    silver         = models.PositiveIntegerField("نقره", default=0)
+    bronze         = models.PositiveIntegerField("برنز", default=0)
+    ranking_points = models.FloatField("امتیاز نتایج", default=0.0)    # جمع RankingTransaction بازیکن
+    award_points   = models.FloatField("امتیاز مشارکت", default=0.0)   # جمع RankingAward.points_player
+    updated_at     = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "آمار بازیکن"
+        verbose_name_plural = "آمار بازیکنان"
+        indexes = [
+            models.Index(fields=["ranking_points"]),
+        ]
+
+    def __str__(self):
+        return f"Stats(player={self.player_id})"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    ردیف جدول ردیف‌بندی (snapshot) که به‌صورت دوره‌ای از RankingTransaction ساخته می‌شود
+    (services.leaderboard_service / دستور build_leaderboards).
+    gender خالی و age_category=None یعنی «همه».
+    """
+    SCOPE_OVERALL     = "overall"
+    SCOPE_SEASON      = "season"        # سال شمسی تاریخ برگزاری
+    SCOPE_COMPETITION = "competition"
+    SCOPE_CHOICES = [
+        (SCOPE_OVERALL,     "کل"),
+        (SCOPE_SEASON,      "فصل"),
+        (SCOPE_COMPETITION, "مسابقه"),
+    ]
+
+    subject_type = models.CharField(max_length=16, choices=RankingTransaction.SUBJECT_CHOICES)
+    subject_id   = models.IntegerField()
+    scope        = models.CharField(max_length=16, choices=SCOPE_CHOICES)
+    scope_key    = models.CharField(max_length=32, blank=True, default="")  # سال / id مسابقه
+    gender       = models.CharField(max_length=10, blank=True, default="")
+    age_category = models.ForeignKey(AgeCategory, null=True, blank=True, on_delete=models.CASCADE, related_name="+")
+
+    rank       = models.PositiveIntegerField("رتبه")
+    points     = models.FloatField("امتیاز", default=0.0)
+    gold       = models.PositiveIntegerField("طلا", default=0)
+    silver     = models.PositiveIntegerField("نقره", default=0)
+    bronze     = models.PositiveIntegerField("برنز", default=0)
+    generated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "ردیف رده‌بندی"
+        verbose_name_plural = "جدول‌های رده‌بندی"
+        indexes = [
+            models.Index(fields=["subject_type", "scope", "scope_key", "gender", "age_category", "rank"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject_type}#{self.subject_id} {self.scope}:{self.scope_key} → {self.rank}"
+
 #-------------------------------------------------------------سمینار----------------------------------------------------------------------------
 # -----------------------
 # Helpers: public_id
@@ -1146,13 +1286,7 @@ class Seminar(models.Model):
 
     @staticmethod
     def _date_to_jalali_str(d) -> str:
-        if not d:
-            return ""
-        try:
-            j = jdatetime.date.fromgregorian(date=d)
-            return f"{j.year:04d}/{j.month:02d}/{j.day:02d}"
-        except Exception:
-            return ""
+        return jalali_str(d) or ""
 
     @property
     def registration_start_jalali(self) -> str: return self._date_to_jalali_str(self.registration_start)
@@ -1207,6 +1341,9 @@ class SeminarRegistration(models.Model):
         verbose_name = "ثبت‌نام سمینار"
         verbose_name_plural = "ثبت‌نام‌های سمینار"
         unique_together = ("seminar", "user")
+        indexes = [
+            Index(fields=["is_paid", "paid_at"]),  # گزارش مالی
+        ]
 
     def __str__(self) -> str:
         return f"{self.user} → {self.seminar}"
@@ -1675,6 +1812,7 @@ class PoomsaeEnrollment(models.Model):
             models.Index(fields=["competition", "mode", "poomsae_type"]),
             models.Index(fields=["competition", "player"]),
             models.Index(fields=["competition", "team"]),
+            models.Index(fields=["is_paid", "paid_at"]),  # گزارش مالی
         ]
 
 
@@ -3,27 +3,28 @@ from __future__ import annotations
 from rest_framework import serializers
 from django.utils import timezone
 from datetime import date as _date, datetime as _datetime, timedelta
-import jdatetime
 from django.core.files.storage import default_storage
 import re
 from django.db.models import Q
 from django.db import transaction
 from django.conf import settings
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, OuterRef, Prefetch
 from typing import Optional
 
 from django.shortcuts import get_object_or_404
 
 
 from accounts.models import UserProfile, TkdClub, TkdBoard
+from common.jalali import jalali_str, parse_date, to_jalali
 from math import inf
 
 from .models import (
     KyorugiCompetition, CompetitionImage, MatAssignment, Belt, Draw, Match, BeltGroup,
     CompetitionFile, CoachApproval, WeightCategory, Enrollment, Seminar, SeminarRegistration,
     PoomsaeCompetition, AgeCategory, PoomsaeImage, PoomsaeFile, PoomsaeDivision, PoomsaeEnrollment,
-    PoomsaeCoachApproval,
+    PoomsaeCoachApproval, LeaderboardEntry,
 )
+from .services.eligibility import competition_weight_index, eligibility_for
 
 BELT_FA = {"white":"سفید","yellow":"زرد","green":"سبز","blue":"آبی","red":"قرمز","black":"مشکی"}
 
@@ -104,23 +105,6 @@ class MatchPublicSerializer(serializers.ModelSerializer):
     def get_player_a(self, obj): return _full_name(getattr(obj, "player_a", None)) or ""
     def get_player_b(self, obj): return _full_name(getattr(obj, "player_b", None)) or ""
 
-class DrawWithMatchesSerializer(serializers.ModelSerializer):
-    belt_group = serializers.CharField(source="belt_group.label", allow_null=True)
-    weight_category = serializers.CharField(source="weight_category.name", allow_null=True)
-    matches = serializers.SerializerMethodField()
-
-    class Meta:
-        model = Draw
-        fields = ("id", "size", "belt_group", "weight_category", "matches")
-
-    def get_matches(self, obj: Draw):
-        # اگر related_name روی مدل Match ندارید، از match_set استفاده می‌شود
-        qs = (getattr(obj, "matches", None) or obj.match_set)\
-                .select_related("player_a", "player_b")\
-                .order_by("round_no", "slot_a", "id")
-        return MatchPublicSerializer(qs, many=True).data
-
-
 
 def _as_local_date(v):
     if not v:
@@ -133,11 +117,7 @@ def _as_local_date(v):
     return None
 
 def _g2j(d):
-    if not d:
-        return None
-    if isinstance(d, _datetime):
-        d = d.date()
-    return jdatetime.date.fromgregorian(date=d)
+    return to_jalali(d)
 
 def _j2str(jd):
     return f"{jd.year:04d}/{jd.month:02d}/{jd.day:02d}" if jd else None
@@ -147,17 +127,7 @@ def _j2str(jd):
 
 def _to_jalali_date_str(d):
     """Gregorian date/datetime -> 'YYYY/MM/DD' jalali (safe)."""
-    if not d:
-        return None
-    # اگر datetime است، قبل از تبدیل صرفاً تاریخ را بگیر
-    if isinstance(d, _datetime):
-        # اگر آگاه به تایم‌زون است، به لوکال تبدیل کن بعد date() بگیر
-        d = timezone.localtime(d).date() if timezone.is_aware(d) else d.date()
-    try:
-        jd = jdatetime.date.fromgregorian(date=d)
-        return f"{jd.year:04d}/{jd.month:02d}/{jd.day:02d}"
-    except Exception:
-        return None
+    return jalali_str(d)
 
 def _to_jalali_date_str_safe(d):
     # الان با _to_jalali_date_str یکی شد؛ نگهش داریم برای سازگاری
@@ -168,44 +138,11 @@ def _to_greg_from_str_jalali(s: str):
     ورودی: 'YYYY/MM/DD' یا 'YYYY-MM-DD' (جلالی یا میلادی).
     خروجی: datetime.date گریگوریان. سال >=1700 میلادی فرض می‌شود.
     """
-    if not s:
-        return None
-    # حذف ZWNJ/RTL/… و یکدست‌سازی ارقام و جداکننده
-    t = str(s)
-    t = re.sub(r"[\u200e\u200f\u200c\u202a-\u202e]", "", t)
-    t = _to_en_digits(t).strip().replace("-", "/")
-    try:
-        y, m, d = [int(x) for x in t.split("/")[:3]]
-    except Exception:
-        return None
-    try:
-        if y >= 1700:
-            return _date(y, m, d)
-        # جلالی → گریگوریان (date، نه datetime)
-        return jdatetime.date(y, m, d).togregorian()
-    except Exception:
-        return None
+    return parse_date(s)
 
 
 def _parse_jalali_str(s):
-    if not s:
-        return None
-    if isinstance(s, (_date, _datetime)):
-        g = s.date() if isinstance(s, _datetime) else s
-        return jdatetime.date.fromgregorian(date=g)
-    t = _to_en_digits(str(s)).strip().strip('"').strip("'").replace("-", "/")
-    parts = t.split("/")[:3]
-    try:
-        y, m, d = [int(x) for x in parts]
-    except Exception:
-        return None
-    try:
-        if y >= 1700:  # Gregorian
-            g = _date(y, m, d)
-            return jdatetime.date.fromgregorian(date=g)
-        return jdatetime.date(y, m, d)
-    except Exception:
-        return None
+    return to_jalali(s)
 
 def _eligible_real_matches_qs(comp):
     """
@@ -293,6 +230,8 @@ def _player_belt_code_from_profile(prof: UserProfile):
 def _find_belt_group_obj(comp, player_belt_code: str):
     if not comp or not player_belt_code:
         return None
+    if isinstance(comp, KyorugiCompetition):
+        return eligibility_for(comp).belt_group_for(player_belt_code)
     for g in comp.belt_groups.all().prefetch_related("belts"):
         for b in g.belts.all():
             nm = getattr(b, "name", "") or getattr(b, "label", "")
@@ -301,6 +240,9 @@ def _find_belt_group_obj(comp, player_belt_code: str):
     return None
 
 def _find_belt_group_label(comp, player_belt_code: str)-> Optional[str]:
+    if isinstance(comp, KyorugiCompetition):
+        g = eligibility_for(comp).belt_group_for(player_belt_code)
+        return getattr(g, "label", None) if g else None
     for g in comp.belt_groups.all().prefetch_related("belts"):
         codes = set()
         for b in g.belts.all():
@@ -313,12 +255,8 @@ def _find_belt_group_label(comp, player_belt_code: str)-> Optional[str]:
     return None
 
 def _collect_comp_weights(comp):
-    """WeightCategoryهایی که برای مسابقه روی زمین‌ها ست شده‌اند."""
-    ws = set()
-    for ma in comp.mat_assignments.all().prefetch_related("weights"):
-        for w in ma.weights.all():
-            ws.add(w)
-    return list(ws)
+    """WeightCategoryهایی که برای مسابقه روی زمین‌ها ست شده‌اند (مرتب بر حداقل وزن)."""
+    return eligibility_for(comp).weight_categories
 
 def _wc_includes(wc, val: float) -> bool:
     tol = getattr(wc, "tolerance", 0) or 0
@@ -418,13 +356,7 @@ def _profile_locked_dict(prof: UserProfile):
         bd = getattr(p, "birth_date", None)
         if not bd:
             return None
-        if isinstance(bd, (_datetime, _date)):
-            return _to_jalali_date_str(bd)
-        jd = _parse_jalali_str(bd)
-        if jd:
-            return _j2str(jd)
-        g = _to_greg_from_str_jalali(bd)
-        return _to_jalali_date_str(g) if g else str(bd)
+        return jalali_str(bd) or str(bd)
 
     club_name = ""
     coach_name = ""
@@ -587,13 +519,7 @@ class KyorugiCompetitionDetailSerializer(serializers.ModelSerializer):
             bd = getattr(p, "birth_date", None)
             if not bd:
                 return None
-            if isinstance(bd, (_datetime, _date)):
-                return _to_jalali_date_str(bd)
-            jd = _parse_jalali_str(bd)
-            if jd:
-                return _j2str(jd)
-            g = _to_greg_from_str_jalali(bd)
-            return _to_jalali_date_str(g) if g else str(bd)
+            return jalali_str(bd) or str(bd)
 
         # باشگاه
         club_name = ""
@@ -751,7 +677,7 @@ class KyorugiCompetitionDetailSerializer(serializers.ModelSerializer):
         else:
             gender_ok = False
 
-        dob_j = _parse_jalali_str(getattr(prof, "birth_date", None))
+        dob_j = _parse_jalali_str(getattr(prof, "birth_date_greg", None) or getattr(prof, "birth_date", None))
         from_j = _g2j(getattr(obj.age_category, "from_date", None)) if obj.age_category else None
         to_j   = _g2j(getattr(obj.age_category, "to_date", None)) if obj.age_category else None
         age_ok = True if not (from_j and to_j) else bool(dob_j and (from_j <= dob_j <= to_j))
@@ -807,7 +733,7 @@ class KyorugiCompetitionDetailSerializer(serializers.ModelSerializer):
         rg, pg = data["required_gender"], data["player_gender"]
         data["gender_ok"] = True if rg in (None, "", "both") else (pg and rg == pg)
 
-        dob_j = _parse_jalali_str(getattr(prof, "birth_date", None))
+        dob_j = _parse_jalali_str(getattr(prof, "birth_date_greg", None) or getattr(prof, "birth_date", None))
         data["player_dob"] = _j2str(dob_j) if dob_j else None
         from_j = _g2j(getattr(obj.age_category, "from_date", None)) if obj.age_category else None
         to_j   = _g2j(getattr(obj.age_category, "to_date", None)) if obj.age_category else None
@@ -947,16 +873,12 @@ class CompetitionRegistrationSerializer(serializers.Serializer):
         code = self._player_belt_code(player)
         if code:
             belt_group = _find_belt_group_obj(comp, code)
-        if comp.belt_groups.exists() and not belt_group:
+        if eligibility_for(comp).belt_groups and not belt_group:
             raise serializers.ValidationError({"belt_group": "کمربند شما با گروه‌های مسابقه سازگار نیست."})
         self._belt_group = belt_group
 
-        # انتخاب رده وزنی
-        chosen = None
-        for wc in _collect_comp_weights(comp):
-            if _gender_ok_for_wc(comp, getattr(wc, "gender", None)) and _wc_includes(wc, w):
-                chosen = wc
-                break
+        # انتخاب رده وزنی (نمایهٔ بازه‌ای مسابقه)
+        chosen = competition_weight_index(comp).find(w)
         if not chosen:
             raise serializers.ValidationError({"declared_weight": "هیچ رده وزنی متناسب با این وزن در مسابقه یافت نشد."})
         self._weight_category = chosen
@@ -1196,13 +1118,7 @@ class EnrollmentCardSerializer(serializers.ModelSerializer):
         bd = getattr(obj.player, "birth_date", None)
         if not bd:
             return None
-        if isinstance(bd, (_datetime, _date)):
-            return _to_jalali_date_str(bd)
-        jd = _parse_jalali_str(bd)
-        if jd:
-            return _j2str(jd)
-        g = _to_greg_from_str_jalali(bd)
-        return _to_jalali_date_str(g) if g else str(bd)
+        return jalali_str(bd) or str(bd)
 
     def get_photo(self, obj):
         request = self.context.get("request")
@@ -1222,10 +1138,11 @@ class EnrollmentCardSerializer(serializers.ModelSerializer):
         declared = getattr(obj, "declared_weight", None)
         if not declared:
             return None
-        for wc in _collect_comp_weights(obj.competition):
-            if _gender_ok_for_wc(obj.competition, getattr(wc, "gender", None)) and _wc_includes(wc, declared):
-                return wc
-        return None
+        # کارت‌های گروهی: رده‌ها از قبل با resolve_enrollment_weights حل شده‌اند
+        resolved = self.context.get("resolved_weights")
+        if resolved is not None and obj.pk in resolved:
+            return resolved[obj.pk]
+        return competition_weight_index(obj.competition).find(declared)
 
     def get_weight_name(self, obj):
         wc = self._pick_wc(obj)
@@ -1282,14 +1199,32 @@ class DrawWithMatchesSerializer(serializers.ModelSerializer):
     belt_group_label  = serializers.CharField(source="belt_group.label", read_only=True)
     weight_name       = serializers.CharField(source="weight_category.name", read_only=True)
     gender_display    = serializers.SerializerMethodField()
-    matches           = MatchSlimSerializer(many=True, read_only=True)
+    matches           = serializers.SerializerMethodField()
     class Meta:
         model = Draw
         fields = ("id","gender","gender_display","age_category_name","belt_group_label",
                   "weight_name","size","matches")
+
+    @staticmethod
+    def setup_queryset(qs):
+        """select_related/Prefetch لازم تا سریال‌سازی هر تعداد قرعه با دو کوئری انجام شود."""
+        return qs.select_related("age_category", "belt_group", "weight_category").prefetch_related(
+            Prefetch("matches", queryset=Match.objects.select_related("player_a", "player_b", "winner")
+                                                      .order_by("round_no", "slot_a", "id"))
+        )
+
     def get_gender_display(self, obj):
         return "آقایان" if obj.gender=="male" else ("بانوان" if obj.gender=="female" else obj.gender)
 
+    def get_matches(self, obj):
+        # اگر فراخوان Prefetch("matches") داده باشد همان را مصرف می‌کنیم؛ وگرنه یک کوئری برای همین قرعه
+        if "matches" in getattr(obj, "_prefetched_objects_cache", {}):
+            ms = sorted(obj.matches.all(), key=lambda m: (m.round_no, m.slot_a, m.id))
+        else:
+            ms = (obj.matches.select_related("player_a", "player_b", "winner")
+                  .order_by("round_no", "slot_a", "id"))
+        return MatchSlimSerializer(ms, many=True, context=self.context).data
+
 def _bracket_ready_for(comp):
     return bool(getattr(comp, "is_bracket_published", True)) and comp.draws.exists()
 
@@ -1307,24 +1242,27 @@ class KyorugiBracketSerializer(serializers.Serializer):
     def to_representation(self, comp):
         from .models import Match, Draw
 
-        draws_qs = (Draw.objects.filter(competition=comp).select_related("age_category", "belt_group", "weight_category")
-                   .prefetch_related("matches", "matches__player_a", "matches__player_b", "matches__winner")
-                     .order_by("weight_category__min_weight", "id"))
+        draws_qs = DrawWithMatchesSerializer.setup_queryset(
+            Draw.objects.filter(competition=comp).order_by("weight_category__min_weight", "id")
+        )
+        draw_list = list(draws_qs)
+        draws = DrawWithMatchesSerializer(draw_list, many=True, context=self.context).data
 
-        draws = DrawWithMatchesSerializer(draws_qs, many=True, context=self.context).data
+        # برنامهٔ هر زمین از همان Match های prefetch‌شده (بدون کوئری به‌ازای هر زمین)
+        per_mat = {}
+        for d in draw_list:
+            for mt in d.matches.all():
+                if mt.mat_no:
+                    per_mat.setdefault(mt.mat_no, []).append(mt)
 
         by_mat = []
         mat_count = comp.mat_count or 1
         for m in range(1, mat_count + 1):
-            qs = (
-                Match.objects.filter(draw__competition=comp, mat_no=m)
-                .order_by("match_number", "id")
-                .select_related("player_a", "player_b", "winner")
-            )
+            items = sorted(per_mat.get(m, []), key=lambda mt: (mt.match_number is not None, mt.match_number or 0, mt.id))
             by_mat.append({
                 "mat_no": m,
-                "count": qs.count(),
-                "matches": MatchSlimSerializer(qs, many=True, context=self.context).data,
+                "count": len(items),
+                "matches": MatchSlimSerializer(items, many=True, context=self.context).data,
             })
 
         return {
@@ -1343,17 +1281,6 @@ class KyorugiBracketSerializer(serializers.Serializer):
 # -------------------------------------------------
 # Seminars
 # -------------------------------------------------
-def _to_jalali_str(d):
-    if not d:
-        return None
-    if isinstance(d, _datetime):
-        d = d.date()
-    try:
-        jd = jdatetime.date.fromgregorian(date=d)
-        return jd.strftime("%Y/%m/%d")
-    except Exception:
-        return None
-
 def _abs_url(request, url_or_field):
     if not url_or_field:
         return None
@@ -1396,9 +1323,9 @@ class SeminarSerializer(serializers.ModelSerializer):
                             'registration_start_jalali','registration_end_jalali',
                             'event_date_jalali','poster_url','is_open_for_registration']
 
-    def get_registration_start_jalali(self, obj): return _to_jalali_str(obj.registration_start)
-    def get_registration_end_jalali(self, obj):   return _to_jalali_str(obj.registration_end)
-    def get_event_date_jalali(self, obj):         return _to_jalali_str(obj.event_date)
+    def get_registration_start_jalali(self, obj): return _to_jalali_date_str(obj.registration_start)
+    def get_registration_end_jalali(self, obj):   return _to_jalali_date_str(obj.registration_end)
+    def get_event_date_jalali(self, obj):         return _to_jalali_date_str(obj.event_date)
     def get_poster_url(self, obj):
         req = self.context.get('request')
         return _abs_url(req, obj.poster) if req else (obj.poster.url if getattr(obj.poster, "url", None) else None)
@@ -1816,13 +1743,7 @@ class PoomsaeCompetitionDetailSerializer(serializers.ModelSerializer):
             bd = getattr(p, "birth_date", None)
             if not bd:
                 return None
-            if isinstance(bd, (_datetime, _date)):
-                return _to_jalali_date_str(bd)
-            jd = _parse_jalali_str(bd)
-            if jd:
-                return _j2str(jd)
-            g = _to_greg_from_str_jalali(bd)
-            return _to_jalali_date_str(g) if g else str(bd)
+            return jalali_str(bd) or str(bd)
 
         # باشگاه
         club_name = ""
@@ -1994,7 +1915,7 @@ class PoomsaeCompetitionDetailSerializer(serializers.ModelSerializer):
         pg = _norm_gender(getattr(prof, "gender", None))
         gender_ok = True if rg in (None, "", "both") else (pg and rg == pg)
 
-        dob_j = _parse_jalali_str(getattr(prof, "birth_date", None))
+        dob_j = _parse_jalali_str(getattr(prof, "birth_date_greg", None) or getattr(prof, "birth_date", None))
         wins = _poomsae_age_windows(obj)
         age_ok = bool(dob_j and any(fr and to and (fr <= dob_j <= to) for fr, to in wins)) if wins else True
 
@@ -2044,7 +1965,7 @@ class PoomsaeCompetitionDetailSerializer(serializers.ModelSerializer):
         rg, pg = data["required_gender"], data["player_gender"]
         data["gender_ok"] = True if rg in (None, "", "both") else (pg and rg == pg)
 
-        dob_j = _parse_jalali_str(getattr(prof, "birth_date", None))
+        dob_j = _parse_jalali_str(getattr(prof, "birth_date_greg", None) or getattr(prof, "birth_date", None))
         data["player_dob"] = _j2str(dob_j) if dob_j else None
         data["age_ok"] = (bool(dob_j and any(fr and to and (fr <= dob_j <= to) for fr, to in wins))
                           if wins else True)
@@ -2080,7 +2001,7 @@ class PoomsaeRegistrationSerializer(serializers.Serializer):
 
     def _resolve_age_category_for_player(self, comp, player)-> Optional[AgeCategory]:
         """از M2M age_categories یا FK age_category بهترین رده سنی مطابق DOB بازیکن را بده."""
-        dob_j = _parse_jalali_str(getattr(player, "birth_date", None))
+        dob_j = _parse_jalali_str(getattr(player, "birth_date_greg", None) or getattr(player, "birth_date", None))
         if not dob_j:
             return None
         ags = list(comp.age_categories.all()) if hasattr(comp, "age_categories") else []
@@ -2342,13 +2263,7 @@ class PoomsaeEnrollmentCardSerializer(serializers.ModelSerializer):
         bd = getattr(obj.player, "birth_date", None)
         if not bd:
             return None
-        if isinstance(bd, (_datetime, _date)):
-            return _to_jalali_date_str(bd)
-        jd = _parse_jalali_str(bd)
-        if jd:
-            return _j2str(jd)
-        g = _to_greg_from_str_jalali(bd)
-        return _to_jalali_date_str(g) if g else str(bd)
+        return jalali_str(bd) or str(bd)
 
     def get_photo(self, obj):
         request = self.context.get("request")
@@ -2416,3 +2331,18 @@ class PoomsaeEnrollmentCardSerializer(serializers.ModelSerializer):
         # fallback عمومی
         m = AgeCategory.objects.filter(from_date__lte=g, to_date__gte=g).first()
         return getattr(m, "name", None)
+
+
+# -------------------------------------------------
+# Leaderboards
+# -------------------------------------------------
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """نام‌ها برای کل صفحه یک‌جا در context["names"] آماده می‌شوند."""
+    name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ["rank", "subject_id", "name", "points", "gold", "silver", "bronze"]
+
+    def get_name(self, obj):
+        return self.context.get("names", {}).get(obj.subject_id, "")
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+سند آمادهٔ جدول عمومی مسابقات (براکت).
+
+جدول منتشرشده یک‌بار به JSON تبدیل و در کش نگه داشته می‌شود؛ درخواست‌های بعدی
+(و درخواست‌های شرطی با ETag/Last-Modified) هیچ کوئری‌ای به پایگاه‌داده نمی‌زنند.
+هر تغییر در Match/Draw، شماره‌گذاری یا وضعیت انتشار، پس از commit نسخهٔ (generation) سند
+را بالا می‌برد؛ سند زیر کلید همان نسخه‌ای ذخیره می‌شود که پیش از ساخت خوانده شده، پس ساختی
+که با commit هم‌زمان شده زیر کلید مرده می‌نشیند. حذف مسابقه نسخه و نگاشت‌های کلید URL آن را
+هم پاک می‌کند.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+
+from common.cache_versions import bump_version, current_version
+
+CACHE_PREFIX = "kyorugi_bracket"
+
+
+@dataclass(frozen=True)
+class BracketDocument:
+    version: str                   # هش محتوا؛ همان ETag بدون کوتیشن
+    last_modified: float           # timestamp ساخت سند
+    ready: bool                    # منتشر شده و حداقل یک جدول کامل دارد
+    api_body: bytes = b""          # خروجی KyorugiBracketView
+    public_body: bytes = b""       # خروجی public_bracket_view
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+
+def _gen_key(competition_id: int) -> str:
+    return f"{CACHE_PREFIX}:gen:{competition_id}"
+
+
+def _doc_key(competition_id: int, generation: int) -> str:
+    return f"{CACHE_PREFIX}:doc:{competition_id}:{generation}"
+
+
+def _alias_key(alias: str) -> str:
+    return f"{CACHE_PREFIX}:alias:{alias}"
+
+
+def _timeout() -> int:
+    return settings.BRACKET_CACHE_TIMEOUT
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, cls=DjangoJSONEncoder, separators=(",", ":")).encode("utf-8")
+
+
+def build_bracket_document(competition_id: int) -> BracketDocument:
+    """براکت را از پایگاه‌داده می‌سازد (بدون کش)."""
+    from django.db.models import Exists, OuterRef
+    from competitions.models import KyorugiCompetition, Draw, Match
+    from competitions.serializers import DrawWithMatchesSerializer
+
+    try:
+        comp = KyorugiCompetition.objects.only("id", "title", "public_id", "bracket_published_at").get(pk=competition_id)
+    except KyorugiCompetition.DoesNotExist:
+        # نگاشت کلید URL کش‌شده ولی مسابقه حذف شده
+        raise Http404("KyorugiCompetition not found")
+    now = timezone.now().timestamp()
+
+    if not comp.is_bracket_published:
+        return BracketDocument(version=f"{comp.id}-unpublished", last_modified=now, ready=False)
+
+    # فقط براکت‌هایی که هیچ مسابقهٔ واقعیِ بدون شماره ندارند
+    unsafe = Match.objects.filter(
+        draw=OuterRef("pk"),
+        is_bye=False,
+        match_number__isnull=True,
+    )
+    draws = list(DrawWithMatchesSerializer.setup_queryset(
+        Draw.objects.filter(competition=comp)
+        .annotate(_has_unumbered=Exists(unsafe))
+        .filter(_has_unumbered=False)
+        .order_by("weight_category__min_weight", "id")
+    ))
+    if not draws:
+        return BracketDocument(version=f"{comp.id}-empty", last_modified=now, ready=False)
+
+    draws_data = DrawWithMatchesSerializer(draws, many=True).data
+    api_body = _dumps({
+        "competition": {"title": comp.title, "public_id": comp.public_id},
+        "draws": draws_data,
+    })
+    public_body = _dumps({
+        "board_logo_url": getattr(settings, "BOARD_LOGO_URL", None),
+        "draws": draws_data,
+    })
+    version = hashlib.sha1(api_body + public_body).hexdigest()[:20]
+    return BracketDocument(
+        version=version,
+        last_modified=now,
+        ready=True,
+        api_body=api_body,
+        public_body=public_body,
+    )
+
+
+def get_bracket_document(competition_id: int) -> BracketDocument:
+    """سند کش‌شده؛ در نبود آن یک‌بار ساخته و زیر نسخهٔ خوانده‌شده پیش از ساخت ذخیره می‌شود."""
+    key = _doc_key(competition_id, current_version(_gen_key(competition_id)))
+    doc = cache.get(key)
+    if doc is None:
+        doc = build_bracket_document(competition_id)
+        cache.set(key, doc, _timeout())
+    return doc
+
+
+def cached_competition_id(alias: str, loader: Callable[[], Optional[int]]) -> Optional[int]:
+    """
+    نگاشت کلید URL (id / public_id) → id مسابقه در کش؛ loader فقط بار اول صدا زده می‌شود.
+    None (مسابقهٔ ناموجود) کش نمی‌شود.
+    """
+    key = _alias_key(alias)
+    comp_id = cache.get(key)
+    if comp_id is None:
+        comp_id = loader()
+        if comp_id is not None:
+            cache.set(key, comp_id, _timeout())
+    return comp_id
+
+
+def invalidate_bracket(competition_id: Optional[int]) -> None:
+    """باطل‌کردن سند پس از commit: نسخه بالا می‌رود و سندهای قبلی (و ساخت‌های در جریان) مرده می‌شوند."""
+    if not competition_id:
+        return
+    transaction.on_commit(lambda: bump_version(_gen_key(competition_id)))
+
+
+def forget_competition(competition_id: int, public_id: Optional[str] = None) -> None:
+    """حذف مسابقه: نسخهٔ سند و نگاشت‌های id / public_id آن، همین حالا و دوباره پس از commit."""
+    keys = [_gen_key(competition_id), _alias_key(f"key:{competition_id}")]
+    if public_id:
+        keys += [_alias_key(f"key:{public_id}"), _alias_key(f"public:{public_id}")]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,13 +1,18 @@
 # competitions/services/draw_service.py
 from __future__ import annotations
 
+import calendar
+import hashlib
 import random
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Optional, Tuple, Set
 
+import jdatetime
 from django.db import transaction
 from django.utils import timezone
-from django.core.management import call_command
+
+from competitions.services.bracket_service import invalidate_bracket
 
 ELIGIBLE_STATUSES = ("paid", "confirmed", "accepted", "completed")
 
@@ -15,6 +20,14 @@ ELIGIBLE_STATUSES = ("paid", "confirmed", "accepted", "completed")
 REPEAT_PAIR_PENALTY = 100
 SAME_CLUB_PENALTY = 1  # فقط وقتی تعداد واقعی بازیکنان > club_threshold باشد
 
+# روش چیدمان بازیکن‌ها روی اسلات‌ها
+SOLVER_RANDOM = "random"    # چند بار بُر زدن تصادفی با seed (رفتار قبلی)
+SOLVER_OPTIMAL = "optimal"  # جفت‌سازی قطعیِ کم‌هزینه
+SOLVERS = (SOLVER_RANDOM, SOLVER_OPTIMAL)
+
+# تا این تعداد بازیکن، جفت‌سازی با برنامه‌ریزی پویا روی زیرمجموعه‌ها دقیقاً بهینه است
+EXACT_SOLVER_MAX_PLAYERS = 12
+
 
 @dataclass
 class _Entry:
@@ -135,92 +148,340 @@ def _best_order_by_penalty_on_slots(
     history_pairs: Set[Tuple[int, int]],
     effective_count: int,
     rng_seed: Optional[str] = None,
+    solver: str = SOLVER_RANDOM,
 ) -> List[_Entry]:
     """کم‌هزینه‌ترین ترتیب بازیکن‌ها فقط روی اسلات‌های غیر BYE را پیدا می‌کند."""
+    if solver not in SOLVERS:
+        raise ValueError(f"روش چیدمان نامعتبر است: {solver}")
     if len(players_only) <= 2:
         return players_only
 
+    if solver == SOLVER_OPTIMAL:
+        return _optimal_order_on_slots(
+            players_only,
+            non_bye_slots=non_bye_slots,
+            size=size,
+            club_threshold=club_threshold,
+            history_pairs=history_pairs,
+            effective_count=effective_count,
+            rng_seed=rng_seed,
+        )
+
+    ev = _SwapEvaluator(
+        players_only,
+        non_bye_slots=non_bye_slots,
+        size=size,
+        effective_count=effective_count,
+        club_threshold=club_threshold,
+        history_pairs=history_pairs,
+    )
     rnd = random.Random(rng_seed)
     best = None
     best_cost = None
 
+    # همان دنبالهٔ بُر زدن قبلی (روی اندیس‌ها)؛ با seed یکسان نتیجه عوض نمی‌شود
     for _ in range(max(1, attempts)):
-        tmp = players_only[:]
+        tmp = list(range(len(players_only)))
         rnd.shuffle(tmp)
-        cost = _order_cost_for_slots(
-            tmp,
-            non_bye_slots=non_bye_slots,
-            size=size,
-            effective_count=effective_count,
-            club_threshold=club_threshold,
-            history_pairs=history_pairs,
-        )
+        cost = ev.load(tmp)
         if best_cost is None or cost < best_cost:
             best_cost = cost
             best = tmp
             if best_cost == 0:
                 break
 
-    return best or players_only
+    return [players_only[i] for i in best] if best else players_only
 
 
-# ---------- سرویس اصلی ----------
+# ---------- حل‌کنندهٔ قطعی ----------
 
-@transaction.atomic
-def create_draw_for_group(
+def _slot_layout(non_bye_slots: List[int], size: int) -> Tuple[List[Tuple[int, int]], List[int]]:
+    """
+    اندیس‌های non_bye_slots را به دو دسته تقسیم می‌کند:
+    بازی‌های واقعی دور اول (هر دو اسلات بازیکن دارند) و اسلات‌هایی که حریفشان BYE است.
+    """
+    pos = {s: i for i, s in enumerate(non_bye_slots)}
+    match_positions: List[Tuple[int, int]] = []
+    single_positions: List[int] = []
+    for s in range(1, size, 2):
+        a, b = pos.get(s), pos.get(s + 1)
+        if a is not None and b is not None:
+            match_positions.append((a, b))
+        elif a is not None:
+            single_positions.append(a)
+        elif b is not None:
+            single_positions.append(b)
+    return match_positions, single_positions
+
+
+def _cost_matrix(
+    players: List[_Entry],
     *,
-    competition_id: int,
-    age_category_id: Optional[int],
-    belt_group_id: int,
-    weight_category_id: int,
-    club_threshold: int = 8,
-    seed: str = "",
-    shuffle_attempts: int = 200,
-    cleanup_months: int = 12,   # اگر کامند فروردین‌محور است، استفاده نمی‌شود
-    cleanup_keep_last: int = 5, # اگر کامند فروردین‌محور است، استفاده نمی‌شود
-    size_override: Optional[int] = None,
-):
+    effective_count: int,
+    club_threshold: int,
+    history_pairs: Set[Tuple[int, int]],
+) -> List[List[int]]:
+    """ماتریس متقارن هزینهٔ برخورد هر دو بازیکن در دور اول."""
+    n = len(players)
+    cost = [[0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            c = _pair_cost(
+                players[i], players[j],
+                effective_count=effective_count,
+                club_threshold=club_threshold,
+                history_pairs=history_pairs,
+            )
+            cost[i][j] = cost[j][i] = c
+    return cost
+
+
+class _SwapEvaluator:
     """
-    قرعه‌کشی را می‌سازد و مسابقات دور اول را تولید می‌کند و تاریخچهٔ برخورد دور اول را به‌روزرسانی می‌کند.
-    خروجی: شیء Draw
+    ارزیاب افزایشی هزینه روی اسلات‌های غیر BYE.
+    هزینهٔ هر بازی دور اول در آرایه نگه داشته می‌شود و با جابه‌جایی دو بازیکن
+    فقط دو بازیِ متأثر دوباره محاسبه می‌شوند (بدون ساخت دیکشنری یا نرمال‌سازی جفت‌ها).
     """
-    # برای جلوگیری از import حلقه‌ای، داخل تابع ایمپورت می‌کنیم
-    from competitions.models import (
-        Draw, Match, Enrollment, KyorugiCompetition, FirstRoundPairHistory
+
+    def __init__(
+        self,
+        players: List[_Entry],
+        *,
+        non_bye_slots: List[int],
+        size: int,
+        effective_count: int,
+        club_threshold: int,
+        history_pairs: Set[Tuple[int, int]],
+    ):
+        self.players = players
+        self.cost = _cost_matrix(
+            players,
+            effective_count=effective_count,
+            club_threshold=club_threshold,
+            history_pairs=history_pairs,
+        )
+        self.match_positions, _ = _slot_layout(non_bye_slots, size)
+
+        n = len(non_bye_slots)
+        self.match_of = [-1] * n   # موقعیت -> اندیس بازی (یا -1 اگر حریف BYE است)
+        self.mate = [-1] * n       # موقعیت -> موقعیتِ حریف در همان بازی
+        for k, (a, b) in enumerate(self.match_positions):
+            self.match_of[a] = self.match_of[b] = k
+            self.mate[a], self.mate[b] = b, a
+
+        self.at = list(range(n))   # موقعیت -> اندیس بازیکن
+        self.match_cost = [0] * len(self.match_positions)
+        self.total = 0
+        self.load(self.at)
+
+    def load(self, at: List[int]) -> int:
+        """یک ترتیب کامل (اندیس بازیکن‌ها به ترتیب non_bye_slots) را بارگذاری و هزینه را برمی‌گرداند."""
+        self.at = list(at)
+        cost, total = self.cost, 0
+        for k, (a, b) in enumerate(self.match_positions):
+            c = cost[self.at[a]][self.at[b]]
+            self.match_cost[k] = c
+            total += c
+        self.total = total
+        return total
+
+    def delta(self, p: int, q: int) -> int:
+        """تغییر هزینهٔ کل اگر بازیکن‌های موقعیت p و q جابه‌جا شوند."""
+        mp, mq = self.match_of[p], self.match_of[q]
+        if mp == mq:
+            return 0  # هم‌بازی یا هر دو روبه‌روی BYE
+        at, cost, d = self.at, self.cost, 0
+        if mp >= 0:
+            d += cost[at[q]][at[self.mate[p]]] - self.match_cost[mp]
+        if mq >= 0:
+            d += cost[at[p]][at[self.mate[q]]] - self.match_cost[mq]
+        return d
+
+    def swap(self, p: int, q: int) -> None:
+        """جابه‌جایی را اعمال و فقط هزینهٔ دو بازیِ متأثر را به‌روز می‌کند."""
+        at = self.at
+        at[p], at[q] = at[q], at[p]
+        for k in {self.match_of[p], self.match_of[q]}:
+            if k < 0:
+                continue
+            a, b = self.match_positions[k]
+            c = self.cost[at[a]][at[b]]
+            self.total += c - self.match_cost[k]
+            self.match_cost[k] = c
+
+    def improve(self, max_passes: int = 20) -> int:
+        """جست‌وجوی محلی با جابه‌جایی دوتایی تا وقتی بهبودی پیدا شود؛ هزینهٔ نهایی را برمی‌گرداند."""
+        n = len(self.at)
+        for _ in range(max_passes):
+            if self.total == 0:
+                break
+            improved = False
+            for p in range(n):
+                if self.match_of[p] >= 0 and self.match_cost[self.match_of[p]] == 0:
+                    continue  # بازیِ بدون هزینه را از این سمت دست نمی‌زنیم
+                for q in range(n):
+                    if q != p and self.delta(p, q) < 0:
+                        self.swap(p, q)
+                        improved = True
+                        break
+            if not improved:
+                break
+        return self.total
+
+    def order(self) -> List[_Entry]:
+        return [self.players[i] for i in self.at]
+
+
+def _exact_pairing(cost: List[List[int]], single_count: int) -> Tuple[List[Tuple[int, int]], List[int]]:
+    """
+    جفت‌سازی دقیقاً بهینه (DP روی زیرمجموعه‌ها): single_count بازیکن حریفشان BYE است
+    و بقیه دوبه‌دو با کمترین مجموع هزینه جفت می‌شوند. فقط برای تعداد کم بازیکن.
+    """
+    n = len(cost)
+    full = (1 << n) - 1
+
+    @lru_cache(maxsize=None)
+    def best(mask: int, singles: int):
+        if mask == full:
+            return 0, ()
+        i = ((~mask) & (mask + 1)).bit_length() - 1  # اولین بازیکنِ جانگرفته
+        remaining = n - bin(mask).count("1")
+        result = None
+        if singles > 0:
+            c, plan = best(mask | (1 << i), singles - 1)
+            result = (c, ((i,),) + plan)
+        if remaining - 2 >= singles and (result is None or result[0] > 0):
+            for j in range(i + 1, n):
+                if mask & (1 << j):
+                    continue
+                c, plan = best(mask | (1 << i) | (1 << j), singles)
+                c += cost[i][j]
+                if result is None or c < result[0]:
+                    result = (c, ((i, j),) + plan)
+                    if c == 0:
+                        break
+        return result
+
+    _, plan = best(0, single_count)
+    best.cache_clear()
+    pairs = [g for g in plan if len(g) == 2]
+    singles = [g[0] for g in plan if len(g) == 1]
+    return pairs, singles
+
+
+def _greedy_pairing(cost: List[List[int]], single_count: int) -> Tuple[List[Tuple[int, int]], List[int]]:
+    """
+    جفت‌سازی حریصانهٔ قطعی برای جدول‌های بزرگ: پرتعارض‌ترین بازیکن‌ها اول BYE می‌گیرند،
+    سپس هر بازیکنِ پرتعارض با کم‌هزینه‌ترین حریفِ باقی‌مانده جفت می‌شود.
+    """
+    n = len(cost)
+    conflicts = [sum(1 for j in range(n) if j != i and cost[i][j]) for i in range(n)]
+    order = sorted(range(n), key=lambda i: (-conflicts[i], i))
+
+    singles = order[:single_count]
+    left = set(order[single_count:])
+    pairs: List[Tuple[int, int]] = []
+    for i in order[single_count:]:
+        if i not in left:
+            continue
+        left.discard(i)
+        j = min(left, key=lambda k: (cost[i][k], -conflicts[k], k))
+        left.discard(j)
+        pairs.append((i, j))
+    return pairs, singles
+
+
+def _optimal_order_on_slots(
+    players_only: List[_Entry],
+    *,
+    non_bye_slots: List[int],
+    size: int,
+    club_threshold: int,
+    history_pairs: Set[Tuple[int, int]],
+    effective_count: int,
+    rng_seed: Optional[str] = None,
+) -> List[_Entry]:
+    """
+    ترتیب بازیکن‌ها روی اسلات‌های غیر BYE با جفت‌سازی قطعی (بدون بُر زدن).
+    جفت‌ها خودِ هزینه را تعیین می‌کنند؛ seed فقط جای جفت‌ها در جدول را جابه‌جا می‌کند.
+    """
+    ev = _SwapEvaluator(
+        players_only,
+        non_bye_slots=non_bye_slots,
+        size=size,
+        effective_count=effective_count,
+        club_threshold=club_threshold,
+        history_pairs=history_pairs,
     )
+    match_positions, single_positions = _slot_layout(non_bye_slots, size)
+    exact = len(players_only) <= EXACT_SOLVER_MAX_PLAYERS
+    if exact:
+        pairs, singles = _exact_pairing(ev.cost, len(single_positions))
+    else:
+        pairs, singles = _greedy_pairing(ev.cost, len(single_positions))
 
-    comp = KyorugiCompetition.objects.select_related("age_category").get(pk=competition_id)
+    rnd = random.Random(rng_seed)
+    rnd.shuffle(pairs)
+    rnd.shuffle(singles)
 
-    # ثبت‌نام‌های واجد شرایط
-    enroll_qs = (
-        Enrollment.objects
-        .filter(
-            competition_id=competition_id,
-            belt_group_id=belt_group_id,
-            weight_category_id=weight_category_id,
-            status__in=ELIGIBLE_STATUSES,
-        )
-        .select_related("player", "club", "coach")
-        .order_by("id")
+    at = [0] * len(players_only)
+    for (a, b), (i, j) in zip(match_positions, pairs):
+        if rnd.random() < 0.5:
+            i, j = j, i
+        at[a], at[b] = i, j
+    for pos, i in zip(single_positions, singles):
+        at[pos] = i
+
+    ev.load(at)
+    if not exact:
+        # جفت‌سازی حریصانه را با جابه‌جایی‌های دوتایی صیقل می‌دهیم
+        ev.improve()
+    return ev.order()
+
+
+# ---------- سرویس اصلی ----------
+
+def _entry_from_enrollment(e) -> _Entry:
+    p = e.player
+    return _Entry(
+        enrollment_id=e.id,
+        player_id=p.id if p else None,
+        club_id=e.club_id or getattr(p, "club_id", None),
+        coach_id=e.coach_id or getattr(p, "coach_id", None),
     )
 
-    entries: List[_Entry] = []
-    for e in enroll_qs:
-        p = e.player
-        entries.append(
-            _Entry(
-                enrollment_id=e.id,
-                player_id=p.id if p else None,
-                club_id=e.club_id or getattr(p, "club_id", None),
-                coach_id=e.coach_id or getattr(p, "coach_id", None),
-            )
-        )
 
+def _default_club_threshold(real_count: int) -> int:
+    """همان قاعدهٔ صفحهٔ شروع قرعه‌کشی: زیر ۸ نفر قانون هم‌باشگاهی اعمال نمی‌شود."""
+    return 8 if real_count >= 8 else 9999
+
+
+def _group_seed(seed: str, belt_group_id: int, weight_category_id: int) -> str:
+    """seed هر گروه در قرعه‌کشی گروهی؛ کوتاه (۳۲ نویسه) تا در Draw.rng_seed ذخیره شود و
+    create_draw_for_group با همان مقدار همان جدول را بسازد."""
+    if not seed:
+        return ""
+    return hashlib.sha1(f"{seed}:{belt_group_id}:{weight_category_id}".encode()).hexdigest()[:32]
+
+
+def _plan_draw(
+    entries: List[_Entry],
+    *,
+    history_pairs: Set[Tuple[int, int]],
+    club_threshold: int,
+    seed: str,
+    shuffle_attempts: int,
+    size_override: Optional[int],
+    solver: str,
+) -> Tuple[int, List[_Entry]]:
+    """
+    محاسبهٔ کاملاً درون‌حافظه‌ای یک جدول: اندازه و چیدمان نهایی اسلات‌ها (با BYE).
+    خروجی: (size, entries_final) که entries_final دقیقاً size عضو دارد.
+    """
     real_count = sum(1 for x in entries if x.player_id is not None)
     if real_count < 1:
         raise ValueError("برای این گروه حداقل ۱ شرکت‌کننده لازم است.")
 
-    # ---- تعیین اندازه جدول ----
     # ---- تعیین اندازه جدول ----
     if size_override is not None:
         if not _is_pow2(size_override):
@@ -240,15 +501,6 @@ def create_draw_for_group(
     # اسلات‌های غیر BYE به ترتیب طبیعی جدول
     non_bye_slots = [s for s in range(1, size + 1) if s not in bye_set]
 
-    # ست تاریخچه‌ی برخوردهای دور اول قبلی برای همین scope
-    hist_qs = FirstRoundPairHistory.objects.filter(
-        gender=comp.gender,
-        age_category_id=age_category_id,
-        belt_group_id=belt_group_id,
-        weight_category_id=weight_category_id,
-    ).values_list("player_a_id", "player_b_id")
-    history_pairs: Set[Tuple[int, int]] = set(hist_qs)
-
     # کم‌هزینه‌ترین ترتیب برای اسلات‌های غیر BYE
     best_order = _best_order_by_penalty_on_slots(
         players_only,
@@ -259,6 +511,7 @@ def create_draw_for_group(
         history_pairs=history_pairs,
         effective_count=real_count,
         rng_seed=seed or None,
+        solver=solver,
     )
 
     # مونتاژ نهایی: بازیکن‌ها روی اسلات‌های غیر BYE، و در اسلات‌های BYE ورودی خالی
@@ -269,6 +522,167 @@ def create_draw_for_group(
             entries_final.append(_Entry(enrollment_id=-1, player_id=None, club_id=None, coach_id=None))
         else:
             entries_final.append(next(it))
+    return size, entries_final
+
+
+def _first_round_matches(draw, size: int, entries_final: List[_Entry]) -> list:
+    """Matchهای دور اول (ذخیره‌نشده) برای یک Draw."""
+    from competitions.models import Match
+
+    matches = []
+    slot = 1
+    for i in range(0, size, 2):
+        A = entries_final[i]
+        B = entries_final[i + 1]
+        is_bye = (A.player_id is None) or (B.player_id is None)
+        matches.append(Match(
+            draw=draw,
+            round_no=1,
+            slot_a=slot,
+            slot_b=slot + 1,
+            player_a_id=A.player_id,
+            player_b_id=B.player_id,
+            is_bye=is_bye,
+        ))
+        slot += 2
+    return matches
+
+
+def _first_round_pairs(entries_final: List[_Entry]) -> List[Tuple[int, int]]:
+    """جفت‌های واقعی دور اول (نه BYE) به‌صورت نرمال‌شده (کوچک، بزرگ)."""
+    pairs = []
+    for i in range(0, len(entries_final), 2):
+        a = entries_final[i].player_id
+        b = entries_final[i + 1].player_id
+        if a is None or b is None:
+            continue
+        pairs.append((a, b) if a < b else (b, a))
+    return pairs
+
+
+def _update_pair_history(
+    *,
+    competition_id: int,
+    gender: str,
+    age_category_id: Optional[int],
+    groups: dict[Tuple[int, int], List[_Entry]],
+):
+    """
+    به‌روزرسانی تاریخچه‌ی برخورد دور اول برای جفت‌های واقعی (نه BYE) یک یا چند جدول.
+    groups: {(belt_group_id, weight_category_id): entries_final}
+    با تعداد ثابت کوئری: یک SELECT برای رکوردهای موجود، یک bulk_update و یک bulk_create.
+    """
+    from competitions.models import FirstRoundPairHistory
+
+    wanted = {
+        (bg_id, wc_id, x, y)
+        for (bg_id, wc_id), entries_final in groups.items()
+        for x, y in _first_round_pairs(entries_final)
+    }
+    if not wanted:
+        return
+
+    now = timezone.now()
+    existing = (
+        FirstRoundPairHistory.objects
+        .filter(
+            gender=gender,
+            age_category_id=age_category_id,
+            belt_group_id__in={k[0] for k in wanted},
+            weight_category_id__in={k[1] for k in wanted},
+            player_a_id__in={k[2] for k in wanted},
+            player_b_id__in={k[3] for k in wanted},
+        )
+        .only("id", "belt_group_id", "weight_category_id", "player_a_id", "player_b_id")
+    )
+    to_update = []
+    for h in existing:
+        key = (h.belt_group_id, h.weight_category_id, h.player_a_id, h.player_b_id)
+        if key not in wanted:
+            continue
+        wanted.discard(key)
+        h.last_competition_id = competition_id
+        h.last_met_at = now
+        to_update.append(h)
+
+    if to_update:
+        FirstRoundPairHistory.objects.bulk_update(
+            to_update, ["last_competition", "last_met_at"], batch_size=500
+        )
+    if wanted:
+        FirstRoundPairHistory.objects.bulk_create([
+            FirstRoundPairHistory(
+                player_a_id=x,
+                player_b_id=y,
+                gender=gender,
+                age_category_id=age_category_id,
+                belt_group_id=bg_id,
+                weight_category_id=wc_id,
+                last_competition_id=competition_id,
+                last_met_at=now,
+            )
+            for bg_id, wc_id, x, y in sorted(wanted)
+        ], batch_size=500)
+
+
+@transaction.atomic
+def create_draw_for_group(
+    *,
+    competition_id: int,
+    age_category_id: Optional[int],
+    belt_group_id: int,
+    weight_category_id: int,
+    club_threshold: int = 8,
+    seed: str = "",
+    shuffle_attempts: int = 200,
+    size_override: Optional[int] = None,
+    solver: str = SOLVER_RANDOM,
+):
+    """
+    قرعه‌کشی را می‌سازد و مسابقات دور اول را تولید می‌کند و تاریخچهٔ برخورد دور اول را به‌روزرسانی می‌کند.
+    solver: "random" = بُر زدن با seed (قابل تکرار)، "optimal" = جفت‌سازی قطعیِ کم‌هزینه
+    پاک‌سازی تاریخچه اینجا انجام نمی‌شود؛ کامند زمان‌بندی‌شدهٔ cleanup_pair_history مسئول آن است.
+    خروجی: شیء Draw
+    """
+    # برای جلوگیری از import حلقه‌ای، داخل تابع ایمپورت می‌کنیم
+    from competitions.models import (
+        Draw, Match, Enrollment, KyorugiCompetition, FirstRoundPairHistory
+    )
+
+    comp = KyorugiCompetition.objects.select_related("age_category").get(pk=competition_id)
+
+    # ثبت‌نام‌های واجد شرایط
+    enroll_qs = (
+        Enrollment.objects
+        .filter(
+            competition_id=competition_id,
+            belt_group_id=belt_group_id,
+            weight_category_id=weight_category_id,
+            status__in=ELIGIBLE_STATUSES,
+        )
+        .select_related("player", "club", "coach")
+        .order_by("id")
+    )
+    entries: List[_Entry] = [_entry_from_enrollment(e) for e in enroll_qs]
+
+    # ست تاریخچه‌ی برخوردهای دور اول قبلی برای همین scope
+    hist_qs = FirstRoundPairHistory.objects.filter(
+        gender=comp.gender,
+        age_category_id=age_category_id,
+        belt_group_id=belt_group_id,
+        weight_category_id=weight_category_id,
+    ).values_list("player_a_id", "player_b_id")
+    history_pairs: Set[Tuple[int, int]] = set(hist_qs)
+
+    size, entries_final = _plan_draw(
+        entries,
+        history_pairs=history_pairs,
+        club_threshold=club_threshold,
+        seed=seed,
+        shuffle_attempts=shuffle_attempts,
+        size_override=size_override,
+        solver=solver,
+    )
 
     # اگر قبلاً قرعه‌ای برای این ترکیب وجود دارد و قفل نیست، حذف کن
     prev = Draw.objects.filter(
@@ -297,52 +711,222 @@ def create_draw_for_group(
     )
 
     # ساخت مسابقات دور اول
-    matches = []
-    slot = 1
-    for i in range(0, size, 2):
-        A = entries_final[i]
-        B = entries_final[i + 1]
-        is_bye = (A.player_id is None) or (B.player_id is None)
+    Match.objects.bulk_create(_first_round_matches(draw, size, entries_final))
 
-        m = Match(
-            draw=draw,
-            round_no=1,
-            slot_a=slot,
-            slot_b=slot + 1,
-            player_a_id=A.player_id,
-            player_b_id=B.player_id,
-            is_bye=is_bye,
+    _update_pair_history(
+        competition_id=competition_id,
+        gender=comp.gender,
+        age_category_id=age_category_id,
+        groups={(belt_group_id, weight_category_id): entries_final},
+    )
+
+    return draw
+
+
+@transaction.atomic
+def create_draws_for_competition(
+    competition_id: int,
+    *,
+    belt_group_ids: Optional[List[int]] = None,
+    weight_category_ids: Optional[List[int]] = None,
+    club_threshold: Optional[int] = None,
+    seed: str = "",
+    shuffle_attempts: int = 200,
+    solver: str = SOLVER_OPTIMAL,
+) -> dict:
+    """
+    قرعه‌کشی همهٔ گروه‌های (گروه کمربندی × رده وزنی) یک مسابقه در یک تراکنش.
+    ثبت‌نام‌ها و تاریخچهٔ برخوردها هرکدام با یک کوئری خوانده می‌شوند، همهٔ جدول‌ها در حافظه
+    محاسبه می‌شوند و Draw/Match ها به‌صورت bulk نوشته می‌شوند.
+    club_threshold=None یعنی برای هر گروه همان قاعدهٔ پیش‌فرض صفحهٔ قرعه‌کشی.
+    قرعه‌های قفل‌شده دست نمی‌خورند.
+    خروجی: {"draws": [...], "locked": [(belt_group_id, weight_category_id), ...]}
+    """
+    from competitions.models import (
+        Draw, Match, Enrollment, KyorugiCompetition, FirstRoundPairHistory
+    )
+
+    comp = KyorugiCompetition.objects.get(pk=competition_id)
+    age_category_id = comp.age_category_id
+
+    # ۱) همهٔ ثبت‌نام‌های واجد شرایط، یک کوئری
+    enroll_qs = (
+        Enrollment.objects
+        .filter(
+            competition_id=competition_id,
+            status__in=ELIGIBLE_STATUSES,
+            belt_group__isnull=False,
+            weight_category__isnull=False,
         )
-        matches.append(m)
-        slot += 2
+        .select_related("player")
+        .order_by("id")
+    )
+    if belt_group_ids is not None:
+        enroll_qs = enroll_qs.filter(belt_group_id__in=belt_group_ids)
+    if weight_category_ids is not None:
+        enroll_qs = enroll_qs.filter(weight_category_id__in=weight_category_ids)
 
-    Match.objects.bulk_create(matches)
+    groups: dict[Tuple[int, int], List[_Entry]] = {}
+    for e in enroll_qs:
+        groups.setdefault((e.belt_group_id, e.weight_category_id), []).append(_entry_from_enrollment(e))
 
-    # --- به‌روزرسانی تاریخچه‌ی برخورد دور اول برای جفت‌های واقعی (نه BYE) ---
-    now = timezone.now()
-    for i in range(0, size, 2):
-        a = entries_final[i].player_id
-        b = entries_final[i + 1].player_id
-        if a is None or b is None:
-            continue
-        x, y = (a, b) if a < b else (b, a)
-        FirstRoundPairHistory.objects.update_or_create(
-            player_a_id=x,
-            player_b_id=y,
+    # ۲) قرعه‌های موجود؛ قفل‌شده‌ها کنار گذاشته می‌شوند
+    existing = {
+        (d.belt_group_id, d.weight_category_id): d
+        for d in Draw.objects.filter(
+            competition_id=competition_id,
             gender=comp.gender,
             age_category_id=age_category_id,
-            belt_group_id=belt_group_id,
-            weight_category_id=weight_category_id,
-            defaults={
-                "last_competition_id": competition_id,
-                "last_met_at": now,
-            },
+            belt_group_id__in={k[0] for k in groups},
+            weight_category_id__in={k[1] for k in groups},
         )
+    }
+    locked = sorted(k for k in groups if k in existing and existing[k].is_locked)
+    for k in locked:
+        groups.pop(k)
+    if not groups:
+        return {"draws": [], "locked": locked}
+
+    # ۳) تاریخچهٔ برخوردهای دور اول برای همهٔ گروه‌ها، یک کوئری
+    history: dict[Tuple[int, int], Set[Tuple[int, int]]] = {}
+    hist_qs = FirstRoundPairHistory.objects.filter(
+        gender=comp.gender,
+        age_category_id=age_category_id,
+        belt_group_id__in={k[0] for k in groups},
+        weight_category_id__in={k[1] for k in groups},
+    ).values_list("belt_group_id", "weight_category_id", "player_a_id", "player_b_id")
+    for bg_id, wc_id, a, b in hist_qs:
+        history.setdefault((bg_id, wc_id), set()).add((a, b))
+
+    # ۴) محاسبهٔ همهٔ جدول‌ها در حافظه
+    plans: dict[Tuple[int, int], Tuple[int, int, List[_Entry]]] = {}
+    for key in sorted(groups):
+        entries = groups[key]
+        real_count = sum(1 for x in entries if x.player_id is not None)
+        th = club_threshold if club_threshold is not None else _default_club_threshold(real_count)
+        size, entries_final = _plan_draw(
+            entries,
+            history_pairs=history.get(key, set()),
+            club_threshold=th,
+            seed=_group_seed(seed, *key),
+            shuffle_attempts=shuffle_attempts,
+            size_override=None,
+            solver=solver,
+        )
+        plans[key] = (size, th, entries_final)
 
-    # (اختیاری) پاک‌سازی تاریخچه‌ها؛ اگر کامندت فقط ۱ فروردین پاک می‌کند، بدون آرگومان صدا بزن
-    try:
-        call_command("cleanup_pair_history")
-    except Exception:
-        pass
+    # ۵) نوشتن bulk: حذف قرعه‌های قبلی قفل‌نشده، ساخت Draw ها و Match های دور اول
+    stale_ids = [existing[k].id for k in plans if k in existing]
+    if stale_ids:
+        Match.objects.filter(draw_id__in=stale_ids).delete()
+        Draw.objects.filter(id__in=stale_ids).delete()
 
-    return draw
+    draws = Draw.objects.bulk_create([
+        Draw(
+            competition_id=competition_id,
+            gender=comp.gender,
+            age_category_id=age_category_id,
+            belt_group_id=key[0],
+            weight_category_id=key[1],
+            size=size,
+            club_threshold=th,
+            rng_seed=_group_seed(seed, *key),
+            is_locked=False,
+        )
+        for key, (size, th, _) in plans.items()
+    ])
+    if any(d.pk is None for d in draws):
+        # MySQL شناسه‌های bulk_create را برنمی‌گرداند؛ با یک کوئری دوباره بخوان
+        draws = list(Draw.objects.filter(
+            competition_id=competition_id,
+            gender=comp.gender,
+            age_category_id=age_category_id,
+            belt_group_id__in={k[0] for k in plans},
+            weight_category_id__in={k[1] for k in plans},
+        ))
+    draw_by_key = {(d.belt_group_id, d.weight_category_id): d for d in draws}
+
+    matches = []
+    for key, (size, _, entries_final) in plans.items():
+        matches.extend(_first_round_matches(draw_by_key[key], size, entries_final))
+    Match.objects.bulk_create(matches)
+
+    _update_pair_history(
+        competition_id=competition_id,
+        gender=comp.gender,
+        age_category_id=age_category_id,
+        groups={key: entries_final for key, (_, _, entries_final) in plans.items()},
+    )
+    invalidate_bracket(competition_id)  # bulk_create سیگنال ندارد
+
+    return {
+        "draws": [draw_by_key[k] for k in plans],
+        "locked": locked,
+    }
+
+
+# ---------- نگهداری تاریخچهٔ برخورد دور اول ----------
+
+RETENTION_PERSIAN_YEAR = "persian_year"  # با شروع هر سال شمسی، تاریخچهٔ سال قبل حذف می‌شود
+RETENTION_MONTHS = "months"              # فقط برخوردهای N ماه اخیر نگه داشته می‌شوند
+RETENTION_MODES = (RETENTION_PERSIAN_YEAR, RETENTION_MONTHS)
+
+
+def _months_ago(dt, months: int):
+    """همان روز/ساعت، months ماه قبل (روزهای ناموجود به آخر ماه می‌افتند)."""
+    y, m = divmod(dt.year * 12 + (dt.month - 1) - months, 12)
+    m += 1
+    return dt.replace(year=y, month=m, day=min(dt.day, calendar.monthrange(y, m)[1]))
+
+
+def pair_history_cutoff(*, mode: str = RETENTION_PERSIAN_YEAR, months: int = 12, now=None):
+    """مرز زمانی حذف: رکوردهایی که last_met_at آن‌ها قبل از این لحظه است حذف می‌شوند."""
+    if mode not in RETENTION_MODES:
+        raise ValueError(f"حالت نگهداری نامعتبر است: {mode}")
+    now = now or timezone.now()
+    if mode == RETENTION_MONTHS:
+        return _months_ago(now, max(0, int(months)))
+
+    # ابتدای ۱ فروردینِ سال شمسی جاری (به وقت محلی)
+    local = timezone.localtime(now) if timezone.is_aware(now) else now
+    j = jdatetime.date.fromgregorian(date=local.date())
+    start = jdatetime.date(j.year, 1, 1).togregorian()
+    return local.replace(year=start.year, month=start.month, day=start.day,
+                         hour=0, minute=0, second=0, microsecond=0)
+
+
+def purge_pair_history(
+    *,
+    mode: str = RETENTION_PERSIAN_YEAR,
+    months: int = 12,
+    keep_last: int = 5,
+    now=None,
+    dry_run: bool = False,
+) -> int:
+    """
+    حذف تاریخچهٔ برخوردهای قدیمی؛ برای اجرای دوره‌ای (روزانه) از کامند cleanup_pair_history.
+    mode="persian_year": هرچه قبل از ۱ فروردین سال جاری است حذف می‌شود (اجرای هر روز بی‌خطر است).
+    mode="months": هرچه قدیمی‌تر از months ماه است حذف می‌شود، به‌جز برخوردهای
+    keep_last مسابقهٔ آخر (بر اساس تاریخ برگزاری) که همیشه نگه داشته می‌شوند.
+    خروجی: تعداد رکوردهای حذف‌شده (یا قابل حذف در dry_run).
+    """
+    from competitions.models import FirstRoundPairHistory, KyorugiCompetition
+
+    cutoff = pair_history_cutoff(mode=mode, months=months, now=now)
+    qs = FirstRoundPairHistory.objects.filter(last_met_at__lt=cutoff)
+
+    if mode == RETENTION_MONTHS and keep_last > 0:
+        recent_ids = list(
+            KyorugiCompetition.objects
+            .filter(draws__isnull=False)
+            .distinct()
+            .order_by("-competition_date", "-id")
+            .values_list("id", flat=True)[:keep_last]
+        )
+        if recent_ids:
+            qs = qs.exclude(last_competition_id__in=recent_ids)
+
+    if dry_run:
+        return qs.count()
+    deleted, _ = qs.delete()
+    return deleted
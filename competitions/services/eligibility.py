@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+پروفایل شرایط شرکت در یک مسابقهٔ کیوروگی (کمربند، رده سنی، رده وزنی).
+
+قواعد هر مسابقه یک‌بار از پایگاه‌داده خوانده و به یک شیء فشرده تبدیل می‌شود:
+کُدهای کمربند مجاز، گروه‌های کمربندی، بازهٔ تاریخ تولد و بازه‌های وزنی مرتب هر جنسیت
+(WeightIndex؛ جست‌وجوی دودویی). پروفایل در حافظهٔ همین پروسه و در کش مشترک (زیر کلید نسخه)
+نگه داشته می‌شود؛ هر پروسه فقط شمارندهٔ نسخه را از کش مشترک می‌پرسد. تغییر مسابقه،
+گروه‌ها/کمربندها، زمین‌ها و اوزان یا رده سنی (competitions.signals) نسخه را بالا می‌برد.
+نسخه پیش از ساخت خوانده می‌شود، پس پروفایلی که از دادهٔ پیش از commit ساخته شده زیر نسخهٔ
+مرده ذخیره می‌شود و هیچ پروسه‌ای آن را نمی‌پذیرد.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from common.cache_versions import bump_version, current_version
+
+CACHE_PREFIX = "kyorugi_eligibility"
+
+# کمربندهای مجاز وقتی مسابقه گروه کمربندی ندارد (بر اساس belt_level)
+_DAN_NAMES = frozenset(f"مشکی دان {i}" for i in range(1, 11))
+BELT_LEVEL_NAMES = {
+    "yellow_blue": frozenset({"سفید", "زرد", "سبز", "آبی"}),
+    "red_black": frozenset({"قرمز"}) | _DAN_NAMES,
+}
+ALL_BELT_NAMES = frozenset({"سفید", "زرد", "سبز", "آبی", "قرمز"}) | _DAN_NAMES
+
+# نسخهٔ محلی هر مسابقه: {competition_id: CompetitionEligibility}
+_local: dict = {}
+
+
+class WeightIndex:
+    """
+    بازه‌های وزنی مرتب یک (مسابقه، جنسیت) برای یافتن رده در O(log n).
+
+    هر رده بازهٔ [low, max_weight + tolerance] است؛ low برابر min_weight (مثل
+    WeightCategory.includes_weight) یا با lower_tolerance برابر min_weight - tolerance
+    (مثل _wc_includes در serializers). رده‌ها بر اساس low مرتب‌اند و اولین ردهٔ شامل وزن
+    برگردانده می‌شود: bisect روی lowها رده‌های ممکن را جدا می‌کند و bisect روی بیشینهٔ
+    تجمعی سقف‌ها اولین رده‌ای را می‌دهد که سقفش به وزن می‌رسد.
+    """
+    __slots__ = ("categories", "lows", "highs")
+
+    def __init__(self, categories: Iterable, lower_tolerance: bool = False):
+        def low(wc):
+            return wc.min_weight - (wc.tolerance or 0) if lower_tolerance else wc.min_weight
+
+        self.categories = tuple(sorted(categories, key=lambda wc: (low(wc), wc.pk)))
+        self.lows, self.highs, top = [], [], float("-inf")
+        for wc in self.categories:
+            top = max(top, wc.max_weight + (wc.tolerance or 0))
+            self.lows.append(low(wc))
+            self.highs.append(top)
+
+    def __len__(self):
+        return len(self.categories)
+
+    def find(self, weight):
+        try:
+            w = float(weight)
+        except (TypeError, ValueError):
+            return None
+        end = bisect_right(self.lows, w)
+        i = bisect_left(self.highs, w, 0, end)
+        return self.categories[i] if i < end else None
+
+    def resolve(self, weights: Iterable) -> list:
+        return [self.find(w) for w in weights]
+
+
+@dataclass(frozen=True)
+class CompetitionEligibility:
+    competition_id: int
+    version: int
+    belt_groups: tuple                      # ((BeltGroup, frozenset کُدها), ...) به ترتیب گروه‌ها
+    belt_names: frozenset                   # نام کمربندهای مجاز
+    belt_codes: frozenset                   # کُد نرمال‌شدهٔ همان کمربندها
+    age_window: Optional[tuple]             # (from_date, to_date) یا None
+    weights: dict                           # (جنسیت یا None برای همه، lower_tolerance) → WeightIndex
+
+    @property
+    def belt_group_labels(self) -> list:
+        return [g.label for g, _ in self.belt_groups]
+
+    def belt_group_for(self, code):
+        """اولین گروه کمربندی مسابقه که کمربند با این کُد را دارد."""
+        if not code:
+            return None
+        for group, codes in self.belt_groups:
+            if code in codes:
+                return group
+        return None
+
+    def age_ok(self, birth_date) -> bool:
+        if not birth_date:
+            return False
+        if not self.age_window:
+            return True
+        return self.age_window[0] <= birth_date <= self.age_window[1]
+
+    @property
+    def weight_categories(self) -> list:
+        """همهٔ رده‌های وزنی مسابقه، مرتب بر حداقل وزن."""
+        return list(self.weights[(None, False)].categories)
+
+    @property
+    def weight_ids(self) -> set:
+        return {wc.id for wc in self.weight_categories}
+
+    def weight_index(self, gender=None, lower_tolerance: bool = False) -> WeightIndex:
+        """gender=None یعنی رده‌های همهٔ جنسیت‌ها."""
+        return self.weights.get((gender, lower_tolerance)) or _EMPTY_INDEX
+
+    def weight_category_for(self, gender, declared_weight):
+        """اولین رده (به ترتیب حداقل وزن) که min_weight <= وزن <= max_weight + tolerance."""
+        return self.weight_index(gender).find(declared_weight)
+
+    def resolve_weights(self, entries: Sequence, lower_tolerance: bool = False) -> list:
+        """[(جنسیت، وزن اعلامی), ...] → [WeightCategory یا None, ...] به همان ترتیب."""
+        by_gender = {}
+        for pos, (gender, weight) in enumerate(entries):
+            by_gender.setdefault(gender, []).append((pos, weight))
+        out = [None] * len(entries)
+        for gender, rows in by_gender.items():
+            index = self.weight_index(gender, lower_tolerance)
+            for (pos, _), wc in zip(rows, index.resolve(w for _, w in rows)):
+                out[pos] = wc
+        return out
+
+
+def _version_key(competition_id: int) -> str:
+    return f"{CACHE_PREFIX}:version:{competition_id}"
+
+
+def _profile_key(competition_id: int, version: int) -> str:
+    return f"{CACHE_PREFIX}:profile:{competition_id}:{version}"
+
+
+_EMPTY_INDEX = WeightIndex(())
+
+
+def _weight_indexes(categories) -> dict:
+    by_gender = {None: list(categories)}
+    for wc in categories:
+        by_gender.setdefault(wc.gender, []).append(wc)
+    return {
+        (gender, lower): WeightIndex(cats, lower_tolerance=lower)
+        for gender, cats in by_gender.items() for lower in (False, True)
+    }
+
+
+def build_eligibility(comp, version: int = 0) -> CompetitionEligibility:
+    """پروفایل را از پایگاه‌داده می‌سازد (بدون کش)؛ چهار کوئری."""
+    from competitions.models import AgeCategory, BeltGroup, WeightCategory
+    from competitions.serializers import _norm_belt
+
+    groups = list(comp.belt_groups.order_by("pk"))
+    belts = {}
+    for group_id, name in (
+        BeltGroup.belts.through.objects.filter(beltgroup_id__in=[g.pk for g in groups])
+        .order_by("pk").values_list("beltgroup_id", "belt__name")
+    ):
+        belts.setdefault(group_id, []).append(name)
+
+    if groups:
+        belt_names = frozenset(n for g in groups for n in belts.get(g.pk, ()))
+    else:
+        belt_names = BELT_LEVEL_NAMES.get(comp.belt_level, ALL_BELT_NAMES)
+
+    age_window = None
+    if comp.age_category_id:
+        age_window = AgeCategory.objects.filter(pk=comp.age_category_id).values_list("from_date", "to_date").first()
+
+    weight_categories = list(
+        WeightCategory.objects.filter(id__in=comp.mat_assignments.values("weights__id")).order_by("min_weight", "pk")
+    )
+
+    return CompetitionEligibility(
+        competition_id=comp.pk,
+        version=version,
+        belt_groups=tuple(
+            (g, frozenset(c for c in map(_norm_belt, belts.get(g.pk, ())) if c)) for g in groups
+        ),
+        belt_names=belt_names,
+        belt_codes=frozenset(_norm_belt(x) for x in belt_names if x),
+        age_window=tuple(age_window) if age_window else None,
+        weights=_weight_indexes(weight_categories),
+    )
+
+
+def eligibility_for(comp) -> CompetitionEligibility:
+    """پروفایل مسابقه: از حافظهٔ پروسه، وگرنه از کش مشترک، وگرنه ساخت و ذخیره."""
+    cid = comp.pk
+    version = current_version(_version_key(cid))
+    local = _local.get(cid)
+    if local is not None and local.version == version:
+        return local
+
+    profile = cache.get(_profile_key(cid, version))
+    if profile is None:
+        profile = build_eligibility(comp, version)
+        cache.set(_profile_key(cid, version), profile, settings.ELIGIBILITY_CACHE_TIMEOUT)
+    _local[cid] = profile
+    return profile
+
+
+def invalidate_eligibility(competition_ids: Iterable[int]) -> None:
+    """
+    بالا بردن نسخهٔ پروفایل‌ها: همین حالا (برای ادامهٔ همین تراکنش) و دوباره پس از commit
+    (تا پروفایلی که خواننده‌ای در این فاصله از دادهٔ قدیمی ساخته، زیر نسخهٔ مرده بماند).
+    """
+    ids = {int(i) for i in competition_ids if i}
+    if not ids:
+        return
+
+    def bump():
+        for cid in ids:
+            _local.pop(cid, None)
+            bump_version(_version_key(cid))
+
+    bump()
+    transaction.on_commit(bump)
+
+
+
+def competition_weight_index(comp) -> WeightIndex:
+    """
+    رده‌های سازگار با جنسیت مسابقه (مختلط: همه) با ارفاق دوطرفه؛
+    هم‌ارز _gender_ok_for_wc + _wc_includes در serializers.
+    """
+    from competitions.serializers import _norm_gender
+
+    gender = _norm_gender(comp.gender)
+    gender = None if gender in (None, "", "both") else gender
+    return eligibility_for(comp).weight_index(gender, lower_tolerance=True)
+
+
+def resolve_enrollment_weights(enrollments) -> dict:
+    """
+    رده وزنی ثبت‌نام‌هایی که هنوز رده ندارند، به‌صورت گروهی (یک پروفایل به‌ازای هر مسابقه):
+    {enrollment.pk: WeightCategory یا None}. competition بهتر است select_related شده باشد.
+    """
+    by_comp = {}
+    for e in enrollments:
+        if not e.weight_category_id and e.declared_weight:
+            by_comp.setdefault(e.competition_id, (e.competition, []))[1].append(e)
+
+    out = {}
+    for comp, rows in by_comp.values():
+        index = competition_weight_index(comp)
+        out.update(zip((e.pk for e in rows), index.resolve(e.declared_weight for e in rows)))
+    return out
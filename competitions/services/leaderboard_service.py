@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+جدول‌های رده‌بندی بازیکن/مربی/باشگاه/هیئت از روی دفتر امتیاز (RankingTransaction).
+
+build_leaderboards با یک کوئری گروهی (به‌ازای شخص × مسابقه) همهٔ جدول‌ها را می‌سازد:
+کل، هر فصل (سال شمسی برگزاری)، هر مسابقه؛ هرکدام برای همه/هر جنسیت/هر رده سنی.
+نتیجه به‌صورت snapshot در LeaderboardEntry جایگزین می‌شود (دستور build_leaderboards در cron).
+
+reconcile_ranking_totals امتیازهای denormalized روی UserProfile/TkdClub/TkdBoard را
+از دفتر امتیاز + جوایز مشارکت (RankingAward) دوباره حساب و فقط ردیف‌های ناهمخوان را اصلاح می‌کند.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Case, Count, FloatField, Q, Sum, Value, When
+from django.utils import timezone
+
+from common.jalali import to_jalali
+
+BATCH_SIZE = 1000
+TOLERANCE = 1e-6
+
+
+def season_of(d) -> str:
+    """فصل = سال شمسی تاریخ برگزاری."""
+    j = to_jalali(d)
+    return str(j.year) if j else ""
+
+
+def _partitions(scope, scope_key, gender, age_id):
+    """همه / جنسیت / رده سنی / جنسیت+رده سنی (ممکن است تکراری باشد؛ مصرف‌کننده set می‌گیرد)."""
+    for g in ("", gender or ""):
+        for a in (None, age_id):
+            yield (scope, scope_key, g, a)
+
+
+def _ranked(stats):
+    """[(subject_id, [points, gold, silver, bronze])] مرتب با رتبهٔ مشترک برای امتیاز برابر."""
+    ordered = sorted(stats.items(), key=lambda kv: (-kv[1][0], -kv[1][1], -kv[1][2], -kv[1][3], kv[0]))
+    rank, prev = 0, None
+    for pos, (sid, vals) in enumerate(ordered, start=1):
+        key = (round(vals[0], 6), vals[1], vals[2], vals[3])
+        if key != prev:
+            rank, prev = pos, key
+        yield rank, sid, vals
+
+
+def compute_leaderboards():
+    """{(subject_type, scope, scope_key, gender, age_id): {subject_id: [points, gold, silver, bronze]}}"""
+    from competitions.models import LeaderboardEntry, RankingTransaction
+
+    rows = (
+        RankingTransaction.objects.order_by()
+        .values(
+            "subject_type", "subject_id", "competition_id",
+            "competition__competition_date", "competition__gender", "competition__age_category_id",
+        )
+        .annotate(
+            pts=Sum("points"),
+            gold=Count("id", filter=Q(medal="gold")),
+            silver=Count("id", filter=Q(medal="silver")),
+            bronze=Count("id", filter=Q(medal="bronze")),
+        )
+    )
+
+    boards = defaultdict(dict)
+    for r in rows.iterator(chunk_size=BATCH_SIZE):
+        scopes = (
+            (LeaderboardEntry.SCOPE_OVERALL, ""),
+            (LeaderboardEntry.SCOPE_SEASON, season_of(r["competition__competition_date"])),
+            (LeaderboardEntry.SCOPE_COMPETITION, str(r["competition_id"])),
+        )
+        keys = {
+            p for scope, key in scopes
+            for p in _partitions(scope, key, r["competition__gender"], r["competition__age_category_id"])
+        }
+        for key in keys:
+            acc = boards[(r["subject_type"],) + key].setdefault(r["subject_id"], [0.0, 0, 0, 0])
+            acc[0] += float(r["pts"] or 0.0)
+            acc[1] += r["gold"]
+            acc[2] += r["silver"]
+            acc[3] += r["bronze"]
+    return boards
+
+
+@transaction.atomic
+def build_leaderboards() -> int:
+    """snapshot جدید را جایگزین قبلی می‌کند؛ تعداد ردیف‌ها."""
+    from competitions.models import LeaderboardEntry
+
+    now = timezone.now()
+    entries = [
+        LeaderboardEntry(
+            subject_type=subject_type, subject_id=sid,
+            scope=scope, scope_key=scope_key, gender=gender, age_category_id=age_id,
+            rank=rank, points=round(vals[0], 4), gold=vals[1], silver=vals[2], bronze=vals[3],
+            generated_at=now,
+        )
+        for (subject_type, scope, scope_key, gender, age_id), stats in compute_leaderboards().items()
+        for rank, sid, vals in _ranked(stats)
+    ]
+    LeaderboardEntry.objects.all().delete()
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+    return len(entries)
+
+
+def leaderboard_queryset(subject_type: str, scope: str, scope_key: str = "",
+                         gender: str = "", age_category_id: Optional[int] = None):
+    from competitions.models import LeaderboardEntry
+
+    return LeaderboardEntry.objects.filter(
+        subject_type=subject_type, scope=scope, scope_key=scope_key,
+        gender=gender or "", age_category_id=age_category_id,
+    ).order_by("rank", "subject_id")
+
+
+def subject_names(subject_type: str, ids: Iterable[int]) -> dict:
+    """نام نمایشی برای یک صفحه از ردیف‌ها (یک کوئری)."""
+    from accounts.models import TkdBoard, TkdClub, UserProfile
+    from competitions.models import RankingTransaction
+
+    ids = set(ids)
+    if not ids:
+        return {}
+    if subject_type == RankingTransaction.SUBJECT_CLUB:
+        return dict(TkdClub.objects.filter(pk__in=ids).values_list("pk", "club_name"))
+    if subject_type == RankingTransaction.SUBJECT_BOARD:
+        return dict(TkdBoard.objects.filter(pk__in=ids).values_list("pk", "name"))
+    return {
+        pk: f"{fn or ''} {ln or ''}".strip()
+        for pk, fn, ln in UserProfile.objects.filter(pk__in=ids).values_list("pk", "first_name", "last_name")
+    }
+
+
+# ───────── آشتی امتیازهای denormalized ─────────
+def expected_totals():
+    """امتیازهای درست از دفتر امتیاز + جوایز مشارکت: (ranking_competition پروفایل، ranking_total پروفایل، باشگاه، هیئت)."""
+    from competitions.models import RankingAward, RankingTransaction
+
+    comp, total = defaultdict(float), defaultdict(float)
+    clubs, boards = defaultdict(float), defaultdict(float)
+
+    ledger = (
+        RankingTransaction.objects.order_by()
+        .values("subject_type", "subject_id").annotate(s=Sum("points"))
+    )
+    for r in ledger:
+        pts, sid = float(r["s"] or 0.0), r["subject_id"]
+        if r["subject_type"] == RankingTransaction.SUBJECT_PLAYER:
+            comp[sid] += pts
+            total[sid] += pts
+        elif r["subject_type"] == RankingTransaction.SUBJECT_COACH:
+            total[sid] += pts
+        elif r["subject_type"] == RankingTransaction.SUBJECT_CLUB:
+            clubs[sid] += pts
+        elif r["subject_type"] == RankingTransaction.SUBJECT_BOARD:
+            boards[sid] += pts
+
+    for field, targets in (
+        ("player", (comp, total)), ("coach", (total,)), ("club", (clubs,)), ("board", (boards,)),
+    ):
+        awards = (
+            RankingAward.objects.filter(**{f"{field}__isnull": False}).order_by()
+            .values(f"{field}_id").annotate(s=Sum(f"points_{field}"))
+            .values_list(f"{field}_id", "s")
+        )
+        for sid, s in awards:
+            for target in targets:
+                target[sid] += float(s or 0.0)
+    return comp, total, clubs, boards
+
+
+def _value_case(values: dict):
+    return Case(
+        *[When(pk=pk, then=Value(v)) for pk, v in values.items()],
+        output_field=FloatField(),
+    )
+
+
+def reconcile_ranking_totals(batch_size: int = 500, dry_run: bool = False) -> dict:
+    """ردیف‌های ناهمخوان را دسته‌ای اصلاح می‌کند؛ {مدل: تعداد ردیف اصلاح‌شده}."""
+    from accounts.models import TkdBoard, TkdClub, UserProfile
+
+    comp, total, clubs, boards = expected_totals()
+    targets = (
+        (UserProfile, {"ranking_competition": comp, "ranking_total": total}),
+        (TkdClub, {"ranking_total": clubs}),
+        (TkdBoard, {"ranking_total": boards}),
+    )
+
+    fixed = {}
+    for model, fields in targets:
+        names = list(fields)
+        drift = []
+        for row in model.objects.order_by("pk").values_list("pk", *names).iterator(chunk_size=batch_size):
+            pk, current = row[0], row[1:]
+            if any(abs((cur or 0.0) - fields[f].get(pk, 0.0)) > TOLERANCE for f, cur in zip(names, current)):
+                drift.append(pk)
+
+        if not dry_run:
+            for i in range(0, len(drift), batch_size):
+                chunk = drift[i:i + batch_size]
+                with transaction.atomic():
+                    model.objects.filter(pk__in=chunk).update(**{
+                        f: _value_case({pk: round(fields[f].get(pk, 0.0), 6) for pk in chunk}) for f in names
+                    })
+        fixed[model.__name__] = len(drift)
+    return fixed
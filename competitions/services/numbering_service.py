@@ -1,67 +1,83 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from typing import Iterable, Dict, List, Set
+from collections import Counter
+from datetime import datetime, time, timedelta
+from typing import Iterable, Dict, List, Set, Tuple
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 
 from competitions.models import KyorugiCompetition, Draw, Match
+from competitions.services.bracket_service import invalidate_bracket
 from django.db.models import Q
 
 class NumberingError(Exception):
     pass
 
 
-def _weight_to_mat_map(comp: KyorugiCompetition) -> Dict[int, int]:
-    mapping: Dict[int, int] = {}
+def _weight_to_mats(comp: KyorugiCompetition) -> Dict[int, List[int]]:
+    """وزن → زمین‌های مجاز (مرتب) طبق MatAssignment."""
+    mapping: Dict[int, Set[int]] = {}
     for ma in comp.mat_assignments.all().prefetch_related("weights"):
         for w in ma.weights.all():
-            if w.id not in mapping:
-                mapping[w.id] = ma.mat_number
-            else:
-                mapping[w.id] = min(mapping[w.id], ma.mat_number)
-    return mapping
+            mapping.setdefault(w.id, set()).add(ma.mat_number)
+    return {wid: sorted(mats) for wid, mats in mapping.items()}
 
 
-def _rounds_of(draw: Draw) -> List[int]:
-    qs = (
-        Match.objects
-        .filter(draw=draw)
-        .values_list("round_no", flat=True)
-        .distinct()
-        .order_by("round_no")
-    )
-    return list(qs)
-
-
-def _matches_in_round(draw: Draw, round_no: int) -> List[Match]:
-    return list(
-        Match.objects
-        .filter(draw=draw, round_no=round_no)
-        .order_by("slot_a", "slot_b", "id")
+def _balance_mats(draws: List[Draw], w2m: Dict[int, List[int]], load: Dict[int, int]) -> Dict[int, int]:
+    """
+    قرعه → زمین؛ هر جدول کامل روی یک زمین می‌ماند.
+    اول قرعه‌هایی که فقط یک زمین مجاز دارند، بعد بقیه از پرمسابقه به کم‌مسابقه
+    روی کم‌بارترین زمین مجاز (LPT) تا مجموع مسابقات زمین‌ها متوازن شود.
+    load: تعداد مسابقات شماره‌دار هر قرعه؛ خروجی: {draw_id: mat_no}
+    """
+    totals: Dict[int, int] = {m: 0 for dr in draws for m in w2m[dr.weight_category_id]}
+    fixed = [dr for dr in draws if len(w2m[dr.weight_category_id]) == 1]
+    flexible = sorted(
+        (dr for dr in draws if len(w2m[dr.weight_category_id]) > 1),
+        key=lambda dr: -load[dr.id],  # sort پایدار است؛ ترتیب وزن‌ها در تساوی حفظ می‌شود
     )
+    plan: Dict[int, int] = {}
+    for dr in fixed + flexible:
+        mat_no = min(w2m[dr.weight_category_id], key=lambda m: (totals[m], m))
+        plan[dr.id] = mat_no
+        totals[mat_no] += load[dr.id]
+    return plan
 
 
-def _first_round_no(draw: Draw) -> int | None:
-    rs = _rounds_of(draw)
-    return rs[0] if rs else None
+def _schedule_start(comp: KyorugiCompetition) -> datetime | None:
+    """شروع مسابقات: تاریخ برگزاری + ساعت شروع تنظیمات (به وقت محلی)."""
+    if not comp.competition_date:
+        return None
+    start_time = time.fromisoformat(settings.MATCH_SCHEDULE["START_TIME"])
+    return timezone.make_aware(datetime.combine(comp.competition_date, start_time))
 
 
-def _last_round_no(draw: Draw) -> int | None:
-    rs = _rounds_of(draw)
-    return rs[-1] if rs else None
+def _load_matches(draw_ids: Iterable[int]) -> Dict[int, List[Match]]:
+    """همهٔ Match های چند قرعه با یک کوئری؛ داخل هر قرعه به ترتیب (راند، اسلات، id)."""
+    by_draw: Dict[int, List[Match]] = {d: [] for d in draw_ids}
+    qs = (
+        Match.objects
+        .filter(draw_id__in=list(by_draw))
+        .order_by("draw_id", "round_no", "slot_a", "slot_b", "id")
+    )
+    for m in qs:
+        by_draw[m.draw_id].append(m)
+    return by_draw
 
 
-def _ensure_rounds_exist(draw: Draw) -> None:
+def _missing_round_matches(draw: Draw, matches: List[Match]) -> List[Match]:
     """
-    اگر برای راندهای بعد از راند اول Match ساخته نشده باشد، این تابع آن‌ها را می‌سازد.
+    Match های راندهای بعد از راند اول که هنوز ساخته نشده‌اند (ذخیره‌نشده، فقط در حافظه).
     فقط slot_a/slot_b برای نظمِ نمایش پر می‌شود.
     """
-    fr = _first_round_no(draw) or 1
+    per_round = Counter(m.round_no for m in matches)
+    fr = min(per_round) if per_round else 1
 
     # اندازهٔ جدول: از خود مدل، یا بر اساس تعداد مسابقات راند اول
     total_size = int(getattr(draw, "size", 0) or 0)
     if total_size <= 0:
-        cnt_r1 = Match.objects.filter(draw=draw, round_no=fr).count()
-        total_size = max(1, cnt_r1 * 2)
+        total_size = max(1, per_round.get(fr, 0) * 2)
 
     # تعداد راندها برای اندازهٔ 2^k
     rounds_count = 0
@@ -71,45 +87,77 @@ def _ensure_rounds_exist(draw: Draw) -> None:
         s <<= 1
 
     # برای هر راند بعد از اول: اگر کم داریم بساز
+    bulk: List[Match] = []
     for step in range(1, rounds_count):  # 1..(rounds_count-1)
         r = fr + step
         expected = max(1, total_size // (2 ** (step + 1)))  # راند دوم: N/4 ، سوم: N/8 ، ... فینال: 1
-        existing = Match.objects.filter(draw=draw, round_no=r).count()
-        if existing < expected:
-            bulk = []
-            for idx in range(existing, expected):
-                bulk.append(Match(
-                    draw=draw, round_no=r,
-                    slot_a=idx, slot_b=idx,  # فقط جهت order
-                    is_bye=False
-                ))
-            if bulk:
-                Match.objects.bulk_create(bulk)
-
-
-def _real_players_count(draw: Draw) -> int:
-
-    ids = set()
-    for a_id, b_id in (Match.objects
-                       .filter(draw=draw)
-                       .values_list("player_a_id", "player_b_id")):
-        if a_id: ids.add(a_id)
-        if b_id: ids.add(b_id)
-    return len(ids)
-
-def _has_real_match(draw: Draw) -> bool:
+        for idx in range(per_round.get(r, 0), expected):
+            bulk.append(Match(
+                draw=draw, round_no=r,
+                slot_a=idx, slot_b=idx,  # فقط جهت order
+                is_bye=False
+            ))
+    return bulk
+
+
+def _materialize_rounds(draws: List[Draw], matches_by_draw: Dict[int, List[Match]]) -> Tuple[Dict[int, List[Match]], int]:
     """
-    قبلی را دقیق‌تر می‌کنیم: تا وقتی حداقل دو بازیکن نداشته باشیم، «بازی واقعی» نداریم.
+    اسکلت کامل جدول همهٔ قرعه‌ها: Match های ساخته‌نشده با یک bulk_create.
+    خروجی: (Match های به‌روز هر قرعه، تعداد ساخته‌شده)
     """
-    if _real_players_count(draw) < 2:
-        return False
-    fr = _first_round_no(draw)
-    if fr is None:
+    to_create = [m for dr in draws for m in _missing_round_matches(dr, matches_by_draw[dr.id])]
+    if not to_create:
+        return matches_by_draw, 0
+    Match.objects.bulk_create(to_create, batch_size=500)
+    # MySQL شناسهٔ bulk_create را برنمی‌گرداند
+    return _load_matches([dr.id for dr in draws]), len(to_create)
+
+
+@transaction.atomic
+def materialize_rounds_for_competition(
+    competition_id: int,
+    weight_ids: Iterable[int] | None = None,
+) -> int:
+    """
+    راندهای بعد از راند اول همهٔ قرعه‌های مسابقه (یا فقط اوزان داده‌شده) را
+    از روی Draw.size و Match های موجود می‌سازد؛ مستقل از تعداد قرعه‌ها سه کوئری.
+    خروجی: تعداد Match های ساخته‌شده
+    """
+    qs = Draw.objects.filter(competition_id=competition_id)
+    if weight_ids is not None:
+        qs = qs.filter(weight_category_id__in={int(w) for w in weight_ids})
+    draws = list(qs.only("id", "size"))
+    if not draws:
+        return 0
+    _, created = _materialize_rounds(draws, _load_matches([dr.id for dr in draws]))
+    if created:
+        invalidate_bracket(competition_id)
+    return created
+
+
+def _ensure_rounds_exist(draw: Draw) -> None:
+    """
+    اگر برای راندهای بعد از راند اول Match ساخته نشده باشد، این تابع آن‌ها را می‌سازد.
+    """
+    _materialize_rounds([draw], _load_matches([draw.id]))
+
+
+def _draw_shape(matches: List[Match]) -> Tuple[List[int], int]:
+    """(راندهای مرتب، تعداد بازیکنان واقعی) از روی Match های بارگذاری‌شده."""
+    rounds = sorted({m.round_no for m in matches})
+    players = {pid for m in matches for pid in (m.player_a_id, m.player_b_id) if pid}
+    return rounds, len(players)
+
+
+def _has_real_match(matches: List[Match]) -> bool:
+    """
+    تا وقتی حداقل دو بازیکن نداشته باشیم، «بازی واقعی» نداریم.
+    """
+    rounds, real_count = _draw_shape(matches)
+    if real_count < 2 or not rounds:
         return False
-    return (
-        Match.objects.filter(draw=draw).exclude(round_no=fr).exists()
-        or Match.objects.filter(draw=draw, round_no=fr, is_bye=False).exists()
-    )
+    fr = rounds[0]
+    return any(m.round_no != fr or not m.is_bye for m in matches)
 
 @transaction.atomic
 def number_matches_for_competition(
@@ -117,10 +165,22 @@ def number_matches_for_competition(
     weight_ids: Iterable[int],
     *,
     clear_prev: bool = True,
+    start_at: datetime | None = None,
+    match_minutes: int | None = None,
 ) -> Dict[int, int]:
     """
-    فاز۱: همهٔ راندها به‌جز «فینال» شماره می‌گیرند (در راند اول بای نمی‌گیرد؛ از راند دوم به بعد بای ممنوع).
-    فاز۲: «فینال»‌های همهٔ جدول‌های هر زمین، پشت‌سرهم و در انتهای شماره‌ها شماره می‌گیرند.
+    موتور واحد شماره‌گذاری و زمان‌بندی مسابقات.
+
+    - هر جدول کامل روی یکی از زمین‌های مجازِ وزنش (MatAssignment) می‌رود و اگر وزنی
+      چند زمین داشته باشد، کم‌بارترین زمین انتخاب می‌شود تا تعداد مسابقات زمین‌ها متوازن شود.
+    - فاز۱: همهٔ راندها به‌جز «فینال»، راند به راند (در راند اول بای شماره نمی‌گیرد؛ از راند دوم به بعد بای ممنوع).
+      چون جدول روی یک زمین است و راندها به ترتیب می‌آیند، مبارزهٔ بعدی هر بازیکن همیشه بعد از قبلی است.
+    - فاز۲: «فینال»‌های همهٔ جدول‌های هر زمین، پشت‌سرهم و در انتهای شماره‌ها.
+    - زمان تخمینی: start_at (پیش‌فرض: تاریخ برگزاری + MATCH_SCHEDULE["START_TIME"])
+      + (شماره − ۱) × match_minutes (پیش‌فرض: MATCH_SCHEDULE["MATCH_MINUTES"]).
+
+    همه‌چیز در حافظه محاسبه و فقط ردیف‌های تغییرکرده با یک bulk_update ذخیره می‌شوند؛
+    تعداد کوئری‌ها به تعداد مسابقات بستگی ندارد.
     خروجی: {mat_no: last_assigned_number}
     """
     comp = KyorugiCompetition.objects.select_related().get(pk=competition_id)
@@ -129,108 +189,96 @@ def number_matches_for_competition(
     if not weight_ids:
         raise NumberingError("هیچ رده‌ی وزنی انتخاب نشده است.")
 
-    # وزن → زمین
-    w2m = _weight_to_mat_map(comp)
+    # وزن → زمین‌ها
+    w2m = _weight_to_mats(comp)
     missing = [wid for wid in weight_ids if wid not in w2m]
     if missing:
         raise NumberingError(f"برای این وزن‌ها زمین تعریف نشده: {missing}")
 
     # قرعه‌ها (وزن از کم به زیاد)
-    all_draws_qs = (
+    all_draws: List[Draw] = list(
         Draw.objects
         .filter(competition=comp, weight_category_id__in=weight_ids)
         .select_related("weight_category")
         .order_by("weight_category__min_weight", "id")
     )
-    if not all_draws_qs.exists():
+    if not all_draws:
         raise NumberingError("برای اوزان انتخاب‌شده قرعه‌ای وجود ندارد.")
 
-    # شمارندهٔ هر زمین
-    all_mats: Set[int] = set(w2m[dr.weight_category_id] for dr in all_draws_qs)
-    counters: Dict[int, int] = {m: 0 for m in sorted(all_mats)}
+    if start_at is None:
+        start_at = _schedule_start(comp)
+    step = timedelta(minutes=match_minutes or settings.MATCH_SCHEDULE["MATCH_MINUTES"])
+
+    # همهٔ Match ها با یک کوئری؛ راندهای ساخته‌نشده با یک bulk_create
+    matches_by_draw, _ = _materialize_rounds(all_draws, _load_matches([dr.id for dr in all_draws]))
+
+    # وضعیت فعلی برای نوشتن فقط تغییرات
+    fields = ("is_bye", "mat_no", "match_number", "scheduled_at")
+    original = {
+        m.pk: tuple(getattr(m, f) for f in fields)
+        for ms in matches_by_draw.values() for m in ms
+    }
 
     # پاک‌کردن شماره‌های قبلی
     if clear_prev:
-        Match.objects.filter(draw__in=all_draws_qs).update(match_number=None)
-
-    # نکتهٔ مهم: قبل از سنجش «بازی واقعی»، راندهای بعدی را بساز
-    all_draws: List[Draw] = list(all_draws_qs)
+        for ms in matches_by_draw.values():
+            for m in ms:
+                m.match_number = None
+                m.scheduled_at = None
+
+    # Match های شماره‌گرفتنیِ هر قرعه به‌تفکیک راند (فقط قرعه‌هایی که بازی واقعی دارند)
+    rounds_of: Dict[int, Dict[int, List[Match]]] = {}
+    final_round_of: Dict[int, int] = {}
     for dr in all_draws:
-        _ensure_rounds_exist(dr)
-
-    # فقط قرعه‌هایی که بازی واقعی دارند
-    draws_for_numbering: List[Draw] = [dr for dr in all_draws if _has_real_match(dr)]
-    if not draws_for_numbering:
-        return counters
-
-    # نقشهٔ «اولین/آخرین راندِ هر قرعه»
-    first_round_of: Dict[int, int | None] = {}
-    last_round_of: Dict[int, int | None] = {}
-    for dr in draws_for_numbering:
-        first_round_of[dr.id] = _first_round_no(dr)
-        last_round_of[dr.id] = _last_round_no(dr)
+        ms = matches_by_draw[dr.id]
+        if not _has_real_match(ms):
+            continue
+        fr, lr = ms[0].round_no, ms[-1].round_no  # ms به ترتیب راند است
+        per_round: Dict[int, List[Match]] = {}
+        for m in ms:
+            if m.round_no == fr and m.is_bye:
+                continue  # فقط در راند اول قرعه، بای شماره نگیرد
+            per_round.setdefault(m.round_no, []).append(m)
+        rounds_of[dr.id] = per_round
+        final_round_of[dr.id] = lr
+
+    draws_for_numbering = [dr for dr in all_draws if dr.id in rounds_of]
+    load = {dr.id: sum(len(ms) for ms in rounds_of[dr.id].values()) for dr in draws_for_numbering}
+    mat_of = _balance_mats(draws_for_numbering, w2m, load)
 
     # گروه‌بندی قرعه‌ها به‌تفکیک زمین (ترتیب وزن‌ها حفظ می‌شود)
+    counters: Dict[int, int] = {m: 0 for m in sorted({mm for dr in all_draws for mm in w2m[dr.weight_category_id]})}
     drs_by_mat: Dict[int, List[Draw]] = {}
     for dr in draws_for_numbering:
-        drs_by_mat.setdefault(w2m[dr.weight_category_id], []).append(dr)
-
-    # مجموعهٔ همهٔ راندها
-    all_rounds_set = {r for dr in draws_for_numbering for r in _rounds_of(dr)}
-    if not all_rounds_set:
-        return counters
-    all_rounds: List[int] = sorted(all_rounds_set)
+        drs_by_mat.setdefault(mat_of[dr.id], []).append(dr)
 
-    # ------------- فاز ۱: همهٔ راندها به‌جز فینال‌ها -------------
-    # ------------- فاز ۱: همهٔ راندها به‌جز فینال‌ها -------------
+    # ترتیب هر زمین: فاز ۱ راند به راند، فاز ۲ فینال‌ها
+    all_rounds: List[int] = sorted({rnd for per_round in rounds_of.values() for rnd in per_round})
+    sequence: Dict[int, List[Match]] = {mat_no: [] for mat_no in counters}
     for rnd in all_rounds:
-        for mat_no in sorted(counters.keys()):
-            for dr in drs_by_mat.get(mat_no, []):  # حفظ ترتیب وزن‌ها
-                fr = first_round_of.get(dr.id)
-                lr = last_round_of.get(dr.id)
-
-                # فینال را می‌گذاریم برای فاز ۲
-                if lr is not None and rnd == lr:
-                    continue
-
-                # 👈 اضافه کن: آیا این قرعه عملاً تک‌نفره است؟
-                is_single = (_real_players_count(dr) < 2)
-
-                for m in _matches_in_round(dr, rnd):
-                    # فقط در راند اول قرعه، بای شماره نگیرد
-                    if rnd == fr and m.is_bye:
-                        continue
-                    # از راند دوم به بعد، بای را فقط وقتی تبدیل به بازی واقعی کن که قرعه تک‌نفره نباشد
-                    if fr is not None and rnd > fr and m.is_bye and not is_single:
-                        m.is_bye = False
-
-                    counters[mat_no] += 1
-                    if not m.mat_no:
-                        m.mat_no = mat_no
-                    m.match_number = counters[mat_no]
-                    m.save(update_fields=["is_bye", "mat_no", "match_number"])
-
-    # ------------- فاز ۲: فینال‌ها پشت‌سرهم در انتهای هر زمین -------------
-    for mat_no in sorted(counters.keys()):
-        for dr in drs_by_mat.get(mat_no, []):  # ترتیب وزن‌ها
-            lr = last_round_of.get(dr.id)
-            fr = first_round_of.get(dr.id)
-            if lr is None:
-                continue
-            finals = _matches_in_round(dr, lr)
-            for m in finals:
-                # اگر فینال همان راند اول باشد و بای باشد → شماره نگیرد
-                if lr == fr and m.is_bye:
-                    continue
-                # در غیر این صورت بای ممنوع
-                if fr is not None and lr > fr and m.is_bye:
-                    m.is_bye = False
-
-                counters[mat_no] += 1
-                if not m.mat_no:
-                    m.mat_no = mat_no
-                m.match_number = counters[mat_no]
-                m.save(update_fields=["is_bye", "mat_no", "match_number"])
+        for mat_no, drs in drs_by_mat.items():
+            for dr in drs:
+                if rnd != final_round_of[dr.id]:
+                    sequence[mat_no].extend(rounds_of[dr.id].get(rnd, []))
+    for mat_no, drs in drs_by_mat.items():
+        for dr in drs:
+            sequence[mat_no].extend(rounds_of[dr.id].get(final_round_of[dr.id], []))
+
+    for mat_no, seq in sequence.items():
+        for i, m in enumerate(seq):
+            m.is_bye = False  # از راند دوم به بعد بای ممنوع
+            m.mat_no = mat_no
+            m.match_number = i + 1
+            m.scheduled_at = start_at + i * step if start_at else None
+        counters[mat_no] = len(seq)
+
+    changed = [
+        m for ms in matches_by_draw.values() for m in ms
+        if tuple(getattr(m, f) for f in fields) != original[m.pk]
+    ]
+    if changed:
+        Match.objects.bulk_update(changed, list(fields), batch_size=500)
+    invalidate_bracket(comp.id)
 
     return counters
 
@@ -241,4 +289,5 @@ def clear_match_numbers_for_competition(competition_id: int, weight_ids: Iterabl
     if not weight_ids:
         return
     draws = Draw.objects.filter(competition=comp, weight_category_id__in=weight_ids)
-    Match.objects.filter(draw__in=draws).update(match_number=None)
+    Match.objects.filter(draw__in=draws).update(match_number=None, scheduled_at=None)
+    invalidate_bracket(comp.id)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+نگه‌داری جدول PlayerStats (آمار تجمیعی هر بازیکن).
+
+هر بار فقط بازیکنانِ درگیر (نتیجهٔ ذخیره‌شده، ثبت‌نام پرداخت‌شده، …) از منابع اصلی
+با چند کوئری گروهی دوباره حساب و جایگزین می‌شوند؛ rebuild_player_stats همین کار را
+برای همهٔ پروفایل‌ها به‌صورت دسته‌ای انجام می‌دهد.
+"""
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+# ثبت‌نام‌هایی که «شرکت در مسابقه» حساب می‌شوند
+ELIGIBLE_ENROLL_STATUSES = ("paid", "confirmed", "accepted", "completed")
+
+BATCH_SIZE = 500
+
+
+def _chunks(ids, size):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def _compute_rows(player_ids):
+    from accounts.models import UserProfile
+    from competitions.models import Enrollment, PlayerStats, RankingAward, RankingTransaction
+
+    existing = list(UserProfile.objects.filter(pk__in=player_ids).values_list("pk", flat=True))
+    if not existing:
+        return []
+
+    comps = dict(
+        Enrollment.objects.filter(player_id__in=existing, status__in=ELIGIBLE_ENROLL_STATUSES)
+        .order_by().values("player_id")
+        .annotate(c=Count("competition_id", distinct=True))
+        .values_list("player_id", "c")
+    )
+    ledger = {
+        r["subject_id"]: r
+        for r in RankingTransaction.objects.filter(
+            subject_type=RankingTransaction.SUBJECT_PLAYER, subject_id__in=existing,
+        ).order_by().values("subject_id").annotate(
+            points=Sum("points"),
+            gold=Count("id", filter=Q(medal="gold")),
+            silver=Count("id", filter=Q(medal="silver")),
+            bronze=Count("id", filter=Q(medal="bronze")),
+        )
+    }
+    awards = dict(
+        RankingAward.objects.filter(player_id__in=existing)
+        .order_by().values("player_id")
+        .annotate(s=Sum("points_player"))
+        .values_list("player_id", "s")
+    )
+
+    rows = []
+    for pid in existing:
+        led = ledger.get(pid, {})
+        rows.append(PlayerStats(
+            player_id=pid,
+            competitions=comps.get(pid, 0),
+            gold=led.get("gold", 0),
+            silver=led.get("silver", 0),
+            bronze=led.get("bronze", 0),
+            ranking_points=float(led.get("points") or 0.0),
+            award_points=float(awards.get(pid) or 0.0),
+        ))
+    return rows
+
+
+def refresh_player_stats(player_ids: Iterable[int]) -> int:
+    """ردیف آمار بازیکنان داده‌شده را از منابع اصلی بازسازی می‌کند؛ تعداد ردیف‌های نوشته‌شده."""
+    from competitions.models import PlayerStats
+
+    ids = sorted({int(i) for i in player_ids if i})
+    written = 0
+    for chunk in _chunks(ids, BATCH_SIZE):
+        rows = _compute_rows(chunk)
+        with transaction.atomic():
+            PlayerStats.objects.filter(player_id__in=chunk).delete()
+            PlayerStats.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        written += len(rows)
+    return written
+
+
+def refresh_player_stats_on_commit(player_ids: Iterable[int]) -> None:
+    """مثل refresh_player_stats ولی بعد از commit تراکنش جاری (برای سیگنال‌ها)."""
+    ids = {int(i) for i in player_ids if i}
+    if ids:
+        transaction.on_commit(lambda: refresh_player_stats(ids))
+
+
+def rebuild_player_stats(batch_size: int = BATCH_SIZE) -> int:
+    """بازسازی کامل جدول برای همهٔ پروفایل‌ها (دسته‌ای)."""
+    from accounts.models import UserProfile
+    from competitions.models import PlayerStats
+
+    ids = list(UserProfile.objects.order_by("pk").values_list("pk", flat=True))
+    PlayerStats.objects.exclude(player_id__in=UserProfile.objects.values("pk")).delete()
+    written = 0
+    for chunk in _chunks(ids, batch_size):
+        written += refresh_player_stats(chunk)
+    return written
+
+
+def result_player_ids(result) -> set:
+    """بازیکنانی که دفتر امتیاز این نتیجه به آن‌ها امتیاز داده است."""
+    from competitions.models import RankingTransaction
+
+    return set(
+        RankingTransaction.objects.filter(
+            result=result, subject_type=RankingTransaction.SUBJECT_PLAYER,
+        ).values_list("subject_id", flat=True)
+    )
@@ -11,73 +11,46 @@ def _round_title(total_rounds: int, r: int) -> str:
     names = {0:"فینال", 1:"نیمه‌نهایی", 2:"یک‌چهارم", 3:"یک‌هشتم", 4:"یک‌ شانزدهم"}
     return names.get(dist, f"دور {r}")
 
+def _player_name(p) -> str | None:
+    if p is None:
+        return None
+    return f"{p.first_name or ''} {p.last_name or ''}".strip() or None
+
 @transaction.atomic
 def number_matches_for_competition(competition_id: int, *, reset_old: bool = True):
     """
-    برای هر زمین، همهٔ مسابقات رده‌های وزنی اختصاص‌داده‌شده را
-    به ترتیب «round_no صعودی، وزن صعودی، slot_a صعودی» شماره‌گذاری می‌کند.
-    شمارهٔ هر زمین از 1 شروع می‌شود.
+    شماره‌گذاری/زمان‌بندی همهٔ اوزانی که زمین دارند با موتور واحد
+    numbering_service.number_matches_for_competition و خروجی برنامهٔ هر زمین برای نمایش/چاپ.
     """
-    from competitions.models import KyorugiCompetition, MatAssignment, Draw, Match, WeightCategory
-
-    comp = KyorugiCompetition.objects.get(pk=competition_id)
+    from competitions.models import MatAssignment, Match
+    from competitions.services.numbering_service import number_matches_for_competition as _number
 
-    # نگاشت وزن -> شماره زمین طبق تنظیمات مسابقه
-    weight_to_mat = {}
-    for assign in MatAssignment.objects.filter(competition=comp).prefetch_related("weights"):
-        for w in assign.weights.all():
-            weight_to_mat[w.id] = assign.mat_number
+    weight_ids = set(
+        MatAssignment.objects
+        .filter(competition_id=competition_id)
+        .values_list("weights__id", flat=True)
+    )
+    weight_ids.discard(None)
+    _number(competition_id, weight_ids, clear_prev=reset_old)
 
-    # مسابقات واقعی (BYE نباشند) برای همهٔ Drawهای این مسابقه
     qs = (Match.objects
-          .filter(draw__competition=comp, is_bye=False)
-          .select_related("draw", "draw__weight_category")
-          .order_by("round_no", "slot_a"))
+          .filter(draw__competition_id=competition_id, match_number__isnull=False)
+          .select_related("draw", "draw__weight_category", "draw__belt_group", "player_a", "player_b")
+          .order_by("mat_no", "match_number"))
 
-    # گروه‌بندی بر حسب زمین
+    # خروجی برای نمایش/چاپ
     per_mat = defaultdict(list)
     for m in qs:
-        mat = weight_to_mat.get(m.draw.weight_category_id)
-        if mat is not None:
-            per_mat[mat].append(m)
-
-    # پاکسازی شماره‌های قبلی در صورت نیاز
-    if reset_old:
-        (Match.objects
-              .filter(draw__competition=comp)
-              .update(mat_number=None, order_on_mat=None))
-
-    # مرتب‌سازی داخل هر زمین و تخصیص شماره‌ها
-    updated = []
-    for mat, items in per_mat.items():
-        # وزنِ کمتر جلوتر؛ اگر min_weight نداشت، صفر در نظر بگیر
-        items.sort(key=lambda m: (m.round_no, getattr(m.draw.weight_category, "min_weight", 0) or 0, m.slot_a))
-        seq = 1
-        for m in items:
-            m.mat_number = mat
-            m.order_on_mat = seq
-            seq += 1
-            updated.append(m)
-
-    if updated:
-        Match.objects.bulk_update(updated, ["mat_number", "order_on_mat"])
-
-    # خروجی برای نمایش/چاپ
-    schedule = []
-    for mat, items in sorted(per_mat.items(), key=lambda x: x[0]):
-        rows = []
-        # برای نمایش مرحله
-        for m in items:
-            total_rounds = max(1, int(math.log2(max(m.draw.size, 2))))
-            rows.append({
-                "order": m.order_on_mat,
-                "mat": mat,
-                "round_no": m.round_no,
-                "round_title": _round_title(total_rounds, m.round_no),
-                "weight": m.draw.weight_category.name if m.draw.weight_category else "",
-                "belt": getattr(m.draw.belt_group, "label", ""),
-                "player_a": getattr(m, "player_a", None) and m.player_a.full_name or None,
-                "player_b": getattr(m, "player_b", None) and m.player_b.full_name or None,
-            })
-        schedule.append({"mat": mat, "rows": rows})
-    return schedule
+        total_rounds = max(1, int(math.log2(max(m.draw.size, 2))))
+        per_mat[m.mat_no].append({
+            "order": m.match_number,
+            "mat": m.mat_no,
+            "round_no": m.round_no,
+            "round_title": _round_title(total_rounds, m.round_no),
+            "weight": m.draw.weight_category.name if m.draw.weight_category else "",
+            "belt": getattr(m.draw.belt_group, "label", ""),
+            "player_a": _player_name(m.player_a),
+            "player_b": _player_name(m.player_b),
+            "scheduled_at": m.scheduled_at,
+        })
+    return [{"mat": mat, "rows": rows} for mat, rows in sorted(per_mat.items())]
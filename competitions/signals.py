@@ -1,11 +1,124 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.db import transaction
-from .models import Enrollment
+from .models import (
+    AgeCategory, Belt, BeltGroup, Draw, Enrollment, KyorugiCompetition, KyorugiResult, MatAssignment, Match,
+    WeightCategory,
+)
 from .models import _award_points_after_payment  # همان هِلپر تعریف‌شده
+from .services.bracket_service import forget_competition, invalidate_bracket
+from .services.eligibility import invalidate_eligibility
+from .services.player_stats_service import refresh_player_stats_on_commit, result_player_ids
 
 @receiver(post_save, sender=Enrollment)
 def award_on_manual_paid(sender, instance: Enrollment, created, **kwargs):
     # اگر پرداخت شده و هنوز award ندارد، بعد از commit امتیاز بده
     if instance.is_paid and not hasattr(instance, 'ranking_award'):
         transaction.on_commit(lambda: _award_points_after_payment(instance))
+
+
+
+# ───────── جدول PlayerStats ─────────
+# ثبت‌نام: فقط وقتی فیلدهای مؤثر در «تعداد مسابقات»/امتیاز مشارکت تغییر کرده‌اند.
+# (بعد از award_on_manual_paid ثبت می‌شود، پس on_commit آن زودتر اجرا می‌شود.)
+_STATS_ENROLLMENT_FIELDS = {"status", "is_paid", "player", "competition"}
+
+
+@receiver(post_save, sender=Enrollment)
+def refresh_stats_on_enrollment(sender, instance: Enrollment, update_fields=None, **kwargs):
+    if update_fields is None or _STATS_ENROLLMENT_FIELDS & set(update_fields):
+        refresh_player_stats_on_commit([instance.player_id])
+
+
+@receiver(pre_delete, sender=KyorugiResult)
+def remember_result_players(sender, instance: KyorugiResult, **kwargs):
+    instance._stats_player_ids = result_player_ids(instance)
+
+
+@receiver(post_delete, sender=KyorugiResult)
+def refresh_stats_on_result_delete(sender, instance: KyorugiResult, **kwargs):
+    refresh_player_stats_on_commit(getattr(instance, "_stats_player_ids", ()))
+
+
+# ───────── باطل‌کردن سند کش‌شدهٔ جدول عمومی ─────────
+# مسیرهای bulk (قرعه‌کشی، شماره‌گذاری) سیگنال ندارند و خودشان invalidate_bracket را صدا می‌زنند.
+# روی حذف Match عمداً گیرنده نداریم تا حذف آبشاری قرعه‌ها fast-delete بماند (post_delete قرعه کافی است).
+@receiver(post_save, sender=Match)
+def invalidate_bracket_on_match(sender, instance: Match, **kwargs):
+    comp_id = Draw.objects.filter(pk=instance.draw_id).values_list("competition_id", flat=True).first()
+    invalidate_bracket(comp_id)
+
+
+@receiver([post_save, post_delete], sender=Draw)
+def invalidate_bracket_on_draw(sender, instance: Draw, **kwargs):
+    invalidate_bracket(instance.competition_id)
+
+
+@receiver(post_save, sender=KyorugiCompetition)
+def invalidate_bracket_on_competition(sender, instance: KyorugiCompetition, **kwargs):
+    invalidate_bracket(instance.pk)
+
+
+@receiver(post_delete, sender=KyorugiCompetition)
+def forget_bracket_on_competition_delete(sender, instance: KyorugiCompetition, **kwargs):
+    forget_competition(instance.pk, instance.public_id)
+
+
+
+# ───────── باطل‌کردن پروفایل شرایط ثبت‌نام (services.eligibility) ─────────
+# مسیر هر مدل تا مسابقه‌هایی که قواعدشان به آن وابسته است.
+_ELIGIBILITY_LOOKUPS = {
+    KyorugiCompetition: "pk__in",
+    BeltGroup: "belt_groups__in",
+    Belt: "belt_groups__belts__in",
+    MatAssignment: "mat_assignments__in",
+    WeightCategory: "mat_assignments__weights__in",
+    AgeCategory: "age_category__in",
+}
+
+
+def _competitions_using(model, pks):
+    if model is KyorugiCompetition:
+        return list(pks)
+    return list(
+        KyorugiCompetition.objects.filter(**{_ELIGIBILITY_LOOKUPS[model]: list(pks)})
+        .values_list("pk", flat=True).distinct()
+    )
+
+
+@receiver([post_save, post_delete], sender=KyorugiCompetition)
+def invalidate_eligibility_on_competition(sender, instance: KyorugiCompetition, **kwargs):
+    invalidate_eligibility([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=MatAssignment)
+def invalidate_eligibility_on_mat(sender, instance: MatAssignment, **kwargs):
+    invalidate_eligibility([instance.competition_id])
+
+
+# روی حذف، pre_delete: بعد از حذف، ردیف‌های M2M هم رفته‌اند و مسابقه‌ها پیدا نمی‌شوند.
+@receiver(post_save, sender=BeltGroup)
+@receiver(post_save, sender=Belt)
+@receiver(post_save, sender=WeightCategory)
+@receiver(post_save, sender=AgeCategory)
+@receiver(pre_delete, sender=BeltGroup)
+@receiver(pre_delete, sender=Belt)
+@receiver(pre_delete, sender=WeightCategory)
+@receiver(pre_delete, sender=AgeCategory)
+def invalidate_eligibility_on_rule(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_eligibility(_competitions_using(sender, [instance.pk]))
+
+
+@receiver(m2m_changed, sender=KyorugiCompetition.belt_groups.through)
+@receiver(m2m_changed, sender=BeltGroup.belts.through)
+@receiver(m2m_changed, sender=MatAssignment.weights.through)
+def invalidate_eligibility_on_m2m(sender, instance, action, reverse, model, pk_set, **kwargs):
+    # مسیر از سمتی که تغییر نکرده پیموده می‌شود؛ برای clear پیش از پاک‌شدن ردیف‌ها.
+    if action == "pre_clear":
+        invalidate_eligibility(_competitions_using(type(instance), [instance.pk]))
+    elif action in ("post_add", "post_remove"):
+        if reverse:
+            invalidate_eligibility(_competitions_using(model, pk_set or ()))
+        else:
+            invalidate_eligibility(_competitions_using(type(instance), [instance.pk]))
@@ -1,3 +1,936 @@
-from django.test import TestCase
+import os
+import random
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from itertools import permutations
+from unittest import mock
 
-# Create your tests here.
+import jdatetime
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import TkdBoard, TkdClub, UserProfile
+from common import jalali
+from competitions.models import (
+    AgeCategory, Belt, BeltGroup, Draw, Enrollment, FirstRoundPairHistory,
+    KyorugiCompetition, KyorugiResult, MatAssignment, Match, PlayerStats, RankingAward, RankingTransaction,
+    WeightCategory,
+)
+from competitions.serializers import DrawWithMatchesSerializer, KyorugiBracketSerializer
+from competitions.services import bracket_service, draw_service as ds
+from competitions.services.numbering_service import (
+    materialize_rounds_for_competition,
+    number_matches_for_competition,
+)
+from competitions.serializers import _gender_ok_for_wc, _parse_jalali_str, _to_jalali_date_str, _wc_includes
+from competitions.templatetags.jalali_filters import to_jalali as to_jalali_filter
+from competitions.services.eligibility import (
+    WeightIndex, competition_weight_index, eligibility_for, resolve_enrollment_weights,
+)
+from competitions.services.leaderboard_service import build_leaderboards
+from competitions.services.results_service import apply_competition_results
+
+
+def _entries(n, clubs=None):
+    clubs = clubs or {}
+    return [
+        ds._Entry(enrollment_id=100 + i, player_id=i, club_id=clubs.get(i), coach_id=None)
+        for i in range(1, n + 1)
+    ]
+
+
+def _layout(real_count, size):
+    bye_set = set(ds._bye_slots(size, size - real_count))
+    return [s for s in range(1, size + 1) if s not in bye_set]
+
+
+class OptimalDrawSolverTests(SimpleTestCase):
+    def _cost(self, order, non_bye_slots, size, history, club_threshold=0):
+        return ds._order_cost_for_slots(
+            order,
+            non_bye_slots=non_bye_slots,
+            size=size,
+            effective_count=len(order),
+            club_threshold=club_threshold,
+            history_pairs=history,
+        )
+
+    def _solve(self, players, non_bye_slots, size, history, solver, club_threshold=0, seed="x"):
+        return ds._best_order_by_penalty_on_slots(
+            players,
+            non_bye_slots=non_bye_slots,
+            size=size,
+            attempts=200,
+            club_threshold=club_threshold,
+            history_pairs=history,
+            effective_count=len(players),
+            rng_seed=seed,
+            solver=solver,
+        )
+
+    def test_exact_solver_matches_brute_force(self):
+        players = _entries(6, clubs={1: 7, 2: 7, 3: 7, 4: 8})
+        history = {(1, 4), (1, 5), (2, 4), (3, 6), (2, 5)}
+        size = 8
+        slots = _layout(len(players), size)
+
+        brute = min(self._cost(list(p), slots, size, history) for p in permutations(players))
+        order = self._solve(players, slots, size, history, ds.SOLVER_OPTIMAL)
+
+        self.assertCountEqual([e.player_id for e in order], [e.player_id for e in players])
+        self.assertEqual(self._cost(order, slots, size, history), brute)
+
+    def test_optimal_solver_avoids_repeats_on_large_bracket(self):
+        players = _entries(60, clubs={i: i % 6 for i in range(1, 61)})
+        # هر بازیکن قبلاً با دو نفر بعدی خود روبه‌رو شده است
+        history = {(i, j) for i in range(1, 61) for j in (i + 1, i + 2) if j <= 60}
+        size = 64
+        slots = _layout(len(players), size)
+
+        order = self._solve(players, slots, size, history, ds.SOLVER_OPTIMAL)
+        cost = self._cost(order, slots, size, history)
+
+        self.assertCountEqual([e.player_id for e in order], range(1, 61))
+        self.assertLess(cost, ds.REPEAT_PAIR_PENALTY)
+
+    def test_optimal_solver_is_deterministic_for_seed(self):
+        players = _entries(20, clubs={i: i % 3 for i in range(1, 21)})
+        slots = _layout(len(players), 32)
+        a = self._solve(players, slots, 32, set(), ds.SOLVER_OPTIMAL, seed="s1")
+        b = self._solve(players, slots, 32, set(), ds.SOLVER_OPTIMAL, seed="s1")
+        self.assertEqual([e.player_id for e in a], [e.player_id for e in b])
+
+    def test_unknown_solver_rejected(self):
+        players = _entries(4)
+        with self.assertRaises(ValueError):
+            self._solve(players, _layout(4, 4), 4, set(), "annealing")
+
+
+class SwapEvaluatorTests(SimpleTestCase):
+    def test_incremental_cost_matches_full_recompute(self):
+        players = _entries(27, clubs={i: i % 4 for i in range(1, 28)})
+        history = {(i, j) for i in range(1, 28) for j in range(i + 1, 28) if (i * j) % 7 == 0}
+        size = 32
+        slots = _layout(len(players), size)
+        kw = dict(non_bye_slots=slots, size=size, effective_count=len(players),
+                  club_threshold=8, history_pairs=history)
+
+        ev = ds._SwapEvaluator(players, **kw)
+        rnd = random.Random(1)
+        for _ in range(500):
+            p, q = rnd.randrange(len(players)), rnd.randrange(len(players))
+            expected = ev.total + ev.delta(p, q)
+            ev.swap(p, q)
+            self.assertEqual(ev.total, expected)
+            self.assertEqual(ev.total, ds._order_cost_for_slots(ev.order(), **kw))
+
+    def test_improve_never_increases_cost(self):
+        players = _entries(40, clubs={i: i % 3 for i in range(1, 41)})
+        history = {(i, i + 1) for i in range(1, 40)}
+        slots = _layout(len(players), 64)
+        ev = ds._SwapEvaluator(players, non_bye_slots=slots, size=64, effective_count=40,
+                               club_threshold=8, history_pairs=history)
+        before = ev.total
+        self.assertLessEqual(ev.improve(), before)
+
+
+def _make_competition():
+    age = AgeCategory.objects.create(name="بزرگسالان", from_date=date(1990, 1, 1), to_date=date(2005, 1, 1))
+    return KyorugiCompetition.objects.create(
+        title="جام آزمایشی", age_category=age, belt_level="all", gender="male",
+        city="شهرکرد", address="-",
+        registration_start=date(2025, 1, 1), registration_end=date(2025, 1, 10),
+        weigh_date=date(2025, 1, 11), draw_date=date(2025, 1, 12), competition_date=date(2025, 1, 13),
+    )
+
+
+def _make_player(i):
+    return UserProfile.objects.create(
+        first_name=f"بازیکن{i}", last_name="تست", father_name="-",
+        national_code=f"{i:010d}", birth_date="1380/01/01", gender="male",
+        phone=f"09{i:09d}", address="-", province="-", county="-", city="-",
+        belt_grade="سبز", belt_certificate_number="1", belt_certificate_date="1400/01/01",
+    )
+
+
+def _enroll(comp, player, bg, wc, status="paid"):
+    return Enrollment.objects.create(
+        competition=comp, player=player, belt_group=bg, weight_category=wc,
+        declared_weight=60, insurance_number="1", insurance_issue_date=date(2025, 1, 1),
+        status=status,
+    )
+
+
+class BatchDrawTests(TestCase):
+    def setUp(self):
+        self.comp = _make_competition()
+        self.bgs = [BeltGroup.objects.create(label=f"گروه {i}") for i in range(2)]
+        self.wcs = [
+            WeightCategory.objects.create(name=f"-{54 + 4 * i}", gender="male", min_weight=50 + 4 * i, max_weight=54 + 4 * i)
+            for i in range(5)
+        ]
+        n = 0
+        for bg in self.bgs:
+            for k, wc in enumerate(self.wcs):
+                for _ in range(3 + 2 * k):
+                    n += 1
+                    _enroll(self.comp, _make_player(n), bg, wc)
+        # ثبت‌نام پرداخت‌نشده نباید در قرعه بیاید
+        _enroll(self.comp, _make_player(n + 1), self.bgs[0], self.wcs[0], status="pending_payment")
+
+    def test_creates_every_group_with_constant_queries(self):
+        # savepoint×2 + comp + enrollments + draws + history + bulk draws/matches + history select/insert
+        with self.assertNumQueries(10):
+            res = ds.create_draws_for_competition(self.comp.id, seed="abc")
+
+        self.assertEqual(len(res["draws"]), 10)
+        self.assertEqual(res["locked"], [])
+        for d in Draw.objects.filter(competition=self.comp):
+            players = Match.objects.filter(draw=d, round_no=1).values_list("player_a_id", "player_b_id")
+            real = [p for pair in players for p in pair if p]
+            expected = Enrollment.objects.filter(
+                competition=self.comp, belt_group=d.belt_group, weight_category=d.weight_category, status="paid",
+            ).count()
+            self.assertEqual(len(real), expected)
+            self.assertEqual(Match.objects.filter(draw=d).count(), d.size // 2)
+        self.assertTrue(FirstRoundPairHistory.objects.exists())
+
+    def test_stored_seed_reproduces_group_draw(self):
+        ds.create_draws_for_competition(self.comp.id, seed="abc", solver=ds.SOLVER_RANDOM)
+        d = Draw.objects.filter(competition=self.comp, size__gte=8).order_by("id").first()
+        self.assertTrue(d.rng_seed)
+        self.assertLessEqual(len(d.rng_seed), 32)
+        before = list(Match.objects.filter(draw=d).order_by("slot_a").values_list("player_a_id", "player_b_id"))
+
+        # تاریخچهٔ همین قرعه نباید روی تکرار اثر بگذارد
+        FirstRoundPairHistory.objects.all().delete()
+        again = ds.create_draw_for_group(
+            competition_id=self.comp.id,
+            age_category_id=d.age_category_id,
+            belt_group_id=d.belt_group_id,
+            weight_category_id=d.weight_category_id,
+            club_threshold=d.club_threshold,
+            seed=d.rng_seed,
+            solver=ds.SOLVER_RANDOM,
+        )
+        after = list(Match.objects.filter(draw=again).order_by("slot_a").values_list("player_a_id", "player_b_id"))
+        self.assertEqual(after, before)
+
+    def test_redraw_replaces_unlocked_and_keeps_locked(self):
+        ds.create_draws_for_competition(self.comp.id)
+        locked = Draw.objects.filter(competition=self.comp).order_by("id").first()
+        locked.is_locked = True
+        locked.save(update_fields=["is_locked"])
+
+        res = ds.create_draws_for_competition(self.comp.id)
+
+        self.assertEqual(res["locked"], [(locked.belt_group_id, locked.weight_category_id)])
+        self.assertEqual(len(res["draws"]), 9)
+        self.assertEqual(Draw.objects.filter(competition=self.comp).count(), 10)
+        self.assertTrue(Draw.objects.filter(pk=locked.pk).exists())
+
+
+class PairHistoryUpsertTests(TestCase):
+    def test_updates_existing_and_inserts_new_in_constant_queries(self):
+        comp = _make_competition()
+        bg = BeltGroup.objects.create(label="گروه")
+        wc = WeightCategory.objects.create(name="-58", gender="male", min_weight=54, max_weight=58)
+        players = [_make_player(i) for i in range(1, 9)]
+        FirstRoundPairHistory.objects.create(
+            player_a=players[0], player_b=players[1], gender="male",
+            age_category=comp.age_category, belt_group=bg, weight_category=wc,
+        )
+        entries = [
+            ds._Entry(enrollment_id=p.id, player_id=p.id, club_id=None, coach_id=None) for p in players
+        ]
+        entries[6] = ds._Entry(enrollment_id=-1, player_id=None, club_id=None, coach_id=None)  # BYE
+
+        with self.assertNumQueries(3):
+            ds._update_pair_history(
+                competition_id=comp.id,
+                gender="male",
+                age_category_id=comp.age_category_id,
+                groups={(bg.id, wc.id): entries},
+            )
+
+        rows = FirstRoundPairHistory.objects.filter(belt_group=bg, weight_category=wc)
+        self.assertEqual(rows.count(), 3)
+        self.assertEqual(rows.get(player_a=players[0], player_b=players[1]).last_competition_id, comp.id)
+        self.assertFalse(rows.filter(player_a=players[7]).exists() or rows.filter(player_b=players[7]).exists())
+
+
+class PairHistoryRetentionTests(TestCase):
+    def setUp(self):
+        self.comp = _make_competition()
+        self.bg = BeltGroup.objects.create(label="گروه")
+        self.wc = WeightCategory.objects.create(name="-58", gender="male", min_weight=54, max_weight=58)
+        self.players = [_make_player(i) for i in range(1, 7)]
+
+    def _history(self, a, b, met_at, comp=None):
+        h = FirstRoundPairHistory.objects.create(
+            player_a=self.players[a], player_b=self.players[b], gender="male",
+            age_category=self.comp.age_category, belt_group=self.bg, weight_category=self.wc,
+            last_competition=comp,
+        )
+        FirstRoundPairHistory.objects.filter(pk=h.pk).update(last_met_at=met_at)
+        return h
+
+    def test_persian_year_mode_drops_rows_before_farvardin_first(self):
+        now = datetime(2025, 5, 1, 12, tzinfo=dt_timezone.utc)  # ۱۴۰۴/۰۲/۱۱
+        old = self._history(0, 1, datetime(2025, 3, 19, 12, tzinfo=dt_timezone.utc))   # اسفند ۱۴۰۳
+        new = self._history(2, 3, datetime(2025, 3, 22, 12, tzinfo=dt_timezone.utc))   # فروردین ۱۴۰۴
+
+        self.assertEqual(ds.purge_pair_history(now=now, dry_run=True), 1)
+        self.assertEqual(ds.purge_pair_history(now=now), 1)
+        self.assertFalse(FirstRoundPairHistory.objects.filter(pk=old.pk).exists())
+        self.assertTrue(FirstRoundPairHistory.objects.filter(pk=new.pk).exists())
+
+    def test_months_mode_keeps_recent_competitions(self):
+        now = datetime(2025, 5, 31, 12, tzinfo=dt_timezone.utc)
+        Draw.objects.create(competition=self.comp, gender="male", age_category=self.comp.age_category,
+                            belt_group=self.bg, weight_category=self.wc, size=4)
+        kept = self._history(0, 1, datetime(2024, 1, 1, tzinfo=dt_timezone.utc), comp=self.comp)
+        dropped = self._history(2, 3, datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        recent = self._history(4, 5, datetime(2025, 3, 1, tzinfo=dt_timezone.utc))
+
+        deleted = ds.purge_pair_history(mode=ds.RETENTION_MONTHS, months=3, keep_last=1, now=now)
+
+        self.assertEqual(deleted, 1)
+        self.assertEqual(
+            set(FirstRoundPairHistory.objects.values_list("pk", flat=True)), {kept.pk, recent.pk}
+        )
+        self.assertFalse(FirstRoundPairHistory.objects.filter(pk=dropped.pk).exists())
+
+    def test_months_cutoff_clamps_to_month_end(self):
+        now = datetime(2025, 5, 31, 12, tzinfo=dt_timezone.utc)
+        cutoff = ds.pair_history_cutoff(mode=ds.RETENTION_MONTHS, months=3, now=now)
+        self.assertEqual(cutoff, datetime(2025, 2, 28, 12, tzinfo=dt_timezone.utc))
+
+
+def _competition_with_draws(per_weight, offset, shared_mats=False):
+    comp = _make_competition()
+    bg = BeltGroup.objects.create(label="گروه")
+    counts = per_weight if isinstance(per_weight, list) else [per_weight] * 4
+    wcs = [
+        WeightCategory.objects.create(name=f"-{54 + 4 * i}", gender="male", min_weight=50 + 4 * i, max_weight=54 + 4 * i)
+        for i in range(len(counts))
+    ]
+    half = len(wcs) // 2
+    chunks = ((1, wcs), (2, wcs)) if shared_mats else ((1, wcs[:half]), (2, wcs[half:]))
+    for mat_no, chunk in chunks:
+        MatAssignment.objects.create(competition=comp, mat_number=mat_no).weights.set(chunk)
+    n = offset
+    for wc, count in zip(wcs, counts):
+        for _ in range(count):
+            n += 1
+            _enroll(comp, _make_player(n), bg, wc)
+    ds.create_draws_for_competition(comp.id, seed="n")
+    return comp, [w.id for w in wcs]
+
+
+class MatchNumberingTests(TestCase):
+    def _number(self, comp, weight_ids):
+        with CaptureQueriesContext(connection) as ctx:
+            counters = number_matches_for_competition(comp.id, weight_ids)
+        return counters, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_matches(self):
+        small, small_w = _competition_with_draws(per_weight=3, offset=0)
+        large, large_w = _competition_with_draws(per_weight=30, offset=1000)
+
+        _, q_small = self._number(small, small_w)
+        _, q_large = self._number(large, large_w)
+        self.assertEqual(q_small, q_large)
+
+        # اجرای دوباره (راندها ساخته شده‌اند) هم ثابت است
+        _, q_small = self._number(small, small_w)
+        _, q_large = self._number(large, large_w)
+        self.assertEqual(q_small, q_large)
+
+    def test_numbers_are_contiguous_per_mat_with_finals_last(self):
+        comp, weight_ids = _competition_with_draws(per_weight=6, offset=0)
+        counters, _ = self._number(comp, weight_ids)
+
+        for mat_no, last in counters.items():
+            rows = list(
+                Match.objects.filter(draw__competition=comp, mat_no=mat_no, match_number__isnull=False)
+                .order_by("match_number")
+                .values_list("match_number", "round_no", "draw__size")
+            )
+            self.assertEqual([r[0] for r in rows], list(range(1, last + 1)))
+            finals = [r for r in rows if 2 ** r[1] == r[2]]
+            self.assertEqual(rows[-len(finals):], finals)
+        self.assertFalse(
+            Match.objects.filter(draw__competition=comp, round_no=1, is_bye=True, match_number__isnull=False).exists()
+        )
+
+    def test_materializer_builds_full_skeleton_in_constant_queries(self):
+        small, _ = _competition_with_draws(per_weight=3, offset=0)
+        large, _ = _competition_with_draws(per_weight=30, offset=1000)
+
+        with CaptureQueriesContext(connection) as ctx_small:
+            materialize_rounds_for_competition(small.id)
+        with CaptureQueriesContext(connection) as ctx_large:
+            created = materialize_rounds_for_competition(large.id)
+        self.assertEqual(len(ctx_small.captured_queries), len(ctx_large.captured_queries))
+        self.assertGreater(created, 0)
+
+        for d in Draw.objects.filter(competition=large):
+            self.assertEqual(d.matches.count(), d.size - 1)
+        # اجرای دوباره چیزی نمی‌سازد
+        self.assertEqual(materialize_rounds_for_competition(large.id), 0)
+
+    def test_shared_weights_are_balanced_across_mats(self):
+        comp, weight_ids = _competition_with_draws(per_weight=[16, 9, 5, 4], offset=0, shared_mats=True)
+        counters, _ = self._number(comp, weight_ids)
+
+        # هر جدول کامل روی یک زمین
+        for d in Draw.objects.filter(competition=comp):
+            self.assertEqual(d.matches.exclude(match_number=None).values("mat_no").distinct().count(), 1)
+        # 15 + 8 + 4 + 3 مسابقه → 15 | 15
+        self.assertEqual(counters, {1: 15, 2: 15})
+
+    def test_estimated_start_times_follow_round_order(self):
+        comp, weight_ids = _competition_with_draws(per_weight=7, offset=0)
+        start = datetime(2025, 3, 10, 9, 0, tzinfo=dt_timezone.utc)
+        number_matches_for_competition(comp.id, weight_ids, start_at=start, match_minutes=5)
+
+        numbered = Match.objects.filter(draw__competition=comp, match_number__isnull=False)
+        for m in numbered:
+            self.assertEqual(m.scheduled_at, start + timedelta(minutes=5 * (m.match_number - 1)))
+        for d in Draw.objects.filter(competition=comp):
+            rounds = {}
+            for m in numbered.filter(draw=d):
+                rounds.setdefault(m.round_no, []).append(m.scheduled_at)
+            ordered = [rounds[r] for r in sorted(rounds)]
+            for prev, nxt in zip(ordered, ordered[1:]):
+                self.assertLess(max(prev), min(nxt))
+
+
+class PublicBracketCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.comp, weight_ids = _competition_with_draws(per_weight=4, offset=0)
+        number_matches_for_competition(self.comp.id, weight_ids)
+        self.comp.bracket_published_at = timezone.now()
+        self.comp.save(update_fields=["bracket_published_at"])
+        self.url = reverse("competitions:public-kyorugi-bracket", args=[self.comp.public_id])
+
+    def test_repeat_and_conditional_requests_skip_the_database(self):
+        first = self.client.get(self.url, secure=True)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(len(first.json()["draws"]), 4)
+
+        with self.assertNumQueries(0):
+            again = self.client.get(self.url, secure=True)
+            not_modified = self.client.get(self.url, secure=True, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertIn("Last-Modified", not_modified)
+
+    def test_changes_invalidate_the_document(self):
+        first = self.client.get(self.url, secure=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            m = Match.objects.filter(draw__competition=self.comp, match_number=1).first()
+            m.match_number = 99
+            m.save(update_fields=["match_number"])
+        changed = self.client.get(self.url, secure=True, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], first["ETag"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.comp.bracket_published_at = None
+            self.comp.save(update_fields=["bracket_published_at"])
+        self.assertEqual(self.client.get(self.url, secure=True).status_code, 404)
+
+    def test_build_racing_a_commit_is_not_cached(self):
+        build = bracket_service.build_bracket_document
+        m = Match.objects.filter(draw__competition=self.comp, match_number=1).first()
+
+        def racing_build(competition_id):
+            # خواننده دادهٔ قدیمی را خوانده؛ نویسنده پیش از cache.set خواننده commit می‌کند
+            doc = build(competition_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                m.match_number = 99
+                m.save(update_fields=["match_number"])
+            return doc
+
+        with mock.patch.object(bracket_service, "build_bracket_document", racing_build):
+            stale = self.client.get(self.url, secure=True)
+        fresh = self.client.get(self.url, secure=True)
+        self.assertNotEqual(fresh["ETag"], stale["ETag"])
+        numbers = {x["match_number"] for d in fresh.json()["draws"] for x in d["matches"]}
+        self.assertIn(99, numbers)
+
+    def test_deleted_competition_returns_404(self):
+        api_url = reverse("competitions:kyorugi-bracket", args=[self.comp.pk])
+        self.assertEqual(self.client.get(self.url, secure=True).status_code, 200)
+        self.assertEqual(self.client.get(api_url, secure=True).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.comp.delete()
+        self.assertEqual(self.client.get(self.url, secure=True).status_code, 404)
+        self.assertEqual(self.client.get(api_url, secure=True).status_code, 404)
+
+    def test_stale_alias_is_a_404(self):
+        cache.set("kyorugi_bracket:alias:public:gone", 10 ** 6)
+        url = reverse("competitions:public-kyorugi-bracket", args=["gone"])
+        self.assertEqual(self.client.get(url, secure=True).status_code, 404)
+
+
+class BracketSerializerQueryTests(TestCase):
+    def setUp(self):
+        self.comp = _make_competition()
+        a, b = _make_player(1), _make_player(2)
+        bgs = [BeltGroup.objects.create(label=f"گروه {i}") for i in range(4)]
+        wcs = [
+            WeightCategory.objects.create(name=f"-{54 + 4 * i}", gender="male", min_weight=50 + 4 * i, max_weight=54 + 4 * i)
+            for i in range(10)
+        ]
+        for bg in bgs:
+            for wc in wcs:
+                d = Draw.objects.create(
+                    competition=self.comp, gender="male", age_category=self.comp.age_category,
+                    belt_group=bg, weight_category=wc, size=4,
+                )
+                Match.objects.bulk_create([
+                    Match(draw=d, round_no=2, slot_a=0, slot_b=0, mat_no=1),
+                    Match(draw=d, round_no=1, slot_a=2, slot_b=3, player_a=b, player_b=a, mat_no=1),
+                    Match(draw=d, round_no=1, slot_a=0, slot_b=1, player_a=a, player_b=b, winner=a, mat_no=1),
+                ])
+
+    def test_forty_draws_serialize_with_constant_queries(self):
+        qs = DrawWithMatchesSerializer.setup_queryset(Draw.objects.filter(competition=self.comp))
+        with self.assertNumQueries(2):
+            data = DrawWithMatchesSerializer(qs, many=True).data
+        self.assertEqual(len(data), 40)
+        first = data[0]["matches"]
+        self.assertEqual([(m["round_no"], m["slot_a"]) for m in first], [(1, 0), (1, 2), (2, 0)])
+        self.assertEqual(first[0]["winner_name"], "بازیکن1 تست")
+
+    def test_bracket_serializer_does_not_query_per_draw_or_mat(self):
+        with self.assertNumQueries(6):
+            data = KyorugiBracketSerializer(self.comp).data
+        self.assertEqual(len(data["draws"]), 40)
+        self.assertEqual(data["by_mat"][0]["count"], 120)
+
+
+
+class PlayerStatsTests(TestCase):
+    def setUp(self):
+        self.comp = _make_competition()
+        self.bg = BeltGroup.objects.create(label="گروه")
+        self.wc = WeightCategory.objects.create(name="-54", gender="male", min_weight=50, max_weight=54)
+        self.players = [_make_player(i) for i in range(1, 4)]
+        self.enrollments = [_enroll(self.comp, p, self.bg, self.wc) for p in self.players]
+
+    def _stats(self, player):
+        return PlayerStats.objects.filter(player=player).values_list(
+            "competitions", "gold", "silver", "bronze", "ranking_points",
+        ).first()
+
+    def test_result_save_and_edit_keep_stats_in_sync(self):
+        a, b, c = self.enrollments
+        result = KyorugiResult.objects.create(
+            competition=self.comp, weight_category=self.wc, gold_enrollment=a, silver_enrollment=b,
+        )
+        self.assertEqual(self._stats(a.player), (1, 1, 0, 0, 3.0))
+        self.assertEqual(self._stats(b.player), (1, 0, 1, 0, 2.0))
+
+        # جابه‌جایی مقام‌ها: بازیکن قبلی هم دوباره محاسبه می‌شود
+        result.gold_enrollment, result.silver_enrollment = c, None
+        result.save()
+        self.assertEqual(self._stats(a.player), (1, 0, 0, 0, 0.0))
+        self.assertEqual(self._stats(b.player), (1, 0, 0, 0, 0.0))
+        self.assertEqual(self._stats(c.player), (1, 1, 0, 0, 3.0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result.delete()
+        self.assertEqual(self._stats(c.player), (1, 0, 0, 0, 0.0))
+
+    def test_enrollment_status_change_refreshes_on_commit(self):
+        extra = _make_competition()
+        with self.captureOnCommitCallbacks(execute=True):
+            e = _enroll(extra, self.players[0], self.bg, self.wc, status="pending_payment")
+        self.assertEqual(self._stats(self.players[0])[0], 1)
+
+        e.status = "paid"
+        with self.captureOnCommitCallbacks(execute=True):
+            e.save(update_fields=["status"])
+        self.assertEqual(self._stats(self.players[0])[0], 2)
+
+    def test_rebuild_command(self):
+        PlayerStats.objects.all().delete()
+        call_command("rebuild_player_stats", "--batch-size", "2", stdout=open(os.devnull, "w"))
+        self.assertEqual(PlayerStats.objects.count(), UserProfile.objects.count())
+        self.assertEqual(self._stats(self.players[1]), (1, 0, 0, 0, 0.0))
+
+    def test_migration_fills_existing_players(self):
+        from django.apps import apps
+        from importlib import import_module
+
+        KyorugiResult.objects.create(competition=self.comp, weight_category=self.wc, gold_enrollment=self.enrollments[0])
+        PlayerStats.objects.all().delete()
+        import_module("competitions.migrations.0015_playerstats").fill_player_stats(apps, None)
+        self.assertEqual(PlayerStats.objects.count(), UserProfile.objects.count())
+        self.assertEqual(self._stats(self.players[0]), (1, 1, 0, 0, 3.0))
+
+
+
+class RankingLedgerTests(TestCase):
+    def setUp(self):
+        self.comp = _make_competition()
+        self.bg = BeltGroup.objects.create(label="گروه")
+        self.board = TkdBoard.objects.create(name="هیئت", province="-", city="-")
+        self.club = TkdClub.objects.create(club_name="باشگاه", tkd_board=self.board)
+        self.coach = _make_player(99)
+        self.wcs, self.results = [], []
+        n = 0
+        for i in range(6):
+            wc = WeightCategory.objects.create(name=f"-{54 + 4 * i}", gender="male", min_weight=50 + 4 * i, max_weight=54 + 4 * i)
+            ens = []
+            for _ in range(2):
+                n += 1
+                e = _enroll(self.comp, _make_player(n), self.bg, wc)
+                Enrollment.objects.filter(pk=e.pk).update(coach=self.coach, club=self.club, board=self.board)
+                ens.append(Enrollment.objects.get(pk=e.pk))
+            self.wcs.append(wc)
+            self.results.append(KyorugiResult.objects.create(
+                competition=self.comp, weight_category=wc, gold_enrollment=ens[0], silver_enrollment=ens[1],
+            ))
+
+    def _totals(self):
+        self.coach.refresh_from_db()
+        self.club.refresh_from_db()
+        self.board.refresh_from_db()
+        return round(self.coach.ranking_total, 2), round(self.club.ranking_total, 2), round(self.board.ranking_total, 2)
+
+    def test_totals_follow_ledger(self):
+        # هر وزن: طلا 3 + نقره 2 → مربی 30٪، باشگاه/هیئت 20٪
+        self.assertEqual(self._totals(), (9.0, 6.0, 6.0))
+        self.assertEqual(RankingTransaction.objects.filter(competition=self.comp).count(), 6 * 2 * 4)
+        gold = self.results[0].gold_enrollment.player
+        gold.refresh_from_db()
+        self.assertEqual((gold.ranking_competition, gold.ranking_total), (3.0, 3.0))
+
+    def test_edit_writes_only_net_changes(self):
+        result = self.results[0]
+        result.gold_enrollment, result.silver_enrollment = result.silver_enrollment, result.gold_enrollment
+        with CaptureQueriesContext(connection) as ctx:
+            result.save()
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        # مربی/باشگاه/هیئت تغییری نکرده‌اند؛ فقط یک UPDATE گروهی برای دو بازیکن (+ خود نتیجه)
+        self.assertEqual(len([u for u in updates if "accounts_userprofile" in u]), 1)
+        self.assertFalse([u for u in updates if "accounts_tkdclub" in u or "accounts_tkdboard" in u])
+        self.assertEqual(self._totals(), (9.0, 6.0, 6.0))
+        result.silver_enrollment.player.refresh_from_db()
+        self.assertEqual(result.silver_enrollment.player.ranking_total, 2.0)
+
+    def test_competition_reapply_is_idempotent_with_constant_queries(self):
+        # savepoint×4 + قفل نتایج + دفتر قبلی + حذف + ثبت‌نام‌ها + bulk_create؛ تغییر خالص صفر → بدون UPDATE
+        # + PlayerStats (پروفایل‌ها + سه کوئری منبع + savepoint×2 + حذف + درج)
+        with self.assertNumQueries(17):
+            self.assertEqual(apply_competition_results(self.comp), 6)
+        self.assertEqual(self._totals(), (9.0, 6.0, 6.0))
+        self.assertEqual(RankingTransaction.objects.filter(competition=self.comp).count(), 48)
+
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.bg = BeltGroup.objects.create(label="گروه")
+        self.wc = WeightCategory.objects.create(name="-54", gender="male", min_weight=50, max_weight=54)
+        self.comps = [_make_competition(), _make_competition()]
+        # فصل 1403 و 1404
+        KyorugiCompetition.objects.filter(pk=self.comps[1].pk).update(competition_date=date(2025, 6, 1))
+        self.players = [_make_player(i) for i in range(1, 4)]
+        for comp, (g, s) in zip(self.comps, [(0, 1), (1, 2)]):
+            ens = {i: _enroll(comp, self.players[i], self.bg, self.wc) for i in (g, s)}
+            KyorugiResult.objects.create(
+                competition=comp, weight_category=self.wc, gold_enrollment=ens[g], silver_enrollment=ens[s],
+            )
+        build_leaderboards()
+        self.url = reverse("competitions:leaderboard", args=["player"])
+
+    def _board(self, **params):
+        res = self.client.get(self.url, params, secure=True)
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def test_overall_season_and_competition_boards(self):
+        p1, p2, p3 = self.players
+        data = self._board()
+        self.assertEqual(data["count"], 3)
+        self.assertEqual([(r["rank"], r["subject_id"], r["points"]) for r in data["results"]],
+                         [(1, p2.pk, 5.0), (2, p1.pk, 3.0), (3, p3.pk, 2.0)])
+        self.assertEqual(data["results"][0]["name"], "بازیکن2 تست")
+
+        season = self._board(season="1404")["results"]
+        self.assertEqual([(r["subject_id"], r["gold"], r["silver"]) for r in season], [(p2.pk, 1, 0), (p3.pk, 0, 1)])
+
+        comp = self._board(competition=self.comps[0].public_id, age_category=self.comps[0].age_category_id)
+        self.assertEqual([r["subject_id"] for r in comp["results"]], [p1.pk, p2.pk])
+
+        page = self._board(page_size=1, page=2)
+        self.assertEqual([r["rank"] for r in page["results"]], [2])
+        self.assertEqual(self._board(gender="female")["count"], 0)
+
+    def test_unknown_subject_is_404(self):
+        res = self.client.get(reverse("competitions:leaderboard", args=["x"]), secure=True)
+        self.assertEqual(res.status_code, 404)
+
+    def test_reconcile_fixes_drifted_totals(self):
+        p1 = self.players[0]
+        UserProfile.objects.filter(pk=p1.pk).update(ranking_total=100, ranking_competition=50)
+        call_command("reconcile_rankings", "--dry-run", stdout=open(os.devnull, "w"))
+        p1.refresh_from_db()
+        self.assertEqual(p1.ranking_total, 100)
+
+        call_command("reconcile_rankings", "--batch-size", "2", stdout=open(os.devnull, "w"))
+        p1.refresh_from_db()
+        self.assertEqual((p1.ranking_competition, p1.ranking_total), (3.0, 3.0))
+
+
+
+class CoachRegisterStudentsTests(TestCase):
+    def setUp(self):
+        self.comp = _make_competition()
+        self.comp.registration_manual = True
+        self.comp.save(update_fields=["registration_manual"])
+        bg = BeltGroup.objects.create(label="رنگی")
+        bg.belts.add(Belt.objects.create(name="سبز"))
+        self.comp.belt_groups.add(bg)
+        mat = MatAssignment.objects.create(competition=self.comp, mat_number=1)
+        self.wcs = [
+            WeightCategory.objects.create(name=f"-{54 + 4 * i}", gender="male", min_weight=50 + 4 * i, max_weight=54 + 4 * i)
+            for i in range(3)
+        ]
+        mat.weights.add(*self.wcs)
+        self.board = TkdBoard.objects.create(name="هیئت", province="-", city="-")
+        self.club = TkdClub.objects.create(club_name="باشگاه", tkd_board=self.board)
+
+        self.coach = _make_player(900)
+        UserProfile.objects.filter(pk=self.coach.pk).update(
+            user=User.objects.create(username="coach"), role="coach", is_coach=True,
+        )
+        self.coach.refresh_from_db()
+        self.players = [_make_player(i) for i in range(1, 9)]
+        UserProfile.objects.filter(pk__in=[p.pk for p in self.players]).update(
+            role="player", club=self.club, tkd_board=self.board, coach=self.coach,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.coach.user)
+        self.url = reverse("competitions:coach-register-students", args=[self.comp.pk])
+
+    def _post(self, players, **extra):
+        students = [
+            {"player_id": p.pk, "declared_weight": 51 + (i % 3) * 4,
+             "insurance_number": "1", "insurance_issue_date": "1403/09/01"}
+            for i, p in enumerate(players)
+        ]
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(self.url, {"students": students, **extra}, format="json", secure=True)
+        return res, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_students(self):
+        self._post(self.players[:1], preview=True)  # ساخت پروفایل شرایط مسابقه
+        _, few = self._post(self.players[:2], preview=True)
+        _, many = self._post(self.players, preview=True)
+        self.assertEqual(few, many)
+
+        res, few = self._post(self.players[:2])
+        self.assertEqual(res.status_code, 201, res.content)
+        res, many = self._post(self.players[2:])
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(few, many)
+
+        enrollments = Enrollment.objects.filter(competition=self.comp)
+        self.assertEqual(enrollments.filter(status="paid", is_paid=True, bank_ref_code="FREE").count(), 8)
+        self.assertEqual(
+            sorted(res.json()["enrollment_ids"]),
+            sorted(enrollments.filter(player__in=self.players[2:]).values_list("pk", flat=True)),
+        )
+        e = enrollments.get(player=self.players[1])
+        self.assertEqual((e.weight_category_id, e.club_id, e.board_id), (self.wcs[1].pk, self.club.pk, self.board.pk))
+
+        # امتیاز مشارکت و PlayerStats مثل mark_paid
+        self.assertEqual(RankingAward.objects.filter(enrollment__competition=self.comp).count(), 8)
+        self.club.refresh_from_db()
+        self.coach.refresh_from_db()
+        self.assertEqual((self.club.ranking_total, self.coach.ranking_total), (4.0, 6.0))
+        self.assertEqual(PlayerStats.objects.get(player=self.players[0]).competitions, 1)
+
+    def test_per_student_errors_are_kept(self):
+        a, b, c, d = self.players[:4]
+        UserProfile.objects.filter(pk=a.pk).update(gender="female")
+        UserProfile.objects.filter(pk=b.pk).update(belt_grade="قرمز")
+        _enroll(self.comp, d, None, self.wcs[0])
+        students = [
+            {"player_id": a.pk, "declared_weight": 51, "insurance_issue_date": "1403/09/01"},
+            {"player_id": b.pk, "declared_weight": 51, "insurance_issue_date": "1403/09/01"},
+            {"player_id": c.pk, "declared_weight": 90, "insurance_issue_date": "1403/09/01"},
+            {"player_id": d.pk, "declared_weight": 51, "insurance_issue_date": "1403/09/01"},
+            {"player_id": 10 ** 6, "declared_weight": 51, "insurance_issue_date": "1403/09/01"},
+        ]
+        res = self.client.post(self.url, {"students": students}, format="json", secure=True)
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.json()["skipped_already_enrolled"], [d.pk])
+        self.assertEqual(res.json()["errors"], {
+            str(a.pk): "جنسیت بازیکن با مسابقه سازگار نیست.",
+            str(b.pk): "گروه کمربندی متناسب با کمربند بازیکن در این مسابقه یافت نشد.",
+            str(c.pk): "رده وزنی مناسب با وزن اعلامی در این مسابقه یافت نشد.",
+            str(10 ** 6): "پروفایل بازیکن یافت نشد.",
+        })
+
+    def test_eligible_list_filters_age_window_in_sql(self):
+        for p, bd in zip(self.players[:3], ("1370/01/01", "1390/01/01", "-")):
+            p.birth_date = bd
+            p.save(update_fields=["birth_date"])
+        url = reverse("competitions:coach-eligible-students", args=[self.comp.pk])
+        res = self.client.get(url, secure=True)
+        self.assertEqual(res.status_code, 200)
+        ids = {s["id"] for s in res.json()["students"]}
+        self.assertEqual(ids, {self.players[0].pk, *(p.pk for p in self.players[3:])})
+
+
+
+class EligibilityProfileTests(TestCase):
+    def setUp(self):
+        self.comp = _make_competition()
+        self.mat = MatAssignment.objects.create(competition=self.comp, mat_number=1)
+        # سقف هر رده با ارفاق از حداقل ردهٔ بعد بیشتر است
+        self.wcs = [
+            WeightCategory.objects.create(name=f"-{54 + 4 * i}", gender="male",
+                                          min_weight=50 + 4 * i, max_weight=54 + 4 * i, tolerance=0.5)
+            for i in range(4)
+        ]
+        self.mat.weights.add(*self.wcs[1:], self.wcs[0])
+        self.female = WeightCategory.objects.create(name="-49", gender="female", min_weight=45, max_weight=49)
+        self.mat.weights.add(self.female)
+        self.group = BeltGroup.objects.create(label="رنگی")
+        self.group.belts.add(Belt.objects.create(name="سبز"), Belt.objects.create(name="آبی"))
+        self.comp.belt_groups.add(self.group)
+
+    def test_bisect_matches_linear_scan(self):
+        rules = eligibility_for(self.comp)
+        for w in (49.9, 50, 53.9, 54, 54.4, 54.5, 54.6, 58.5, 66, 66.5, 66.6, "x", None):
+            expected = next((wc for wc in self.wcs if isinstance(w, (int, float)) and wc.includes_weight(w)), None)
+            self.assertEqual(rules.weight_category_for("male", w), expected, w)
+        self.assertEqual(rules.weight_category_for("female", 47), self.female)
+        self.assertEqual(rules.belt_group_for("green"), self.group)
+        self.assertIsNone(rules.belt_group_for("red"))
+        self.assertEqual(rules.belt_codes, {"green", "blue"})
+        self.assertTrue(rules.age_ok(date(2000, 1, 1)))
+        self.assertFalse(rules.age_ok(date(2010, 1, 1)))
+
+    def test_interval_index_matches_linear_helpers(self):
+        rng = random.Random(7)
+        cats = [
+            WeightCategory(pk=i, name=str(i), gender="male", min_weight=lo, max_weight=lo + rng.choice((2, 4, 6)),
+                           tolerance=rng.choice((0, 0.2, 1.5)))
+            for i, lo in enumerate(sorted(rng.uniform(20, 90) for _ in range(30)), start=1)
+        ]
+        for lower in (False, True):
+            index = WeightIndex(reversed(cats), lower_tolerance=lower)
+            ordered = sorted(cats, key=lambda wc: (wc.min_weight - (wc.tolerance if lower else 0), wc.pk))
+            for w in [rng.uniform(15, 100) for _ in range(500)]:
+                ok = _wc_includes if lower else (lambda wc, v: wc.includes_weight(v))
+                self.assertEqual(index.find(w), next((wc for wc in ordered if ok(wc, w)), None), w)
+
+    def test_bulk_resolve_for_registration_and_cards(self):
+        rules = eligibility_for(self.comp)
+        self.assertEqual(
+            rules.resolve_weights([("male", 51), ("female", 47), ("male", 99), ("male", 59)]),
+            [self.wcs[0], self.female, None, self.wcs[2]],
+        )
+        # کارت‌ها: ارفاق دوطرفه و فقط رده‌های هم‌جنس مسابقه
+        self.assertEqual(competition_weight_index(self.comp).find(49.6), self.wcs[0])
+        self.assertTrue(all(_gender_ok_for_wc(self.comp, wc.gender) for wc in competition_weight_index(self.comp).categories))
+
+        players = [_make_player(i) for i in range(1, 4)]
+        es = [_enroll(self.comp, p, self.group, None) for p in players]
+        Enrollment.objects.filter(pk=es[1].pk).update(declared_weight=63)
+        Enrollment.objects.filter(pk=es[2].pk).update(weight_category=self.wcs[3])
+        qs = Enrollment.objects.filter(pk__in=[e.pk for e in es]).select_related("competition")
+        with self.assertNumQueries(1):  # فقط خود ثبت‌نام‌ها؛ پروفایل مسابقه از کش
+            resolved = resolve_enrollment_weights(list(qs))
+        self.assertEqual(resolved, {es[0].pk: self.wcs[2], es[1].pk: self.wcs[3]})
+
+    def test_cached_and_invalidated_by_rule_changes(self):
+        eligibility_for(self.comp)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.comp.allowed_weight_ids(), {wc.pk for wc in self.wcs} | {self.female.pk})
+
+        self.mat.weights.remove(self.female)
+        self.assertIsNone(eligibility_for(self.comp).weight_category_for("female", 47))
+
+        Belt.objects.filter(name="آبی").get().delete()
+        self.assertEqual(eligibility_for(self.comp).belt_codes, {"green"})
+
+        red = Belt.objects.create(name="قرمز")
+        red.beltgroup_set.add(self.group)
+        self.assertEqual(eligibility_for(self.comp).belt_group_for("red"), self.group)
+
+        self.comp.belt_groups.clear()
+        self.assertEqual(eligibility_for(self.comp).belt_groups, ())
+
+        self.comp.age_category.to_date = date(2012, 1, 1)
+        self.comp.age_category.save()
+        self.assertTrue(eligibility_for(self.comp).age_ok(date(2010, 1, 1)))
+
+    def test_profile_built_across_a_commit_is_not_reused(self):
+        from competitions.services import eligibility
+
+        build = eligibility.build_eligibility
+
+        def racing_build(comp, version):
+            rules = build(comp, version)  # رده‌های پیش از تغییر
+            with self.captureOnCommitCallbacks(execute=True):
+                self.mat.weights.remove(self.female)
+            return rules
+
+        with mock.patch.object(eligibility, "build_eligibility", racing_build):
+            self.assertEqual(eligibility_for(self.comp).weight_category_for("female", 47), self.female)
+        eligibility._local.clear()  # پروسهٔ دیگر
+        self.assertIsNone(eligibility_for(self.comp).weight_category_for("female", 47))
+
+
+
+class JalaliConversionTests(SimpleTestCase):
+    def test_parse_and_format_variants(self):
+        g = date(2024, 6, 30)
+        for value in ("۱۴۰۳/۰۴/۱۰", "1403-4-10", "\u200f1403.04.10", "2024-06-30", "2024-06-30T08:00:00Z",
+                      g, datetime(2024, 6, 30, 10), jdatetime.date(1403, 4, 10)):
+            self.assertEqual(jalali.parse_date(value), g, value)
+            self.assertEqual(jalali.jalali_str(value), "1403/04/10", value)
+        for value in ("", None, "1403/13/01", "نامعتبر", "14030410"):
+            self.assertIsNone(jalali.parse_date(value), value)
+        # datetime آگاه: روز محلی (تهران)
+        self.assertEqual(jalali.jalali_str(datetime(2024, 6, 29, 21, tzinfo=dt_timezone.utc), sep="-"), "1403-04-10")
+
+    def test_shared_helpers_agree(self):
+        self.assertEqual(_parse_jalali_str("2024-06-30"), jdatetime.date(1403, 4, 10))
+        self.assertEqual(_to_jalali_date_str(date(2024, 6, 30)), "1403/04/10")
+        self.assertEqual(to_jalali_filter("۱۴۰۳/۴/۱۰"), "1403/04/10")
+        self.assertEqual(to_jalali_filter("بدون تاریخ"), "بدون تاریخ")
+
+    def test_list_helpers_convert_each_value_once(self):
+        jalali.clear_caches()
+        values = ["1403/04/10", date(2024, 6, 30), None, "1403/04/10", "x"] * 100
+        self.assertEqual(jalali.jalali_strs(values)[:5], ["1403/04/10", "1403/04/10", None, "1403/04/10", None])
+        info = jalali.cache_info()
+        self.assertEqual((info["_parse_str"].misses, info["_format"].misses), (2, 1))
+        self.assertEqual(jalali.parse_dates(["2024-06-30", [], "1403/04/10"]), [date(2024, 6, 30), None, date(2024, 6, 30)])
+
+    def test_benchmark_command_output_matches_legacy(self):
+        out, err = StringIO(), StringIO()
+        call_command("benchmark_jalali", rows=200, repeat=1, stdout=out, stderr=err)
+        self.assertEqual(err.getvalue(), "")
+        self.assertIn("columnar", out.getvalue())
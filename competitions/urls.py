@@ -14,6 +14,9 @@ from .views import (
     DashboardKyorugiListView, PlayerCompetitionsList, RefereeCompetitionsList,
     CoachStudentsEligibleListView, CoachRegisterStudentsView,
 
+    # --------- Rankings ----------
+    LeaderboardView,
+
     # --------- Dashboard (ALL) ----------
     DashboardAllCompetitionsView,public_bracket_view  ,
 
@@ -75,6 +78,9 @@ urlpatterns = [
     path("auth/kyorugi/<ckey:key>/register/students/", CoachRegisterStudentsView.as_view(),
          name="register-students-bulk-alias"),
 
+    # ========================= رده‌بندی =========================
+    path("rankings/<str:subject>/", LeaderboardView.as_view(), name="leaderboard"),
+
     # ========================= Dashboard =========================
     path("dashboard/all/", DashboardAllCompetitionsView.as_view(), name="dashboard-all"),
     path("dashboard/kyorugi/", DashboardKyorugiListView.as_view(), name="dashboard-kyorugi"),
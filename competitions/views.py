@@ -3,7 +3,6 @@ import logging
 import json
 import re
 from collections import defaultdict
-from typing import Optional  # ✅ سازگاری پایتون < 3.10
 import base64  # optional اگر لازم شد
 
 # زمان/تاریخ
@@ -16,9 +15,8 @@ from typing import Set  # بالای فایل کنار typing ها اضافه ک
 # بالای فایل کنار ایمپورت‌ها
 from rest_framework.exceptions import ValidationError as DRFValidationError
 
-import jdatetime
 
-from django.db.models import Exists, OuterRef, Q
+from django.db.models import Q
 
 from decimal import Decimal
 from uuid import UUID
@@ -32,7 +30,9 @@ from django.conf import settings
 from django.core.exceptions import FieldError, ValidationError
 from django.db import transaction, IntegrityError
 from django.db import models as djm
-from django.http import Http404
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
@@ -46,10 +46,12 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 
 # --- Project models
 from accounts.models import UserProfile, TkdClub, TkdBoard
+from common.jalali import jalali_str, parse_date
 from .models import (
-    KyorugiCompetition, CoachApproval, Enrollment, Draw, Match,
-    WeightCategory, BeltGroup, Belt, KyorugiResult, Seminar, SeminarRegistration, GroupRegistrationPayment,
+    KyorugiCompetition, CoachApproval, Enrollment,
+    Belt, KyorugiResult, Seminar, SeminarRegistration, GroupRegistrationPayment,
     PoomsaeCompetition, PoomsaeCoachApproval, PoomsaeEnrollment,AgeCategory,
+    LeaderboardEntry, RankingTransaction, award_points_for_enrollments,
 
 )
 
@@ -65,12 +67,19 @@ from .serializers import (
      CompetitionRegistrationSerializer,
      EnrollmentCardSerializer,
      KyorugiBracketSerializer,
-     EnrollmentLiteSerializer,DrawWithMatchesSerializer,
+     EnrollmentLiteSerializer,
      _norm_belt, _player_belt_code_from_profile, _norm_gender, _allowed_belts,
      SeminarSerializer, SeminarRegistrationSerializer, SeminarCardSerializer,PoomsaeEnrollmentCardSerializer,
-     DashboardAnyCompetitionSerializer, PoomsaeCompetitionDetailSerializer, PoomsaeRegistrationSerializer
+     DashboardAnyCompetitionSerializer, PoomsaeCompetitionDetailSerializer, PoomsaeRegistrationSerializer,
+     LeaderboardEntrySerializer,
 )
 
+# --- Project services
+from .services.bracket_service import cached_competition_id, get_bracket_document
+from .services.eligibility import eligibility_for, resolve_enrollment_weights
+from .services.leaderboard_service import leaderboard_queryset, subject_names
+from .services.player_stats_service import refresh_player_stats_on_commit
+
 CARD_READY_STATUSES = {"paid", "confirmed", "approved", "accepted", "completed"}
 
 # ✅ کارت آماده نمایش؟
@@ -109,18 +118,12 @@ def jsonable(obj):
 
 
 def _birth_jalali_from_profile(p: UserProfile) -> str:
-    g = _player_birthdate_to_gregorian(p)
-    if not g:
-        return ""
-    try:
-        return jdatetime.date.fromgregorian(date=g).strftime("%Y/%m/%d")
-    except Exception:
-        return ""
+    return jalali_str(_player_birthdate_to_gregorian(p)) or ""
 
 def _poomsae_user_eligible(user, comp):
     """صلاحیت بازیکن برای پومسه: جنسیت + بازه‌های سنی (M2M و FK) + کمربند."""
     prof = UserProfile.objects.filter(user=user)\
-                          .only("gender","birth_date","belt_grade").first()
+                          .only("gender","birth_date","birth_date_greg","belt_grade").first()
 
     if not prof:
         return False
@@ -357,77 +360,27 @@ def _gender_norm(val):
     }
     return m.get(str(val).strip().lower(), None)
 
-def _parse_jalali_ymd(s: str) -> Optional[_date]:  # ✅ Optional
-    if not s:
-        return None
-    t = re.sub(r"[\u200e\u200f\u200c\u202a-\u202e]", "", str(s))
-    t = t.replace("-", "/")
-    t = t.translate(str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩","01234567890123456789"))
-    m = re.fullmatch(r"(\d{4})/(\d{1,2})/(\d{1,2})", t)
-    if not m: return None
-    jy, jm, jd = map(int, m.groups())
-    try:
-        g = jdatetime.date(jy, jm, jd).togregorian()
-        return _date(g.year, g.month, g.day)
-    except Exception:
-        return None
-
 def _player_birthdate_to_gregorian(p: UserProfile):
-    return _parse_jalali_ymd(p.birth_date)
+    # ستون میلادی همگام با birth_date؛ برای نمونه‌های ذخیره‌نشده/بدون آن، پارس رشته
+    return getattr(p, "birth_date_greg", None) or parse_date(p.birth_date)
 
 def _allowed_belt_names_for_comp(comp: KyorugiCompetition):
-    if comp.belt_groups.exists():
-        belts = set()
-        qs = BeltGroup.objects.filter(id__in=comp.belt_groups.values_list("id", flat=True)).prefetch_related("belts")
-        for g in qs:
-            belts.update(list(g.belts.values_list("name", flat=True)))
-        return belts
-    if comp.belt_level == "yellow_blue":
-        return {"سفید", "زرد", "سبز", "آبی"}
-    if comp.belt_level == "red_black":
-        return {"قرمز"} | {f"مشکی دان {i}" for i in range(1, 11)}
-    return {"سفید", "زرد", "سبز", "آبی", "قرمز"} | {f"مشکی دان {i}" for i in range(1, 11)}
+    return set(eligibility_for(comp).belt_names)
 
 def _age_ok_for_comp(p: UserProfile, comp: KyorugiCompetition):
-    bd = _player_birthdate_to_gregorian(p)
-    if not bd:
-        return False
-    cat = comp.age_category
-    if not cat:
-        return True
-    return (cat.from_date <= bd <= cat.to_date)
+    return eligibility_for(comp).age_ok(_player_birthdate_to_gregorian(p))
 
 def _find_weight_category_for(comp: KyorugiCompetition, gender: str, declared_weight: float):
-    ids = comp.allowed_weight_ids()
-    if not ids:
-        return None
-    qs = WeightCategory.objects.filter(id__in=ids, gender=gender).order_by("min_weight")
-    for wc in qs:
-        # اگر متد includes_weight در مدل داری، از اون استفاده کن؛ وگرنه این شرط را نگه دار:
-        try:
-            if hasattr(wc, "includes_weight") and callable(wc.includes_weight):
-                if wc.includes_weight(float(declared_weight)):
-                    return wc
-            else:
-                tol = getattr(wc, "tolerance", 0) or 0
-                lo = (wc.min_weight or 0) - tol if wc.min_weight is not None else float("-inf")
-                hi = (wc.max_weight or 0) + tol if wc.max_weight is not None else float("inf")
-                if lo <= float(declared_weight) <= hi:
-                    return wc
-        except Exception:
-            continue
-    return None
+    return eligibility_for(comp).weight_category_for(gender, declared_weight)
 
 def _coach_from_request(request):
     return UserProfile.objects.filter(user=request.user, role__in=["coach", "both"]).first()
 
 
 def _allowed_belt_names(comp: KyorugiCompetition) -> "Set[str]":
-    if comp.belt_groups.exists():
-        return set(
-            Belt.objects.filter(beltgroup__in=comp.belt_groups.all())
-            .values_list("name", flat=True)
-        )
+    profile = eligibility_for(comp)
+    if profile.belt_groups:
+        return set(profile.belt_names)
     return set(Belt.objects.values_list("name", flat=True))
 
 
@@ -855,34 +808,9 @@ class RegisterSelfPrefillView(views.APIView):
                     return str(v)
             return ""
 
-        def _parse_birthdate_to_date(val):
-            if not val:
-                return None
-            t = str(val).strip()
-            if "T" in t:
-                t = t[:10]
-            t = t.replace("-", "/")
-            t = t.translate(str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789"))
-            m = re.search(r"(\d{4})/(\d{1,2})/(\d{1,2})", t)
-            if not m:
-                return None
-            y, m_, d = map(int, m.groups())
-            try:
-                if y < 1700:
-                    g = jdatetime.date(y, m_, d).togregorian()
-                    return _date(g.year, g.month, g.day)
-                return _date(y, m_, d)
-            except Exception:
-                return None
-
         def _birth_display(p: UserProfile) -> str:
-            raw = getattr(p, "birth_date", None) or getattr(p, "birthDate", None)
-            if not raw:
-                return ""
-            g = _parse_birthdate_to_date(raw)
-            if g:
-                return jdatetime.date.fromgregorian(date=g).strftime("%Y/%m/%d")
-            return ""
+            raw = getattr(p, "birth_date_greg", None) or getattr(p, "birth_date", None) or getattr(p, "birthDate", None)
+            return jalali_str(raw) or ""
 
         can_register = comp.registration_open_effective
         coach_name = _coach_name_only(prof)
@@ -941,17 +869,7 @@ class RegisterSelfPrefillView(views.APIView):
 
 # یک هلسپر کوچک (جلالی)
 def _to_jalali_str(d):
-    if not d:
-        return ""
-    try:
-        # اگر datetime است، به timezone محلی برگردان و فقط تاریخ را بردار
-        if isinstance(d, _datetime):
-            if timezone.is_naive(d):
-                d = timezone.make_aware(d, timezone.get_current_timezone())
-            d = timezone.localtime(d).date()
-        return jdatetime.date.fromgregorian(date=d).strftime("%Y/%m/%d")
-    except Exception:
-        return ""
+    return jalali_str(d) or ""
 
 def _profile_belt_display(p):
     # اولویت با grade / سپس نام کمربند
@@ -1007,12 +925,7 @@ class EnrollmentCardView(views.APIView):
         return url
 
     def _to_jalali_str(self, d):
-        if not d:
-            return ""
-        try:
-            return jdatetime.date.fromgregorian(date=d).strftime("%Y/%m/%d")
-        except Exception:
-            return ""
+        return _to_jalali_str(d)
 
     def _profile_belt_display(self, p):
         for name in ("belt_grade", "belt_name", "belt_label", "belt_title"):
@@ -1143,46 +1056,28 @@ class MyEnrollmentView(views.APIView):
             status=status.HTTP_200_OK
         )
 
+def _bracket_response(request, doc, body):
+    """پاسخ JSON آمادهٔ براکت با ETag/Last-Modified؛ درخواست شرطیِ تکراری 304 می‌گیرد."""
+    if not doc.ready:
+        return Response({"detail": "bracket_not_ready"}, status=status.HTTP_404_NOT_FOUND)
+    last_modified = int(doc.last_modified)
+    resp = get_conditional_response(request, etag=doc.etag, last_modified=last_modified)
+    if resp is None:
+        resp = HttpResponse(body, content_type="application/json; charset=utf-8")
+    resp["ETag"] = doc.etag
+    resp["Last-Modified"] = http_date(last_modified)
+    resp["Cache-Control"] = "public, max-age=0, must-revalidate"
+    return resp
+
+
 class KyorugiBracketView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, key):
-        comp = _get_comp_by_key(key)
-
-        # شرط انتشار (property یا فیلد تاریخی)
-        is_published = bool(
-            getattr(comp, "is_bracket_published", None)
-            or getattr(comp, "bracket_published_at", None)
-        )
-        if not is_published:
-            return Response({"detail": "bracket_not_ready"}, status=status.HTTP_404_NOT_FOUND)
-
-        # فقط براکت‌هایی که هیچ مسابقهٔ واقعیِ بدون شماره ندارند
-        unsafe = Match.objects.filter(
-            draw=OuterRef("pk"),
-            is_bye=False,
-            match_number__isnull=True,
-        )
-        has_any_draw = comp.draws.exists()
-        draws_qs = (
-            Draw.objects.filter(competition=comp)
-            .annotate(_has_unumbered=Exists(unsafe))
-            .filter(_has_unumbered=False)
-            .order_by("weight_category__min_weight", "id")
-        )
-
-        if (not has_any_draw) or (not draws_qs.exists()):
-            return Response({"detail": "bracket_not_ready"}, status=status.HTTP_404_NOT_FOUND)
-
-        # اگر از سریالایزر کلی استفاده می‌کنی:
-        ser = DrawWithMatchesSerializer(draws_qs, many=True, context={"request": request})
-        return Response({
-            "competition": {
-                "title": comp.title,
-                "public_id": comp.public_id,
-            },
-            "draws": ser.data
-        }, status=200)
+        # نگاشت کلید و خود سند از کش؛ فقط بار اول (یا پس از تغییر) سراغ پایگاه‌داده می‌رود
+        comp_id = cached_competition_id(f"key:{key}", lambda: _get_comp_by_key(key).id)
+        doc = get_bracket_document(comp_id)
+        return _bracket_response(request, doc, doc.api_body)
 
 
 # ───────── GET: لیست شاگردها با پیش‌تیک ثبت‌نام‌شده‌ها ─────────
@@ -1196,8 +1091,8 @@ class CoachStudentsEligibleListView(APIView):
         if not coach:
             return Response({"detail": "پروفایل مربی یافت نشد."}, status=status.HTTP_404_NOT_FOUND)
 
-        allowed_belts = _allowed_belt_names_for_comp(comp)
-        allowed_codes = set(_norm_belt(x) for x in (allowed_belts or []) if x)  # ✅ نرمال‌سازی
+        rules = eligibility_for(comp)
+        allowed_codes = rules.belt_codes  # ✅ نرمال‌شده
         
         req_gender = _required_gender_for_comp(comp)
         
@@ -1213,6 +1108,12 @@ class CoachStudentsEligibleListView(APIView):
         
         if req_gender in ("male","female"):
             students_qs = students_qs.filter(gender=req_gender)
+
+        # ✅ بازهٔ سنی روی ستون ایندکس‌شدهٔ birth_date_greg (بدون تاریخ تولد معتبر: واجد شرایط نیست)
+        if rules.age_window:
+            students_qs = students_qs.filter(birth_date_greg__range=rules.age_window)
+        else:
+            students_qs = students_qs.filter(birth_date_greg__isnull=False)
         
         ids = list(students_qs.values_list("id", flat=True))
         existing_map = dict(
@@ -1230,9 +1131,6 @@ class CoachStudentsEligibleListView(APIView):
             if allowed_codes and (not student_code or student_code not in allowed_codes):
                 continue
         
-            if not _age_ok_for_comp(s, comp):
-                continue
-        
             items.append({
                 "id": s.id,
                 "first_name": s.first_name,
@@ -1248,7 +1146,7 @@ class CoachStudentsEligibleListView(APIView):
             })
 
 
-        belt_groups = list(comp.belt_groups.values_list("label", flat=True))
+        belt_groups = rules.belt_group_labels
 
         entry_fee_irr = int(comp.entry_fee or 0)
 
@@ -1297,6 +1195,10 @@ class CoachRegisterStudentsView(APIView):
 
     @transaction.atomic
     def _finalize_free_or_test(self, comp, coach, payload, ref_code):
+        """
+        ساخت ثبت‌نام‌های پرداخت‌شده (رایگان/آزمایشی) با یک bulk_create؛ معادل create + mark_paid.
+        چون bulk_create سیگنال ندارد، امتیاز مشارکت و PlayerStats همین‌جا به‌صورت گروهی اعمال می‌شوند.
+        """
         from datetime import date as _date
 
         items = payload.get("items") or []
@@ -1306,68 +1208,75 @@ class CoachRegisterStudentsView(APIView):
         payable_amount = int(payload.get("payable_amount") or 0)
         per_person_paid = self._split_amounts(payable_amount, len(items))
 
-        enrollments_out = []
-        created_ids = []
+        # قفل همهٔ بازیکنان با یک کوئری (به ترتیب pk تا ترتیب قفل‌ها ثابت بماند)
+        player_ids = [int(it["player_id"]) for it in items]
+        names = {
+            pk: f"{fn} {ln}".strip()
+            for pk, fn, ln in UserProfile.objects.select_for_update()
+            .filter(id__in=player_ids).order_by("pk")
+            .values_list("pk", "first_name", "last_name")
+        }
+        missing = set(player_ids) - set(names)
+        if missing:
+            raise UserProfile.DoesNotExist(f"UserProfile {sorted(missing)} not found")
 
+        coach_name = f"{coach.first_name} {coach.last_name}".strip()
+        paid_at = timezone.now()
+        objs = []
         for idx, it in enumerate(items):
-            pid = int(it["player_id"])
-            player = UserProfile.objects.select_for_update().get(id=pid)
-
-            declared_weight = float(it["declared_weight"])
-
             ins_date = it.get("insurance_issue_date")
             if isinstance(ins_date, str) and ins_date:
                 ins_date = _date.fromisoformat(ins_date)
+            amount = int(per_person_paid[idx] if idx < len(per_person_paid) else 0)
 
-            belt_group_id = it.get("belt_group_id") or None
-            weight_cat_id = it.get("weight_category_id") or None
-
-            board_id = it.get("board_id") or None
-            club_id = it.get("club_id") or None
-
-            coach_name = f"{coach.first_name} {coach.last_name}".strip()
-
-            e = Enrollment.objects.create(
+            objs.append(Enrollment(
                 competition=comp,
-                player=player,
+                player_id=int(it["player_id"]),
                 coach=coach,
                 coach_name=coach_name,
 
-                club_id=club_id,
+                club_id=it.get("club_id") or None,
                 club_name=str(it.get("club_name") or ""),
 
-                board_id=board_id,
+                board_id=it.get("board_id") or None,
                 board_name=str(it.get("board_name") or ""),
 
-                belt_group_id=belt_group_id,
-                weight_category_id=weight_cat_id,
+                belt_group_id=it.get("belt_group_id") or None,
+                weight_category_id=it.get("weight_category_id") or None,
 
-                declared_weight=declared_weight,
+                declared_weight=float(it["declared_weight"]),
                 insurance_number=str(it.get("insurance_number") or ""),
                 insurance_issue_date=ins_date,
 
                 discount_code=payload.get("discount_code") or None,
                 discount_amount=0,
-                payable_amount=int(per_person_paid[idx] if idx < len(per_person_paid) else 0),
-
-                status="pending_payment",
-                is_paid=False,
-                paid_amount=0,
-                bank_ref_code="",
+                payable_amount=amount,
+
+                status="paid",
+                is_paid=True,
+                paid_amount=amount,
+                bank_ref_code=str(ref_code or ""),
+                paid_at=paid_at,
+            ))
+
+        Enrollment.objects.bulk_create(objs)
+        if any(e.pk is None for e in objs):  # MySQL شناسه‌های bulk_create را برنمی‌گرداند
+            ids = dict(
+                Enrollment.objects.filter(competition=comp, player_id__in=player_ids, paid_at=paid_at)
+                .values_list("player_id", "pk")
             )
-
-            e.mark_paid(
-                amount=int(per_person_paid[idx] if idx < len(per_person_paid) else 0),
-                ref_code=ref_code,
-            )
-
-            created_ids.append(e.id)
-            enrollments_out.append({
-                "enrollment_id": e.id,
-                "status": e.status,
-                "player": {"id": e.player_id, "name": f"{player.first_name} {player.last_name}".strip()},
-            })
-
+            for e in objs:
+                e.pk = ids.get(e.player_id)
+
+        created_ids = [e.pk for e in objs]
+        award_points_for_enrollments(created_ids)
+        refresh_player_stats_on_commit(player_ids)
+
+        enrollments_out = [{
+            "enrollment_id": e.pk,
+            "status": e.status,
+            "player": {"id": e.player_id, "name": names[e.player_id]},
+        } for e in objs]
         return {"enrollment_ids": created_ids, "enrollments": enrollments_out}
 
     # --------------------------
@@ -1375,9 +1284,6 @@ class CoachRegisterStudentsView(APIView):
     # --------------------------
     @transaction.atomic
     def post(self, request, key):
-        import re as _re
-        from datetime import date as _date
-
         comp = _get_comp_by_key(key)
         coach = _coach_from_request(request)
         if not coach:
@@ -1413,32 +1319,23 @@ class CoachRegisterStudentsView(APIView):
 
         # --- پارس تاریخ بیمه ---
         def _parse_insurance_date(v):
-            if v is None:
-                return None
-            t = str(v).strip()
-            if "T" in t:
-                t = t.split("T", 1)[0]
-            t = _re.sub(r"[\u200e\u200f\u200c\u202a-\u202e]", "", t)
-            t = t.translate(str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789"))
-            t = t.replace("-", "/")
-            m = _re.fullmatch(r"(\d{4})/(\d{1,2})/(\d{1,2})", t)
-            if not m:
-                return None
-            y, m_, d = map(int, m.groups())
-            try:
-                if y < 1700:
-                    g = jdatetime.date(y, m_, d).togregorian()
-                    return _date(g.year, g.month, g.day)
-                return _date(y, m_, d)
-            except Exception:
-                return None
+            return parse_date(v)
 
         created_items = []
         skipped_already = []
         errors = {}
+        pending = []  # (جنسیت رده وزنی، ردیف) تا رده‌ها یک‌جا حل شوند
 
         req_gender = _required_gender_for_comp(comp)
 
+        # --- پیش‌بارگذاری یک‌باره؛ اعتبارسنجی هر شاگرد در حافظه انجام می‌شود ---
+        players = (
+            UserProfile.objects.filter(role__in=["player", "both", "coach"])
+            .select_related("club", "tkd_board")
+            .in_bulk(player_ids)
+        )
+        rules = eligibility_for(comp)
+
         for it in items:
             pid = it.get("player_id")
             if not pid:
@@ -1452,7 +1349,7 @@ class CoachRegisterStudentsView(APIView):
                 skipped_already.append(pid)
                 continue
 
-            player = UserProfile.objects.filter(id=pid, role__in=["player", "both", "coach"]).first()
+            player = players.get(pid)
 
             if not player:
                 errors[str(pid)] = "پروفایل بازیکن یافت نشد."
@@ -1479,35 +1376,39 @@ class CoachRegisterStudentsView(APIView):
                 errors[str(pid)] = "وزن اعلامی نامعتبر است."
                 continue
 
-            belt_group = _belt_group_for_player_in_comp(player, comp)
-            if comp.belt_groups.exists() and not belt_group:
+            belt_group = rules.belt_group_for(_player_belt_code_from_profile(player))
+            if rules.belt_groups and not belt_group:
                 errors[str(pid)] = "گروه کمربندی متناسب با کمربند بازیکن در این مسابقه یافت نشد."
                 continue
 
-            gender_for_wc = req_gender or _gender_norm(player.gender)
-            weight_cat = _find_weight_category_for(comp, gender_for_wc, declared_weight)
-            if not weight_cat:
-                errors[str(pid)] = "رده وزنی مناسب با وزن اعلامی در این مسابقه یافت نشد."
-                continue
-
             board_obj = getattr(player, "tkd_board", None)
             club_obj = getattr(player, "club", None)
 
-            created_items.append({
+            gender_for_wc = req_gender or _gender_norm(player.gender)
+            pending.append((gender_for_wc, {
                 "player_id": pid,
                 "declared_weight": declared_weight,
                 "insurance_number": str(it.get("insurance_number") or ""),
                 "insurance_issue_date": ins_date.isoformat(),  # JSON-safe
 
                 "belt_group_id": belt_group.id if belt_group else None,
-                "weight_category_id": weight_cat.id if weight_cat else None,
+                "weight_category_id": None,
 
                 "club_id": club_obj.id if club_obj else None,
                 "club_name": getattr(club_obj, "club_name", "") if club_obj else "",
 
                 "board_id": board_obj.id if board_obj else None,
                 "board_name": getattr(board_obj, "name", "") if board_obj else "",
-            })
+            }))
+
+        # --- رده وزنی همه با هم از نمایهٔ بازه‌ای مسابقه ---
+        weight_cats = rules.resolve_weights([(g, row["declared_weight"]) for g, row in pending])
+        for (_, row), weight_cat in zip(pending, weight_cats):
+            if not weight_cat:
+                errors[str(row["player_id"])] = "رده وزنی مناسب با وزن اعلامی در این مسابقه یافت نشد."
+                continue
+            row["weight_category_id"] = weight_cat.id
+            created_items.append(row)
 
         if not created_items and (not errors) and skipped_already:
             return Response({
@@ -1702,9 +1603,14 @@ class EnrollmentCardsBulkView(views.APIView):
         ids = [int(i) for i in ids if str(i).isdigit()]
 
         # هر دو مدل
-        kyo = {e.id: e for e in Enrollment.objects.filter(id__in=ids)}
+        kyo = {
+            e.id: e for e in Enrollment.objects.filter(id__in=ids)
+            .select_related("competition", "player", "weight_category", "belt_group")
+        }
         poo = {e.id: e for e in PoomsaeEnrollment.objects.filter(id__in=ids)}
         all_map = {**kyo, **poo}
+        # رده وزنیِ ثبت‌نام‌های بدون رده، یک‌جا برای همهٔ کارت‌ها
+        kyo_ctx = {"request": request, "resolved_weights": resolve_enrollment_weights(kyo.values())}
 
         prof  = UserProfile.objects.filter(user=request.user).first()
         club  = TkdClub.objects.filter(user=request.user).first()
@@ -1730,7 +1636,7 @@ class EnrollmentCardsBulkView(views.APIView):
 
             # سریالایزر مناسب
             if isinstance(e, Enrollment):
-                data = EnrollmentCardSerializer(e, context={"request": request}).data
+                data = EnrollmentCardSerializer(e, context=kyo_ctx).data
             else:
                 data = PoomsaeEnrollmentCardSerializer(e, context={"request": request}).data
 
@@ -1773,33 +1679,18 @@ class KyorugiResultsView(views.APIView):
 
 
 
+@api_view(["GET"])
+@permission_classes([AllowAny])
 def public_bracket_view(request, public_id):
-    comp = KyorugiCompetition.objects.filter(public_id=public_id).first()
-    if not comp:
-        return Response({"detail":"not_found"}, status=404)
-
-    # شرط انتشار
-    if not comp.is_bracket_published:
-        return Response({"detail":"bracket_not_ready"}, status=404)
-
-    # فقط براکت‌های «کاملاً شماره‌گذاری‌شده»
-    unsafe = Match.objects.filter(
-        draw=OuterRef("pk"),
-        is_bye=False,
-        match_number__isnull=True,
-    )
-    draws_qs = (
-        Draw.objects.filter(competition=comp)
-        .annotate(_has_unumbered=Exists(unsafe))
-        .filter(_has_unumbered=False)
-        .order_by("weight_category__min_weight", "id")
+    comp_id = cached_competition_id(
+        f"public:{public_id}",
+        lambda: KyorugiCompetition.objects.filter(public_id=public_id).values_list("id", flat=True).first(),
     )
+    if comp_id is None:
+        return Response({"detail":"not_found"}, status=404)
 
-    data = {
-        "board_logo_url": _logo_url(),
-        "draws": DrawWithMatchesSerializer(draws_qs, many=True).data,  # از سریالایزر فعلی‌ات استفاده کن
-    }
-    return Response(data, status=200)
+    doc = get_bracket_document(comp_id)
+    return _bracket_response(request, doc, doc.public_body)
 
 
 
@@ -2155,32 +2046,8 @@ class PoomsaeRegisterSelfView(APIView):
           - ISO datetime مثل 'YYYY-MM-DDTHH:mm:ssZ'
         خروجی: 'YYYY-MM-DD' گریگوریان (بدون جابه‌جایی روز).
         """
-        if not s:
-            return ""
-        import re as _re
-        t = str(s).strip()
-        # اگر ISO datetime است، فقط تاریخ را بردار
-        if "T" in t:
-            t = t.split("T", 1)[0]
-        # پاک‌سازی و یکسان‌سازی
-        t = _re.sub(r"[\u200e\u200f\u200c\u202a-\u202e]", "", t)
-        t = t.translate(str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")).replace("-", "/")
-
-        m = _re.fullmatch(r"(\d{4})/(\d{1,2})/(\d{1,2})", t)
-        if not m:
-            return ""
-
-        y, m_, d = map(int, m.groups())
-        try:
-            if y < 1700:
-                # جلالی→گریگوریان: با ساعت 12 ظهر تا هیچ DST/Timezone شِفتی اتفاق نیفتد
-                jdt = jdatetime.datetime(y, m_, d, 12, 0, 0)
-                g = jdt.togregorian().date()
-            else:
-                g = _date(y, m_, d)
-            return f"{g.year:04d}-{g.month:02d}-{g.day:02d}"
-        except Exception:
-            return ""
+        g = parse_date(s)
+        return g.isoformat() if g else ""
 
     def _as_plain_dict(self, data):
         out = {}
@@ -2206,20 +2073,7 @@ class PoomsaeRegisterSelfView(APIView):
         raise Http404("PoomsaeCompetition not found")
 
     def _to_greg_date(self, val):
-        if not val:
-            return None
-        if isinstance(val, _date):
-            return val
-        t = str(val).strip().replace("-", "/")
-        t = t.translate(str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩","01234567890123456789"))
-        try:
-            y, m, d = map(int, t.split("/")[:3])
-            if y < 1700:
-                g = jdatetime.date(y, m, d).togregorian()
-                return _date(g.year, g.month, g.day)
-            return _date(y, m, d)
-        except Exception:
-            return None
+        return parse_date(val)
 
     @transaction.atomic
     def post(self, request, *args, **kwargs):
@@ -2440,6 +2294,17 @@ class PoomsaeCoachStudentsEligibleListView(PoomsaeKwargMixin, APIView):
                 # fallback خیلی محافظه‌کارانه
                 students_qs = students_qs.filter(gender=req_gender)
 
+        # ✅ پیش‌فیلتر سنی روی birth_date_greg (بررسی کامل همچنان در _poomsae_user_eligible)
+        wins = [(ac.from_date, ac.to_date) for ac in comp.age_categories.all()]
+        if not wins and comp.age_category_id:
+            wins = [(comp.age_category.from_date, comp.age_category.to_date)]
+        if wins:
+            age_q = Q(pk__in=[])
+            for fr, to in wins:
+                if fr and to:
+                    age_q |= Q(birth_date_greg__range=(fr, to))
+            students_qs = students_qs.filter(age_q)
+
         ids = list(students_qs.values_list("id", flat=True))
 
         # ثبت‌نام‌های قبلی پومسه (استاندارد/ابداعی هر دو)
@@ -2497,3 +2362,41 @@ class PoomsaeCoachStudentsEligibleListView(PoomsaeKwargMixin, APIView):
             "prechecked_ids": [pid for pid in existing_map.keys() if any(x["id"] == pid for x in items)],
         }, status=200)
 
+
+# ------------------------------------------------------------- رده‌بندی -------------------------------------------------------------
+class LeaderboardView(generics.ListAPIView):
+    """
+    جدول رده‌بندی از snapshot (build_leaderboards):
+    /rankings/<player|coach|club|board>/?season=1403 | ?competition=<id|public_id>
+    &gender=male|female &age_category=<id> &page=..&page_size=..
+    """
+    serializer_class = LeaderboardEntrySerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = DefaultPagination
+
+    def get_queryset(self):
+        subject = self.kwargs["subject"]
+        if subject not in dict(RankingTransaction.SUBJECT_CHOICES):
+            raise Http404("unknown leaderboard")
+
+        qp = self.request.query_params
+        scope, scope_key = LeaderboardEntry.SCOPE_OVERALL, ""
+        if qp.get("competition"):
+            scope, scope_key = LeaderboardEntry.SCOPE_COMPETITION, str(_get_comp_by_key(qp["competition"]).pk)
+        elif qp.get("season"):
+            scope, scope_key = LeaderboardEntry.SCOPE_SEASON, qp["season"].strip()
+
+        age = (qp.get("age_category") or "").strip()
+        return leaderboard_queryset(
+            subject, scope, scope_key,
+            gender=(qp.get("gender") or "").strip().lower(),
+            age_category_id=int(age) if age.isdigit() else None,
+        )
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        names = subject_names(self.kwargs["subject"], [e.subject_id for e in page])
+        ser = self.get_serializer(page, many=True, context={**self.get_serializer_context(), "names": names})
+        response = self.get_paginated_response(ser.data)
+        response.data["generated_at"] = page[0].generated_at if page else None
+        return response
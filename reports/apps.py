@@ -4,3 +4,8 @@ class ReportsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "reports"
     verbose_name = "گزارش‌گیری"
+
+    def ready(self):
+        # نقشهٔ مدل‌ها/فیلدهای گزارش‌ها یک‌بار، نه در هر درخواست
+        from .schema import load_schema
+        load_schema()
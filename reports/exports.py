@@ -0,0 +1,193 @@
+# tkdjango/reports/exports.py
+"""
+خروجی جریانی (streaming) جدول‌های گزارش کاربران به CSV و XLSX.
+
+ردیف‌ها با QuerySet.iterator(chunk_size) خوانده و تکه‌تکه به پاسخ فرستاده می‌شوند؛
+مصرف حافظه به تعداد ردیف‌های هیئت/باشگاه بستگی ندارد.
+XLSX بدون کتابخانهٔ جانبی ساخته می‌شود (zipfile روی یک بافر غیرقابل seek + inlineStr).
+"""
+import csv
+import numbers
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+from . import services
+
+EXPORT_CHUNK_SIZE = 500
+
+_STUDENT_STATS = [
+    ("competitions", "مسابقات"),
+    ("medal_gold", "طلا"), ("medal_silver", "نقره"), ("medal_bronze", "برنز"),
+    ("rank_comp", "رنک.مس"), ("rank_total", "رنک.کل"),
+]
+
+# kind → (ستون‌ها [(کلید ردیف، عنوان)], سازندهٔ QuerySet، سازندهٔ ردیف، نام فایل)
+TABLES = {
+    "coach_students": (
+        [("full_name", "نام و نام‌خانوادگی"), ("belt", "کمربند"), ("national_code", "کدملی"),
+         ("club_name", "باشگاه"), ("birth_date", "تاریخ تولد")] + _STUDENT_STATS,
+        services.coach_students_qs, services.coach_student_row, "coach_students",
+    ),
+    "club_students": (
+        [("full_name", "نام و نام‌خانوادگی"), ("belt", "کمربند"), ("national_code", "کدملی"),
+         ("coach_name", "نام مربی"), ("birth_date", "تاریخ تولد")] + _STUDENT_STATS,
+        services.club_students_qs, services.club_student_row, "club_students",
+    ),
+    "board_students": (
+        [("full_name", "نام و نام‌خانوادگی"), ("belt", "کمربند"), ("national_code", "کدملی"),
+         ("coach_name", "نام مربی"), ("birth_date", "تاریخ تولد")] + _STUDENT_STATS,
+        services.board_students_qs, services.board_student_row, "board_students",
+    ),
+    "board_coaches_referees": (
+        [("full_name", "نام و نام‌خانوادگی"), ("role_label", "نقش"), ("national_code", "کدملی"),
+         ("phone", "موبایل"), ("club_name", "باشگاه(ها)"), ("players_count", "تعداد بازیکنان"),
+         ("joined_jalali", "تاریخ عضویت/تأیید"),
+         ("medal_gold", "طلا"), ("medal_silver", "نقره"), ("medal_bronze", "برنز"),
+         ("rank_total", "رنک.کل")],
+        services.board_coaches_referees_qs, services.board_coach_referee_row, "board_coaches_referees",
+    ),
+}
+
+
+def iter_table(kind, **filters):
+    """(عنوان‌ها، ژنراتور ردیف‌ها) برای یک جدول؛ ردیف‌ها تکه‌تکه از پایگاه‌داده خوانده می‌شوند."""
+    columns, qs_fn, row_fn, _ = TABLES[kind]
+    qs = qs_fn(**filters)
+
+    def rows():
+        for p in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            row = row_fn(p)
+            yield [row.get(key, "") for key, _ in columns]
+
+    return [title for _, title in columns], rows()
+
+
+# ---------- CSV ----------
+class _Echo:
+    """شبه‌فایل برای csv.writer: به‌جای نوشتن، همان خط را برمی‌گرداند."""
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows):
+    writer = csv.writer(_Echo())
+    yield "\ufeff"  # BOM تا اکسل فارسی را درست باز کند
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+# ---------- XLSX ----------
+class _ChunkBuffer:
+    """مقصد zipfile: بایت‌ها جمع می‌شوند تا ژنراتور آن‌ها را تخلیه کند (بدون seek)."""
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView rightToLeft="1" workbookViewId="0"/></sheetViews>'
+    '<sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def _xlsx_cell(value):
+    if isinstance(value, bool) or value is None:
+        value = "" if value is None else str(value)
+    if isinstance(value, numbers.Number):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return "<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>"
+
+
+def stream_xlsx(header, rows):
+    buf = _ChunkBuffer()
+    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        yield buf.drain()
+
+        with zf.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            sheet.write((_SHEET_HEAD + _xlsx_row(header)).encode("utf-8"))
+            for row in rows:
+                sheet.write(_xlsx_row(row).encode("utf-8"))
+                data = buf.drain()
+                if data:
+                    yield data
+            sheet.write(_SHEET_TAIL.encode("utf-8"))
+    yield buf.drain()
+
+
+FORMATS = {
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "xlsx": (stream_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def streaming_export(kind, fmt, **filters):
+    """StreamingHttpResponse برای جدول kind در قالب fmt (csv/xlsx)."""
+    streamer, content_type = FORMATS[fmt]
+    header, rows = iter_table(kind, **filters)
+    response = StreamingHttpResponse(streamer(header, rows), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{TABLES[kind][3]}.{fmt}"'
+    return response
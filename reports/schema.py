@@ -0,0 +1,192 @@
+# tkdjango/reports/schema.py
+"""
+نقشهٔ مدل‌ها و فیلدهایی که گزارش‌ها لازم دارند.
+
+قبلاً هر درخواست (و هر ردیف) با _meta.get_field و __import__ حدس می‌زد کدام فیلد/مدل
+وجود دارد. این نقشه یک‌بار در ReportsConfig.ready() حل می‌شود و سرویس‌ها فقط
+نام‌های حل‌شده را می‌خوانند.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from django.apps import apps
+from django.db.models import DateTimeField
+
+# ===== نام‌های محتمل =====
+CREATED_FIELDS = ("created_at", "date_joined", "created", "created_on", "joined_at")
+CREATED_OR_APPROVED_FIELDS = ("approved_at", "created_at", "date_joined", "created", "joined_at")
+ROLE_FIELDS = ("role", "user_role", "role_name", "roles")
+FLAG_FIELDS = ("is_player", "is_coach", "is_referee", "is_club")
+COACH_FIELDS = ("coach", "coach_user", "teacher", "mentor", "master", "main_coach", "head_coach")
+NATIONAL_CODE_FIELDS = ("national_code", "nid", "national_id")
+PHONE_FIELDS = ("phone", "mobile", "phone_number", "cellphone")
+DOB_FIELDS = ("birth_date", "date_of_birth", "dob", "birthdate", "birthday", "dateBirth", "datebirth", "birth")
+CLUB_M2M_FIELDS = ("coaching_clubs", "clubs", "related_clubs", "managed_clubs")
+BOARD_FK_FIELDS = ("board", "tkd_board", "federation_board", "province_board", "hyat", "heyat")
+BOARD_M2M_FIELDS = ("boards", "tkd_boards", "related_boards")
+
+BELT_DISPLAY_FKS = ("belt", "rank", "belt_degree")
+BELT_DISPLAY_CHOICE_FIELDS = ("level", "grade", "belt_level", "belt_grade", "dan", "kup", "gup")
+BELT_DISPLAY_TEXT_FIELDS = ("belt_name", "belt_title", "belt", "grade", "dan", "gup", "kup")
+BELT_FILTER_TEXT_FIELDS = ("belt_name", "belt_title", "belt", "grade", "level",
+                           "dan", "gup", "kup", "belt_color", "color_belt")
+BELT_FILTER_CHOICE_FIELDS = ("level", "grade", "belt_level", "belt_grade", "dan", "kup", "gup", "belt", "belt_color")
+
+
+@dataclass(frozen=True)
+class ReportSchema:
+    # مدل‌ها
+    UserProfile: type
+    Club: Optional[type]
+    Board: Optional[type]
+    Belt: Optional[type]
+
+    # UserProfile
+    role_field: Optional[str]
+    role_choices: Tuple[Tuple[str, str], ...]
+    flag_fields: Tuple[str, ...]
+    created_field: Optional[str]
+    created_or_approved_field: Optional[str]
+    has_club_fk: bool
+    club_m2m_fields: Tuple[str, ...]
+    coach_fields: Tuple[str, ...]          # FK های مستقیم شاگرد → مربی (فیلتر/نام مربی)
+    coach_link_fields: Tuple[str, ...]     # + FK های خودارجاع که «coach» در نامشان است
+    coach_link_m2m: Tuple[str, ...]
+    national_code_field: Optional[str]
+    phone_field: Optional[str]
+    dob_field: Optional[str]
+    board_field: Optional[str]
+    board_field_is_m2m: bool
+    belt_fk: Optional[str]                                      # فیلتر با FK کمربند
+    belt_display_fks: Tuple[str, ...]
+    belt_display_choices: Tuple[Tuple[str, dict], ...]          # (فیلد، {کلید: برچسب})
+    belt_display_text_fields: Tuple[str, ...]
+    belt_filter_text_fields: Tuple[str, ...]
+    belt_filter_choice_fields: Tuple[Tuple[str, tuple], ...]   # (فیلد، choices)
+
+    # باشگاه
+    club_created_field: Optional[str]
+    club_board_field: Optional[str]
+    club_board_field_is_m2m: bool
+
+    def is_datetime(self, model, field_name) -> bool:
+        return isinstance(_field(model, field_name), DateTimeField)
+
+
+def _model(dotted):
+    try:
+        return apps.get_model(dotted)
+    except LookupError:
+        return None
+
+
+def _field(model, name):
+    if model is None or not name:
+        return None
+    try:
+        return model._meta.get_field(name)
+    except Exception:
+        return None
+
+
+def _first(model, names):
+    return next((n for n in names if _field(model, n) is not None), None)
+
+
+def _all(model, names):
+    return tuple(n for n in names if _field(model, n) is not None)
+
+
+def _m2m(model, names):
+    return tuple(n for n in names if getattr(_field(model, n), "many_to_many", False))
+
+
+def _first_model(*dotted):
+    return next((m for m in map(_model, dotted) if m is not None), None)
+
+
+def resolve_schema() -> ReportSchema:
+    UserProfile = apps.get_model("accounts.UserProfile")
+    Club = _first_model("accounts.TkdClub", "accounts.Club")
+    Board = _first_model("accounts.TkdBoard", "accounts.Board")
+
+    role_field = _first(UserProfile, ROLE_FIELDS)
+    coach_fields = _all(UserProfile, COACH_FIELDS)
+    coach_self_fks = tuple(
+        f.name for f in UserProfile._meta.fields
+        if getattr(getattr(f, "remote_field", None), "model", None) == UserProfile
+        and "coach" in f.name.lower() and f.name not in coach_fields
+    )
+    coach_link_m2m = tuple(
+        m.name for m in UserProfile._meta.many_to_many
+        if "coach" in m.name.lower() and m.remote_field.model == UserProfile
+    )
+
+    board_field = _first(UserProfile, BOARD_FK_FIELDS)
+    board_m2m = False
+    if not board_field:
+        board_field = next(iter(_m2m(UserProfile, BOARD_M2M_FIELDS)), None)
+        board_m2m = bool(board_field)
+
+    club_board_field = _first(Club, BOARD_FK_FIELDS)
+    club_board_m2m = False
+    if not club_board_field:
+        club_board_field = next(iter(_m2m(Club, BOARD_M2M_FIELDS)), None)
+        club_board_m2m = bool(club_board_field)
+
+    return ReportSchema(
+        UserProfile=UserProfile,
+        Club=Club,
+        Board=Board,
+        Belt=_first_model("accounts.Belt", "competitions.Belt"),
+
+        role_field=role_field,
+        role_choices=tuple(getattr(_field(UserProfile, role_field), "choices", None) or ()),
+        flag_fields=_all(UserProfile, FLAG_FIELDS),
+        created_field=_first(UserProfile, CREATED_FIELDS),
+        created_or_approved_field=_first(UserProfile, CREATED_OR_APPROVED_FIELDS),
+        has_club_fk=_field(UserProfile, "club") is not None,
+        club_m2m_fields=_m2m(UserProfile, CLUB_M2M_FIELDS),
+        coach_fields=coach_fields,
+        coach_link_fields=coach_fields + coach_self_fks,
+        coach_link_m2m=coach_link_m2m,
+        national_code_field=_first(UserProfile, NATIONAL_CODE_FIELDS),
+        phone_field=_first(UserProfile, PHONE_FIELDS),
+        dob_field=_first(UserProfile, DOB_FIELDS),
+        board_field=board_field,
+        board_field_is_m2m=board_m2m,
+        belt_fk=("belt" if getattr(_field(UserProfile, "belt"), "is_relation", False) else None),
+        belt_display_fks=tuple(
+            n for n in BELT_DISPLAY_FKS if getattr(_field(UserProfile, n), "is_relation", False)
+        ),
+        belt_display_choices=tuple(
+            (n, dict(_field(UserProfile, n).choices))
+            for n in BELT_DISPLAY_CHOICE_FIELDS if getattr(_field(UserProfile, n), "choices", None)
+        ),
+        belt_display_text_fields=_all(UserProfile, BELT_DISPLAY_TEXT_FIELDS),
+        belt_filter_text_fields=_all(UserProfile, BELT_FILTER_TEXT_FIELDS),
+        belt_filter_choice_fields=tuple(
+            (n, tuple(_field(UserProfile, n).choices))
+            for n in BELT_FILTER_CHOICE_FIELDS if getattr(_field(UserProfile, n), "choices", None)
+        ),
+
+        club_created_field=_first(Club, CREATED_FIELDS),
+        club_board_field=club_board_field,
+        club_board_field_is_m2m=club_board_m2m,
+    )
+
+
+_SCHEMA: Optional[ReportSchema] = None
+
+
+def load_schema() -> ReportSchema:
+    """در ReportsConfig.ready() صدا زده می‌شود."""
+    global _SCHEMA
+    _SCHEMA = resolve_schema()
+    return _SCHEMA
+
+
+def get_schema() -> ReportSchema:
+    return _SCHEMA if _SCHEMA is not None else load_schema()
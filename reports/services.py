@@ -1,16 +1,15 @@
 # tkdjango/reports/services.py
 from datetime import date, timedelta
 import datetime as _dt
-from django.db.models import Count, Sum, Q, F, DateTimeField
+from django.db.models import Case, CharField, Count, Sum, Q, F, When
+from django.db.models import FloatField, Func, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
 from django.db.models import DateField as _DateField
 
-# jdatetime برای تبدیل جلالی←→میلادی (اختیاری)
-try:
-    import jdatetime
-    _HAS_JDATETIME = True
-except Exception:
-    jdatetime = None
-    _HAS_JDATETIME = False
+from common.jalali import jalali_str, jalali_strs, parse_date
+
+from .schema import get_schema
 
 
 # ===== پیکربندی نقش‌ها =====
@@ -22,108 +21,14 @@ ROLE_VALUES = {
     "club":    ["club", "باشگاه"],
 }
 
-# مقادیر مدال (فارسی/انگلیسی/عددی)
-MEDAL_STRINGS = {
-    "gold":   {"gold", "طلایی", "طلا", "۱", "1"},
-    "silver": {"silver", "نقره‌ای", "نقره", "۲", "2"},
-    "bronze": {"bronze", "برنزی", "برنز", "۳", "3"},
-}
-
-# ---------- هِلپرهای عمومی متن/تاریخ ----------
-_FA_DIGITS = "۰۱۲۳۴۵۶۷۸۹"
-_EN_DIGITS = "0123456789"
-_AR_DIGITS = "٠١٢٣٤٥٦٧٨٩"  # Arabic-Indic U+0660..U+0669
-
+# ---------- هِلپرهای عمومی ----------
+# تبدیل تاریخ شمسی/میلادی: common.jalali
 
 def get_belt_choices():
 
-    try:
-        from accounts.models import UserProfile
-        return list(UserProfile.BELT_CHOICES)
-    except Exception:
-        return []
-
-
-
-
-def _fa_to_en(s: str) -> str:
-    if not s:
-        return ""
-    out = []
-    for ch in str(s):
-        if ch in _FA_DIGITS:
-            out.append(_EN_DIGITS[_FA_DIGITS.index(ch)])
-        elif ch in _AR_DIGITS:
-            out.append(_EN_DIGITS[_AR_DIGITS.index(ch)])
-        else:
-            out.append(ch)
-    return "".join(out)
-
-def _norm_date_str(s: str) -> str:
-    """
-    '۱۴۰۲/۴/۵' → '1402-04-05'
-    '1402.4.5' → '1402-04-05'
-    """
-    if not s:
-        return ""
-    s = _fa_to_en(str(s)).strip()
-    for sep in ("/", ".", "–", "—", "−"):
-        s = s.replace(sep, "-")
-    parts = [p for p in s.split("-") if p]
-    if len(parts) == 3:
-        y, m, d = parts[0], parts[1].zfill(2), parts[2].zfill(2)
-        return f"{y}-{m}-{d}"
-    return s
-
-def _to_gdate_from_any(v):
-    """
-    هر چیزی که شبیه تاریخ باشد را به datetime.date میلادی تبدیل می‌کند.
-    ورودی می‌تواند date/datetime یا رشته جلالی/میلادی (با ارقام فارسی یا انگلیسی) باشد.
-    """
-    if not v:
-        return None
-
-    # اگر خودش تاریخ/دیتایم باشد
-    if hasattr(v, "date") and isinstance(v, _dt.datetime):
-        return v.date()
-    if hasattr(v, "year") and hasattr(v, "month") and hasattr(v, "day"):
-        # datetime.date یا jdatetime.date
-        if _HAS_JDATETIME and isinstance(v, jdatetime.date):
-            try:
-                return v.togregorian()
-            except Exception:
-                return None
-        # احتمالاً datetime.date
-        try:
-            _ = v.year + v.month + v.day
-            return v
-        except Exception:
-            pass
-
-    # رشته
-    s = _norm_date_str(v)
-    if not s or "-" not in s:
-        return None
-
-    try:
-        y, m, d = [int(x) for x in s.split("-")]
-    except Exception:
-        return None
+    return list(getattr(get_schema().UserProfile, "BELT_CHOICES", ()))
 
-    # اگر سال بزرگ بود، میلادی فرض کن
-    if y >= 1600:
-        try:
-            return _dt.date(y, m, d)
-        except Exception:
-            return None
 
-    # جلالی → میلادی
-    if _HAS_JDATETIME:
-        try:
-            return jdatetime.date(y, m, d).togregorian()
-        except Exception:
-            return None
-    return None
 
 
 # ---------- هِلپرهای کمربند ----------
@@ -147,8 +52,9 @@ def _belt_label_from_instance(belt_obj):
 def _apply_belt_filter(players_qs, UserProfile, belt):
     if not belt:
         return players_qs
+    sch = get_schema()
 
-    if _field_exists(UserProfile, "belt") and hasattr(belt, "id"):
+    if sch.belt_fk and hasattr(belt, "id"):
         return players_qs.filter(belt_id=belt.id)
 
     label = belt if isinstance(belt, str) else _belt_label_from_instance(belt)
@@ -156,7 +62,7 @@ def _apply_belt_filter(players_qs, UserProfile, belt):
         return players_qs
     label_n = _norm(label)
 
-    if _field_exists(UserProfile, "belt") and not hasattr(belt, "id"):
+    if sch.belt_fk and not hasattr(belt, "id"):
         try:
             bqs = get_belt_qs()
             if bqs is not None:
@@ -174,57 +80,22 @@ def _apply_belt_filter(players_qs, UserProfile, belt):
             pass
 
     q = Q()
-    TEXT_FIELDS = (
-        "belt_name", "belt_title", "belt", "grade", "level",
-        "dan", "gup", "kup", "belt_color", "color_belt",
-    )
-    for f in TEXT_FIELDS:
-        if _field_exists(UserProfile, f):
-            q |= Q(**{f + "__iexact": label}) | Q(**{f + "__iexact": label.replace("آ", "ا")})
+    for f in sch.belt_filter_text_fields:
+        q |= Q(**{f + "__iexact": label}) | Q(**{f + "__iexact": label.replace("آ", "ا")})
 
-    CHOICE_FIELDS = ("level", "grade", "belt_level", "belt_grade", "dan", "kup", "gup", "belt", "belt_color")
-    for f in CHOICE_FIELDS:
-        if _field_exists(UserProfile, f):
-            try:
-                fld = UserProfile._meta.get_field(f)
-                if getattr(fld, "choices", None):
-                    keys = []
-                    for k, lbl in fld.choices:
-                        if _norm(lbl) == label_n or _norm(k) == label_n:
-                            keys.append(k)
-                    if keys:
-                        q |= Q(**{f + "__in": keys})
-            except Exception:
-                pass
+    for f, choices in sch.belt_filter_choice_fields:
+        keys = [k for k, lbl in choices if _norm(lbl) == label_n or _norm(k) == label_n]
+        if keys:
+            q |= Q(**{f + "__in": keys})
 
     return players_qs.filter(q) if q else players_qs
 
 
 # ---------- هِلپرهای عمومی ----------
-def _created_field(model):
-    for name in ("created_at", "date_joined", "created", "created_on", "joined_at"):
-        try:
-            model._meta.get_field(name)
-            return name
-        except Exception:
-            continue
-    return None
-
-def _field_exists(model, name: str) -> bool:
-    try:
-        model._meta.get_field(name)
-        return True
-    except Exception:
-        return False
-
 def _date_filter_kwargs(model, field_name, start, end):
     if not field_name:
         return {}
-    try:
-        f = model._meta.get_field(field_name)
-    except Exception:
-        f = None
-    pre = "date__" if isinstance(f, DateTimeField) else ""
+    pre = "date__" if get_schema().is_datetime(model, field_name) else ""
     if start and end:
         return {f"{field_name}__{pre}range": (start, end)}
     if start:
@@ -234,9 +105,11 @@ def _date_filter_kwargs(model, field_name, start, end):
     return {}
 
 def _role_counts(qs, model):
+    """شمارش نقش‌ها روی QuerySet پروفایل‌ها؛ فیلد نقش از نقشهٔ گزارش‌ها (schema) می‌آید."""
     out = {'player': 0, 'coach': 0, 'referee': 0, 'club': 0}
+    sch = get_schema()
 
-    if _field_exists(model, ROLE_FIELD_NAME):
+    if sch.role_field == ROLE_FIELD_NAME:
         rf = ROLE_FIELD_NAME
         for key, vals in ROLE_VALUES.items():
             q = Q()
@@ -245,26 +118,19 @@ def _role_counts(qs, model):
             out[key] = qs.filter(q).count()
         return out
 
-    if any(_field_exists(model, f) for f in ("is_player", "is_coach", "is_referee", "is_club")):
-        if _field_exists(model, "is_player"):   out['player']  = qs.filter(is_player=True).count()
-        if _field_exists(model, "is_coach"):    out['coach']   = qs.filter(is_coach=True).count()
-        if _field_exists(model, "is_referee"):  out['referee'] = qs.filter(is_referee=True).count()
-        if _field_exists(model, "is_club"):     out['club']    = qs.filter(is_club=True).count()
+    if sch.flag_fields:
+        for flag in sch.flag_fields:
+            out[flag[3:]] = qs.filter(**{flag: True}).count()
         return out
 
-    role_field = None
-    for cand in ("role", "user_role", "role_name", "roles"):
-        if _field_exists(model, cand):
-            role_field = cand
-            break
+    role_field = sch.role_field
     if not role_field:
         return out
 
-    f = model._meta.get_field(role_field)
-    if getattr(f, "choices", None):
+    if sch.role_choices:
         def _n(s): return str(s or "").strip().lower()
         keysets = {k: set() for k in out.keys()}
-        for key, label in f.choices:
+        for key, label in sch.role_choices:
             k = _n(key); lbl = _n(label)
             for cat, vals in ROLE_VALUES.items():
                 for v in vals:
@@ -286,16 +152,17 @@ def _role_counts(qs, model):
 
 # ---------- سرویس گزارش کاربران (کارت‌ها + جدول) ----------
 def users_summary(start, end):
-    from accounts.models import UserProfile
+    sch = get_schema()
+    UserProfile = sch.UserProfile
 
-    created_field = _created_field(UserProfile)
+    created_field = sch.created_field
 
     range_qs = UserProfile.objects.all()
     if created_field:
         range_qs = range_qs.filter(**_date_filter_kwargs(UserProfile, created_field, start, end))
     total_in_range = range_qs.count()
 
-    role_field = "role" if _field_exists(UserProfile, "role") else None
+    role_field = "role" if sch.role_field == "role" else None
     by_role = []
     if role_field:
         by_role = list(range_qs.values(role_field).annotate(c=Count("id")).order_by("-c"))
@@ -306,18 +173,15 @@ def users_summary(start, end):
 
     clubs_all = totals_all.get("club", 0)
     last7_clubs = 0
-    try:
-        from accounts.models import TkdClub
-        clubs_all = TkdClub.objects.count()
-        club_created_field = _created_field(TkdClub)
-        if club_created_field:
+    Club = sch.Club
+    if Club is not None:
+        clubs_all = Club.objects.count()
+        if sch.club_created_field:
             today = date.today()
             last7_start = today - timedelta(days=7)
-            last7_clubs = TkdClub.objects.filter(
-                **_date_filter_kwargs(TkdClub, club_created_field, last7_start, today)
+            last7_clubs = Club.objects.filter(
+                **_date_filter_kwargs(Club, sch.club_created_field, last7_start, today)
             ).count()
-    except Exception:
-        pass
 
     last7_total = 0
     last7_counts = {'player': 0, 'coach': 0, 'referee': 0, 'club': 0}
@@ -351,16 +215,163 @@ def users_summary(start, end):
     }
 
 
+# ---------- هِلپرهای بازه/جلالی برای گزارش‌های تجمیعی ----------
+def _aware_bounds(field_name, start, end):
+    """
+    فیلتر بازهٔ روز روی DateTimeField با مرزهای datetime (نه __date) تا ایندکس ستون استفاده شود.
+    end شامل کل همان روز است.
+    """
+    tz = timezone.get_current_timezone()
+    out = {}
+    if start:
+        out[f"{field_name}__gte"] = timezone.make_aware(_dt.datetime.combine(start, _dt.time.min), tz)
+    if end:
+        out[f"{field_name}__lt"] = timezone.make_aware(_dt.datetime.combine(end + timedelta(days=1), _dt.time.min), tz)
+    return out
+
+
+# ---------- سرویس گزارش مسابقات ----------
+COMPETITION_STATUS_LABELS = {
+    "upcoming": "در انتظار ثبت‌نام",
+    "registration": "در حال ثبت‌نام",
+    "closed": "پایان ثبت‌نام",
+    "finished": "برگزار شده",
+}
+
+
+def _competition_status_case(today, finished_field):
+    """وضعیت مسابقه از روی تاریخ‌ها، داخل خود کوئری (مدل‌ها ستون status ندارند)."""
+    return Case(
+        When(**{f"{finished_field}__lt": today}, then=Value("finished")),
+        When(registration_start__gt=today, then=Value("upcoming")),
+        When(registration_end__gte=today, then=Value("registration")),
+        default=Value("closed"),
+        output_field=CharField(),
+    )
+
+
+def competitions_summary(start, end, top=10):
+    """
+    خلاصهٔ مسابقات کیوروگی و پومسه‌ای که در بازه برگزار می‌شوند؛ همه‌چیز با GROUP BY در پایگاه‌داده:
+      total، by_status [{status, c}] و top_by_enroll [{competition, count}]
+    """
+    from competitions.models import (
+        KyorugiCompetition, Enrollment, PoomsaeCompetition, PoomsaeEnrollment,
+    )
+
+    today = timezone.localdate()
+    # (مدل مسابقه، فیلد عنوان، فیلد تاریخ برگزاری، فیلد پایان، مدل ثبت‌نام)
+    sources = (
+        (KyorugiCompetition, "title", "competition_date", "competition_date", Enrollment),
+        (PoomsaeCompetition, "name", "start_date", "end_date", PoomsaeEnrollment),
+    )
+
+    by_status = dict.fromkeys(COMPETITION_STATUS_LABELS, 0)
+    top_rows = []
+    for Comp, title_field, date_field, finished_field, Enr in sources:
+        comps = Comp.objects.filter(**_date_filter_kwargs(Comp, date_field, start, end))
+        for r in (comps.order_by()
+                  .annotate(_status=_competition_status_case(today, finished_field))
+                  .values("_status").annotate(c=Count("id"))):
+            by_status[r["_status"]] += r["c"]
+
+        enr = Enr.objects.filter(**{f"competition__{k}": v
+                                    for k, v in _date_filter_kwargs(Comp, date_field, start, end).items()})
+        top_rows += [
+            {"competition": r[f"competition__{title_field}"], "count": r["c"]}
+            for r in (enr.exclude(status="canceled").order_by()
+                      .values("competition_id", f"competition__{title_field}")
+                      .annotate(c=Count("id")).order_by("-c")[:top])
+        ]
+
+    top_rows.sort(key=lambda r: -r["count"])
+    return {
+        "start": start, "end": end,
+        "total": sum(by_status.values()),
+        "by_status": [
+            {"key": k, "status": COMPETITION_STATUS_LABELS[k], "c": c}
+            for k, c in by_status.items() if c
+        ],
+        "top_by_enroll": top_rows[:top],
+    }
+
+
+# ---------- سرویس گزارش مالی ----------
+# (کلید، مدل پرداخت)؛ همه فیلدهای is_paid / paid_amount / paid_at دارند
+FINANCE_SOURCES = (
+    ("enrollment", "Enrollment"),
+    ("poomsae", "PoomsaeEnrollment"),
+    ("seminar", "SeminarRegistration"),
+)
+
+
+def _paid_by_local_day(qs):
+    """همان ردیف‌های روزانه، با روز محلی paid_at در پایتون (وقتی TruncDate روز را NULL برگرداند)."""
+    days = {}
+    for paid_at, amount in qs.values_list("paid_at", "paid_amount").iterator():
+        r = days.setdefault(parse_date(paid_at), {"c": 0, "s": 0})
+        r["c"] += 1
+        r["s"] += amount or 0
+    return [{"day": day, **r} for day, r in days.items()]
+
+
+def finance_summary(start, end):
+    """
+    جمع و تعداد پرداخت‌های موفق ثبت‌نام کیوروگی، پومسه و سمینار در بازه.
+    هر منبع یک کوئری GROUP BY روز (TruncDate روی paid_at) است؛ جدول ماهانهٔ جلالی از
+    همان ردیف‌های روزانه ساخته می‌شود (ماه جلالی با ماه میلادی هم‌مرز نیست).
+    در MySQL بدون جدول‌های منطقهٔ زمانی CONVERT_TZ (و در نتیجه روز) NULL است؛ آن‌وقت روزها
+    با یک کوئری دیگر از خود paid_at در پایتون ساخته می‌شوند.
+    """
+    from competitions import models as cm
+
+    out = {"start": start, "end": end}
+    days = {}
+    for key, model_name in FINANCE_SOURCES:
+        M = getattr(cm, model_name)
+        paid = M.objects.filter(is_paid=True, **_aware_bounds("paid_at", start, end))
+        rows = list(paid.annotate(day=TruncDate("paid_at")).order_by()
+                    .values("day").annotate(c=Count("id"), s=Sum("paid_amount")))
+        if any(r["day"] is None for r in rows):
+            rows = _paid_by_local_day(paid)
+        cnt = total = 0
+        for r in rows:
+            c, amount = r["c"], int(r["s"] or 0)
+            cnt += c; total += amount
+            d = days.setdefault(r["day"], {"count": 0, "sum": 0})
+            d[f"{key}_count"] = d.get(f"{key}_count", 0) + c
+            d[f"{key}_sum"] = d.get(f"{key}_sum", 0) + amount
+            d["count"] += c; d["sum"] += amount
+        out[f"{key}_paid_count"] = cnt
+        out[f"{key}_paid_sum"] = total
+
+    by_day, months = [], {}
+    ordered = sorted(days)
+    for day, jalali in zip(ordered, jalali_strs(ordered)):
+        row = {"date": day, "jalali": jalali, **days[day]}
+        by_day.append(row)
+        m = months.setdefault(jalali[:7], {"jalali": jalali[:7], "count": 0, "sum": 0})
+        for k, v in days[day].items():
+            m[k] = m.get(k, 0) + v
+
+    out["total_paid_count"] = sum(out[f"{k}_paid_count"] for k, _ in FINANCE_SOURCES)
+    out["total_paid_sum"] = sum(out[f"{k}_paid_sum"] for k, _ in FINANCE_SOURCES)
+    out["by_day"] = by_day
+    out["by_month"] = list(months.values())
+    return out
+
+
 # ---------- لیست‌ها برای فرم «شاگردان اساتید» ----------
 def list_coaches_qs():
-    from accounts.models import UserProfile
+    sch = get_schema()
+    UserProfile = sch.UserProfile
     qs = UserProfile.objects.all()
-    if _field_exists(UserProfile, ROLE_FIELD_NAME):
+    if sch.role_field == ROLE_FIELD_NAME:
         q = Q()
         for v in ROLE_VALUES["coach"]:
             q |= Q(**{f"{ROLE_FIELD_NAME}__iexact": v})
         qs = qs.filter(q)
-    elif _field_exists(UserProfile, "is_coach"):
+    elif "is_coach" in sch.flag_fields:
         qs = qs.filter(is_coach=True)
     return qs.order_by("id")
 
@@ -368,140 +379,95 @@ def get_belt_qs():
     """
     همیشه یک QuerySet برگردان. اگر مدل پیدا نشد، QS خالی بده تا فرم‌ها نشکنند.
     """
-    try:
-        from accounts.models import Belt
-        return Belt.objects.all()
-    except Exception:
-        pass
-    try:
-        from competitions.models import Belt
+    Belt = get_schema().Belt
+    if Belt is not None:
         return Belt.objects.all()
-    except Exception:
-        pass
     from django.contrib.auth import get_user_model
     return get_user_model().objects.none()
 
 def get_club_qs():
-    try:
-        from accounts.models import TkdClub
-        return TkdClub.objects.all()
-    except Exception:
-        return None
+    Club = get_schema().Club
+    return Club.objects.all() if Club is not None else None
 
 
 # ---------- سرویس «شاگردان اساتید» (بدون جستجوی تاریخ تولد) ----------
-def coach_students(coach_id, belt_id=None, club_id=None, national_code=None):
+def coach_students_qs(coach_id, belt_id=None, club_id=None, national_code=None):
     """
+    QuerySet شاگردان یک مربی (با آمار) برای جدول و خروجی‌های CSV/XLSX.
     فقط از coach_id داخل خود UserProfile رابطه مربی ↔ شاگرد را تشخیص می‌دهد.
-    * هیچ فیلتر تاریخ تولدی اعمال نمی‌شود.
     """
-    from accounts.models import UserProfile
+    sch = get_schema()
+    UserProfile = sch.UserProfile
 
     if not coach_id:
-        return {"rows": [], "filters_applied": {
-            "coach_id": None, "belt_id": belt_id, "club_id": club_id,
-            "national_code": national_code
-        }}
+        return UserProfile.objects.none()
 
     players_qs = _students_qs_by_user_coach(coach_id)
 
-    if _field_exists(UserProfile, ROLE_FIELD_NAME):
+    if sch.role_field == ROLE_FIELD_NAME:
         qrole = Q()
         for v in ROLE_VALUES["player"]:
             qrole |= Q(**{f"{ROLE_FIELD_NAME}__iexact": v})
         players_qs = players_qs.filter(qrole)
-    elif _field_exists(UserProfile, "is_player"):
+    elif "is_player" in sch.flag_fields:
         players_qs = players_qs.filter(is_player=True)
 
     players_qs = _apply_belt_filter(players_qs, UserProfile, belt_id)
 
-    if club_id and _field_exists(UserProfile, "club"):
+    if club_id and sch.has_club_fk:
         players_qs = players_qs.filter(club_id=club_id)
 
     if national_code:
-        for cand in ("national_code", "nid", "national_id"):
-            if _field_exists(UserProfile, cand):
-                players_qs = players_qs.filter(**{f"{cand}__iexact": national_code})
-                break
-
-    # بدون فیلتر تاریخ؛ صرفاً لیست را تولید کن
-    players_iter = list(players_qs)
-
-    # شمارش مسابقات (اگر Enrollment دارید)
-    EnrollmentModel = None
-    try:
-        from competitions.models import Enrollment as _E
-        EnrollmentModel = _E
-    except Exception:
-        pass
-
-    def _count_competitions(pid):
-        if not EnrollmentModel:
-            return 0
-        pf = next((c for c in ("player","athlete","user","profile") if _field_exists(EnrollmentModel, c)), None)
-        if not pf:
-            return 0
-        return EnrollmentModel.objects.filter(**{f"{pf}_id": pid}).count()
-
-    # ساخت ردیف‌ها
-    rows = []
-    for p in players_iter:
-        fname = getattr(p, "first_name", "") or ""
-        lname = getattr(p, "last_name", "") or ""
-        full_name = (fname + " " + lname).strip() or getattr(p, "name", "") or str(p)
-
-        belt_val = _belt_text(p)
-
-        nid = ""
-        for cand in ("national_code", "nid", "national_id"):
-            if hasattr(p, cand) and getattr(p, cand):
-                nid = getattr(p, cand); break
-
-        club_name = ""
-        if hasattr(p, "club") and getattr(p, "club", None):
-            c = getattr(p, "club")
-            club_name = getattr(c, "name", str(c)) if c else ""
-
-        # نمایش تاریخ تولد فقط برای جدول/جستجوی متنی؛ نه فیلتر
-        birth_str = ""
-        birth_jalali = ""
-        for dob_field in (
-            "birth_date", "date_of_birth", "dob", "birthdate", "birthday",
-            "dateBirth", "datebirth", "birth"
-        ):
-            if hasattr(p, dob_field):
-                _dv = getattr(p, dob_field)
-                if hasattr(_dv, "strftime"):
-                    birth_str = _dv.strftime("%Y-%m-%d")
-                    try:
-                        if jdatetime and isinstance(_dv, (_dt.date, _dt.datetime)):
-                            if isinstance(_dv, _dt.datetime): _dv = _dv.date()
-                            j = jdatetime.date.fromgregorian(date=_dv)
-                            birth_jalali = f"{j.year:04d}-{j.month:02d}-{j.day:02d}"
-                    except Exception:
-                        pass
-                elif _dv:
-                    birth_str = str(_dv)
-                break
-
-        comp_cnt = _count_competitions(p.id)
-        g, s, b = _medals_for_player(p.id)
-        r_comp, r_total = _rankings_for_player(p.id)
-
-        rows.append({
-            "full_name": full_name,
-            "belt": belt_val,
-            "national_code": nid,
-            "club_name": club_name,
-            "birth_date": birth_str,
-            "birth_date_jalali": birth_jalali,
-            "competitions": comp_cnt,
-            "medal_gold": g, "medal_silver": s, "medal_bronze": b,
-            "rank_comp": r_comp, "rank_total": r_total,
-        })
+        if sch.national_code_field:
+            players_qs = players_qs.filter(**{f"{sch.national_code_field}__iexact": national_code})
+
+    # بدون فیلتر تاریخ؛ آمار هر ردیف داخل همین کوئری
+    return annotate_player_stats(players_qs.select_related("club")).order_by("id")
+
+
+def coach_student_row(p):
+    sch = get_schema()
+    fname = getattr(p, "first_name", "") or ""
+    lname = getattr(p, "last_name", "") or ""
+    full_name = (fname + " " + lname).strip() or getattr(p, "name", "") or str(p)
+
+    club_name = ""
+    if getattr(p, "club", None):
+        c = p.club
+        club_name = getattr(c, "name", str(c))
+
+    # نمایش تاریخ تولد فقط برای جدول/جستجوی متنی؛ نه فیلتر
+    birth_str, birth_jalali = _birth_display(p, sch.dob_field)
+
+    comp_cnt, g, s, b, r_comp, r_total = _player_stats(p)
 
     return {
-        "rows": rows,
+        "full_name": full_name,
+        "belt": _belt_text(p),
+        "national_code": _attr(p, sch.national_code_field),
+        "club_name": club_name,
+        "birth_date": birth_str,
+        "birth_date_jalali": birth_jalali,
+        "competitions": comp_cnt,
+        "medal_gold": g, "medal_silver": s, "medal_bronze": b,
+        "rank_comp": r_comp, "rank_total": r_total,
+    }
+
+
+def coach_students(coach_id, belt_id=None, club_id=None, national_code=None):
+    """
+    فقط از coach_id داخل خود UserProfile رابطه مربی ↔ شاگرد را تشخیص می‌دهد.
+    * هیچ فیلتر تاریخ تولدی اعمال نمی‌شود.
+    """
+    if not coach_id:
+        return {"rows": [], "filters_applied": {
+            "coach_id": None, "belt_id": belt_id, "club_id": club_id,
+            "national_code": national_code
+        }}
+
+    qs = coach_students_qs(coach_id, belt_id, club_id, national_code)
+    return {
+        "rows": [coach_student_row(p) for p in qs],
         "filters_applied": {
             "coach_id": coach_id, "belt_id": getattr(belt_id, "id", belt_id),
             "club_id": club_id, "national_code": national_code
@@ -513,171 +479,87 @@ def coach_students(coach_id, belt_id=None, club_id=None, national_code=None):
 def _belt_text(profile):
     if not profile:
         return ""
-    for fk in ("belt", "rank", "belt_degree"):
-        if hasattr(profile, fk) and getattr(profile, fk, None):
-            obj = getattr(profile, fk)
+    sch = get_schema()
+    for fk in sch.belt_display_fks:
+        obj = getattr(profile, fk, None)
+        if obj:
             for name in ("name", "title", "display"):
-                if hasattr(obj, name) and getattr(obj, name):
+                if getattr(obj, name, None):
                     return str(getattr(obj, name))
             return str(obj)
-    for fn in ("level", "grade", "belt_level", "belt_grade", "dan", "kup", "gup"):
-        if hasattr(profile, fn):
-            try:
-                f = profile._meta.get_field(fn)
-                if getattr(f, "choices", None):
-                    val = getattr(profile, fn)
-                    for k, lbl in f.choices:
-                        if k == val:
-                            return str(lbl)
-            except Exception:
-                pass
-    for fn in ("belt_name", "belt_title", "belt", "grade", "dan", "gup", "kup"):
-        if hasattr(profile, fn) and getattr(profile, fn):
+    for fn, labels in sch.belt_display_choices:
+        val = getattr(profile, fn)
+        if val in labels:
+            return str(labels[val])
+    for fn in sch.belt_display_text_fields:
+        if getattr(profile, fn, None):
             return str(getattr(profile, fn))
     return ""
 
 
-# ---------- مدال‌ها ----------
-def _medals_for_player(pid):
-    gold = silver = bronze = 0
+def _attr(obj, field_name):
+    """مقدار فیلد حل‌شده در schema (یا "" اگر فیلد/مقدار نبود)."""
+    return (getattr(obj, field_name, None) or "") if field_name else ""
 
-    def _count_by_value(qs, field, values):
-        q = Q()
-        for v in values:
-            if str(v).isdigit():
-                q |= Q(**{field: int(v)})
-            q |= Q(**{field + "__iexact": str(v)})
-        return qs.filter(q).count()
-
-    result_models = []
-    for dotted in (
-        "competitions.KyorugiResult",
-        "competitions.CompetitionResult",
-        "competitions.Result",
-    ):
-        try:
-            mod_name, cls_name = dotted.split(".")
-            mod = __import__(f"{mod_name}.models", fromlist=[cls_name])
-            R = getattr(mod, cls_name)
-            result_models.append(R)
-        except Exception:
-            pass
-
-    for R in result_models:
-        link = None
-        for cand in ("player", "athlete", "user", "profile"):
-            try:
-                R._meta.get_field(cand); link = cand; break
-            except Exception:
-                continue
-        if not link:
-            try:
-                R._meta.get_field("enrollment"); link = "enrollment__player"
-            except Exception:
-                pass
-        if not link:
-            continue
 
-        base = R.objects.filter(**({f"{link}_id": pid} if "__" not in link else {link + "_id": pid}))
+def _birth_display(p, dob_field, jalali=True):
+    """(تاریخ تولد میلادی/خام، تاریخ جلالی) فقط برای نمایش."""
+    if not dob_field:
+        return "", ""
+    _dv = getattr(p, dob_field, None)
+    birth_str = birth_jalali = ""
+    if hasattr(_dv, "strftime"):
+        birth_str = _dv.strftime("%Y-%m-%d")
+        if jalali and isinstance(_dv, _dt.date):
+            birth_jalali = jalali_str(_dv, sep="-") or ""
+    elif _dv:
+        birth_str = str(_dv)
+    return birth_str, birth_jalali
 
-        medal_field = None
-        for mf in ("medal", "medal_type", "medal_color", "place", "rank", "position", "standing"):
-            try:
-                R._meta.get_field(mf); medal_field = mf; break
-            except Exception:
-                continue
-        if not medal_field:
-            continue
-
-        gold   += _count_by_value(base, medal_field, MEDAL_STRINGS["gold"])
-        silver += _count_by_value(base, medal_field, MEDAL_STRINGS["silver"])
-        bronze += _count_by_value(base, medal_field, MEDAL_STRINGS["bronze"])
-
-    try:
-        from competitions.models import Enrollment as E
-        link_field = next((c for c in ("player","athlete","user","profile") if _field_exists(E, c)), None)
-        if link_field:
-            base = E.objects.filter(**{f"{link_field}_id": pid})
-            medal_field = None
-            for mf in ("medal","medal_type","medal_color","place","rank","position","standing","result"):
-                try:
-                    E._meta.get_field(mf); medal_field = mf; break
-                except Exception:
-                    continue
-            if medal_field:
-                gold   += _count_by_value(base, medal_field, MEDAL_STRINGS["gold"])
-                silver += _count_by_value(base, medal_field, MEDAL_STRINGS["silver"])
-                bronze += _count_by_value(base, medal_field, MEDAL_STRINGS["bronze"])
-    except Exception:
-        pass
-
-    return gold, silver, bronze
-
-
-# ---------- رنکینگ ----------
-def _rankings_for_player(pid):
-    comp_pts = total_pts = 0
-
-    for dotted in ("competitions.RankingTransaction", "competitions.Ranking"):
-        try:
-            mod_name, cls_name = dotted.split(".")
-            mod = __import__(f"{mod_name}.models", fromlist=[cls_name])
-            M = getattr(mod, cls_name)
-        except Exception:
-            continue
 
-        link = None
-        for cand in ("user", "player", "athlete", "profile"):
-            try:
-                M._meta.get_field(cand); link = cand; break
-            except Exception:
-                continue
-        if not link:
-            continue
+# ---------- آمار هر پروفایل (مسابقات/مدال/رنکینگ) از جدول PlayerStats ----------
+def annotate_player_stats(qs):
+    """
+    آمار هر پروفایل را از PlayerStats (یک LEFT JOIN، بدون محاسبهٔ درجا) روی QuerySet می‌گذارد:
+      _competitions, _gold, _silver, _bronze, _ledger_points
+    """
+    zero = Value(0, output_field=IntegerField())
+    return qs.annotate(
+        _competitions=Coalesce(F("stats__competitions"), zero),
+        _gold=Coalesce(F("stats__gold"), zero),
+        _silver=Coalesce(F("stats__silver"), zero),
+        _bronze=Coalesce(F("stats__bronze"), zero),
+        _ledger_points=Coalesce(F("stats__ranking_points"), Value(0.0, output_field=FloatField())),
+    )
 
-        qs = M.objects.filter(**{f"{link}_id": pid})
 
-        points_field = None
-        for pf in ("points", "score", "value", "amount", "total_points"):
-            try:
-                M._meta.get_field(pf); points_field = pf; break
-            except Exception:
-                continue
-        if points_field:
-            total_pts += qs.aggregate(s=Sum(points_field))["s"] or 0
-
-        comp_filter = Q()
-        for cf in ("source", "scope", "kind", "reason", "category", "type", "context"):
-            try:
-                M._meta.get_field(cf)
-                comp_filter |= Q(**{f"{cf}__icontains": "comp"})
-                comp_filter |= Q(**{f"{cf}__icontains": "competition"})
-                comp_filter |= Q(**{f"{cf}__icontains": "مسابق"})
-            except Exception:
-                continue
-        if comp_filter and points_field:
-            comp_pts += qs.filter(comp_filter).aggregate(s=Sum(points_field))["s"] or 0
+def _player_stats(p):
+    """(مسابقات، طلا، نقره، برنز، امتیاز مسابقات، امتیاز کل) از annotate_player_stats."""
+    g, s, b = int(p._gold or 0), int(p._silver or 0), int(p._bronze or 0)
 
+    # ۱) دفتر امتیاز (RankingTransaction)  ۲) ستون‌های پروفایل  ۳) از روی مدال‌ها
+    comp_pts = total_pts = p._ledger_points or 0
+    if not comp_pts:
+        comp_pts = getattr(p, "ranking_competition", 0) or 0
+        total_pts = getattr(p, "ranking_total", 0) or 0
     if comp_pts == 0 and total_pts == 0:
-        try:
-            from accounts.models import UserProfile
-            up = UserProfile.objects.filter(id=pid).first()
-            if up:
-                for pf in ("ranking","ranking_points","rank_points","total_points","score"):
-                    if hasattr(up, pf):
-                        total_pts = getattr(up, pf) or 0
-                for pf in ("competition_points","comp_points"):
-                    if hasattr(up, pf):
-                        comp_pts = getattr(up, pf) or 0
-        except Exception:
-            pass
-
-    if comp_pts == 0 and total_pts == 0:
-        g, s, b = _medals_for_player(pid)
         comp_pts = g*4 + s*3 + b*2
         total_pts = comp_pts
 
-    return comp_pts, total_pts
+    return int(p._competitions or 0), g, s, b, comp_pts, total_pts
+
+
+def _coach_link_q(UserProfile, coach_ref):
+    """Q اتصال شاگرد به مربی (FK یا M2M)؛ coach_ref می‌تواند id یا OuterRef باشد."""
+    sch = get_schema()
+    q = Q()
+    for name in sch.coach_link_fields:
+        q |= Q(**{f"{name}_id": coach_ref})
+
+    # M2M ها هم داخل همان Q (به‌جای union) تا بشود روی نتیجه annotate کرد
+    for name in sch.coach_link_m2m:
+        q |= Q(**{f"{name}__id": coach_ref})
+    return q
 
 
 def _students_qs_by_user_coach(coach_id):
@@ -685,54 +567,32 @@ def _students_qs_by_user_coach(coach_id):
     برمی‌گرداند QuerySet از UserProfile هایی که 'مستقیماً' در خود پروفایل‌شان
     به این coach_id وصل شده‌اند (FK یا M2M).
     """
-    from accounts.models import UserProfile
-
-    q = Q()
-    for name in ("coach", "coach_user", "teacher", "mentor", "master",
-                 "main_coach", "head_coach"):
-        if _field_exists(UserProfile, name):
-            q |= Q(**{f"{name}_id": coach_id})
-
-    for f in UserProfile._meta.fields:
-        try:
-            if (getattr(getattr(f, "remote_field", None), "model", None) == UserProfile
-                and "coach" in f.name.lower()):
-                q |= Q(**{f"{f.name}_id": coach_id})
-        except Exception:
-            pass
+    sch = get_schema()
+    UserProfile = sch.UserProfile
 
+    q = _coach_link_q(UserProfile, coach_id)
     qs = UserProfile.objects.filter(q) if q else UserProfile.objects.none()
-
-    for m2m in UserProfile._meta.many_to_many:
-        try:
-            if "coach" in m2m.name.lower() and m2m.remote_field.model == UserProfile:
-                qs = qs.union(UserProfile.objects.filter(**{f"{m2m.name}__id": coach_id}))
-        except Exception:
-            pass
-
     return qs.distinct()
 
 #-*-*-*-**-*-*-*-*-*-**-*--*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*-*
 
-def club_students(club_id, belt_id=None, coach_id=None, national_code=None):
+def club_students_qs(club_id, belt_id=None, coach_id=None, national_code=None):
     """
-    لیست شاگردان یک باشگاه:
+    QuerySet شاگردان یک باشگاه (با آمار):
       - club_id اجباری برای نمایش (مثل coach_id در coach_students)
       - فیلترها: کمربند، مربی، کدملی
       - بدون فیلتر تاریخ تولد؛ فقط نمایش ستون birth_date/birth_date_jalali
       - در خروجی به‌جای club_name، coach_name می‌دهیم
     """
-    from accounts.models import UserProfile
+    sch = get_schema()
+    UserProfile = sch.UserProfile
 
     if not club_id:
-        return {"rows": [], "filters_applied": {
-            "club_id": None, "belt_id": belt_id, "coach_id": coach_id,
-            "national_code": national_code
-        }}
+        return UserProfile.objects.none()
 
     # پایه: همه اعضای باشگاه
     base_qs = UserProfile.objects.all()
-    if _field_exists(UserProfile, "club"):
+    if sch.has_club_fk:
         base_qs = base_qs.filter(club_id=club_id)
     else:
         # اگر فیلد club مستقیم نبود، از M2M احتمالی (coaching_clubs/members) استفاده کن
@@ -743,12 +603,12 @@ def club_students(club_id, belt_id=None, coach_id=None, national_code=None):
             base_qs = UserProfile.objects.none()
 
     # فقط بازیکن‌ها
-    if _field_exists(UserProfile, ROLE_FIELD_NAME):
+    if sch.role_field == ROLE_FIELD_NAME:
         role_q = Q()
         for v in ROLE_VALUES["player"]:
             role_q |= Q(**{f"{ROLE_FIELD_NAME}__iexact": v})
         base_qs = base_qs.filter(role_q)
-    elif _field_exists(UserProfile, "is_player"):
+    elif "is_player" in sch.flag_fields:
         base_qs = base_qs.filter(is_player=True)
 
     # فیلتر کمربند (رشته‌ای / choices / FK)
@@ -758,100 +618,72 @@ def club_students(club_id, belt_id=None, coach_id=None, national_code=None):
     if coach_id:
         # FKهای رایج به مربی در UserProfile: coach / coach_user / ...
         coach_q = Q()
-        for name in ("coach", "coach_user", "teacher", "mentor", "master",
-                     "main_coach", "head_coach"):
-            if _field_exists(UserProfile, name):
-                coach_q |= Q(**{f"{name}_id": coach_id})
+        for name in sch.coach_fields:
+            coach_q |= Q(**{f"{name}_id": coach_id})
         if coach_q:
             base_qs = base_qs.filter(coach_q)
 
     # فیلتر کدملی
     if national_code:
-        for cand in ("national_code", "nid", "national_id"):
-            if _field_exists(UserProfile, cand):
-                base_qs = base_qs.filter(**{f"{cand}__iexact": national_code})
-                break
-
-    players = list(base_qs)
-
-    # شمارش مسابقات (اگر Enrollment دارید)
-    EnrollmentModel = None
-    try:
-        from competitions.models import Enrollment as _E
-        EnrollmentModel = _E
-    except Exception:
-        pass
-
-    def _count_competitions(pid):
-        if not EnrollmentModel:
-            return 0
-        pf = next((c for c in ("player","athlete","user","profile") if _field_exists(EnrollmentModel, c)), None)
-        if not pf:
-            return 0
-        return EnrollmentModel.objects.filter(**{f"{pf}_id": pid}).count()
-
-    rows = []
-    for p in players:
-        fname = getattr(p, "first_name", "") or ""
-        lname = getattr(p, "last_name", "") or ""
-        full_name = (fname + " " + lname).strip() or getattr(p, "name", "") or str(p)
-
-        belt_val = _belt_text(p)
-
-        nid = ""
-        for cand in ("national_code", "nid", "national_id"):
-            if hasattr(p, cand) and getattr(p, cand):
-                nid = getattr(p, cand); break
-
-        # استخراج نام مربی
-        coach_name = ""
-        for cfield in ("coach", "coach_user", "teacher", "mentor", "master",
-                       "main_coach", "head_coach"):
-            if hasattr(p, cfield) and getattr(p, cfield, None):
-                cobj = getattr(p, cfield)
-                cf = getattr(cobj, "first_name", "") or ""
-                cl = getattr(cobj, "last_name", "") or ""
-                coach_name = (cf + " " + cl).strip() or getattr(cobj, "coach_name", "") or str(cobj)
-                if coach_name:
-                    break
-
-        # تاریخ تولد فقط برای نمایش
-        birth_str = ""
-        birth_jalali = ""
-        for dob_field in ("birth_date","date_of_birth","dob","birthdate","birthday","dateBirth","datebirth","birth"):
-            if hasattr(p, dob_field):
-                _dv = getattr(p, dob_field)
-                if hasattr(_dv, "strftime"):
-                    birth_str = _dv.strftime("%Y-%m-%d")
-                    try:
-                        if jdatetime and isinstance(_dv, (_dt.date, _dt.datetime)):
-                            if isinstance(_dv, _dt.datetime): _dv = _dv.date()
-                            j = jdatetime.date.fromgregorian(date=_dv)
-                            birth_jalali = f"{j.year:04d}-{j.month:02d}-{j.day:02d}"
-                    except Exception:
-                        pass
-                elif _dv:
-                    birth_str = str(_dv)
-                break
-
-        comp_cnt = _count_competitions(p.id)
-        g, s, b = _medals_for_player(p.id)
-        r_comp, r_total = _rankings_for_player(p.id)
-
-        rows.append({
-            "full_name": full_name,
-            "belt": belt_val,
-            "national_code": nid,
-            "coach_name": coach_name,     # 👈 بجای club_name
-            "birth_date": birth_str,
-            "birth_date_jalali": birth_jalali,
-            "competitions": comp_cnt,
-            "medal_gold": g, "medal_silver": s, "medal_bronze": b,
-            "rank_comp": r_comp, "rank_total": r_total,
-        })
+        if sch.national_code_field:
+            base_qs = base_qs.filter(**{f"{sch.national_code_field}__iexact": national_code})
+
+    return annotate_player_stats(base_qs.select_related("coach")).order_by("id")
+
+
+def _coach_name(p, sch):
+    for cfield in sch.coach_fields:
+        cobj = getattr(p, cfield, None)
+        if cobj:
+            cf = getattr(cobj, "first_name", "") or ""
+            cl = getattr(cobj, "last_name", "") or ""
+            name = (cf + " " + cl).strip() or getattr(cobj, "coach_name", "") or str(cobj)
+            if name:
+                return name
+    return ""
+
+
+def club_student_row(p):
+    sch = get_schema()
+    fname = getattr(p, "first_name", "") or ""
+    lname = getattr(p, "last_name", "") or ""
+    full_name = (fname + " " + lname).strip() or getattr(p, "name", "") or str(p)
+
+    # تاریخ تولد فقط برای نمایش
+    birth_str, birth_jalali = _birth_display(p, sch.dob_field)
+
+    comp_cnt, g, s, b, r_comp, r_total = _player_stats(p)
+
+    return {
+        "full_name": full_name,
+        "belt": _belt_text(p),
+        "national_code": _attr(p, sch.national_code_field),
+        "coach_name": _coach_name(p, sch),     # 👈 بجای club_name
+        "birth_date": birth_str,
+        "birth_date_jalali": birth_jalali,
+        "competitions": comp_cnt,
+        "medal_gold": g, "medal_silver": s, "medal_bronze": b,
+        "rank_comp": r_comp, "rank_total": r_total,
+    }
+
+
+def club_students(club_id, belt_id=None, coach_id=None, national_code=None):
+    """
+    لیست شاگردان یک باشگاه:
+      - club_id اجباری برای نمایش (مثل coach_id در coach_students)
+      - فیلترها: کمربند، مربی، کدملی
+      - بدون فیلتر تاریخ تولد؛ فقط نمایش ستون birth_date/birth_date_jalali
+      - در خروجی به‌جای club_name، coach_name می‌دهیم
+    """
+    if not club_id:
+        return {"rows": [], "filters_applied": {
+            "club_id": None, "belt_id": belt_id, "coach_id": coach_id,
+            "national_code": national_code
+        }}
 
+    qs = club_students_qs(club_id, belt_id, coach_id, national_code)
     return {
-        "rows": rows,
+        "rows": [club_student_row(p) for p in qs],
         "filters_applied": {
             "club_id": club_id,
             "belt_id": getattr(belt_id, "id", belt_id),
@@ -866,65 +698,31 @@ def club_students(club_id, belt_id=None, coach_id=None, national_code=None):
 # tkdjango/reports/services.py
 
 def get_board_qs():
-    try:
-        from accounts.models import TkdBoard
-        return TkdBoard.objects.all()
-    except Exception:
-        pass
-    try:
-        from accounts.models import Board
-        return Board.objects.all()
-    except Exception:
-        pass
-    return None
+    Board = get_schema().Board
+    return Board.objects.all() if Board is not None else None
 
 
 def _clubs_qs_for_board(board_id):
     """
     همه‌ی باشگاه‌های زیرمجموعه‌ی یک هیئت را برمی‌گرداند، بدون فرض نام دقیق فیلد.
     """
-    try:
-        from accounts.models import TkdClub as _Club
-    except Exception:
-        try:
-            from accounts.models import Club as _Club
-        except Exception:
-            return None
-
-    # فهرست نام‌های محتمل فیلد ارجاع به هیئت (FK یا M2M)
-    cand_fk = ["board", "tkd_board", "federation_board", "province_board", "hyat", "heyat"]
-    cand_m2m = ["boards", "tkd_boards", "related_boards"]
-
-    q = None
-    # FK ها
-    for name in cand_fk:
-        if _field_exists(_Club, name):
-            return _Club.objects.filter(**{f"{name}_id": board_id})
-    # M2M ها
-    for name in cand_m2m:
-        try:
-            fld = _Club._meta.get_field(name)
-            if getattr(fld, "many_to_many", False):
-                return _Club.objects.filter(**{f"{name}__id": board_id})
-        except Exception:
-            continue
-
-    # هیچ فیلدی پیدا نشد
-    return None
+    sch = get_schema()
+    if sch.Club is None or not sch.club_board_field:
+        return None
+    lookup = "__id" if sch.club_board_field_is_m2m else "_id"
+    return sch.Club.objects.filter(**{f"{sch.club_board_field}{lookup}": board_id})
 
-def board_students(board_id=None, belt_id=None, coach_id=None, club_id=None, national_code=None):
+def board_students_qs(board_id=None, belt_id=None, coach_id=None, club_id=None, national_code=None):
     """
-    لیست شاگردان زیرمجموعه‌ی یک هیئت:
+    QuerySet شاگردان زیرمجموعه‌ی یک هیئت (با آمار):
       - اگر club_id داده شود، از همان باشگاه فیلتر می‌کنیم؛
         وگرنه از هیئت → باشگاه‌ها استخراج می‌کنیم.
     """
-    from accounts.models import UserProfile
+    sch = get_schema()
+    UserProfile = sch.UserProfile
 
     if not (board_id or club_id):
-        return {"rows": [], "filters_applied": {
-            "board_id": None, "club_id": club_id, "belt_id": belt_id,
-            "coach_id": coach_id, "national_code": national_code
-        }}
+        return UserProfile.objects.none()
 
     # 1) مبنا: اعضای باشگاه(ها)
     base_qs = UserProfile.objects.all()
@@ -939,7 +737,7 @@ def board_students(board_id=None, belt_id=None, coach_id=None, club_id=None, nat
             club_ids = list(cqs.values_list("id", flat=True))
 
     if club_ids:
-        if _field_exists(UserProfile, "club"):
+        if sch.has_club_fk:
             base_qs = base_qs.filter(club_id__in=club_ids)
         else:
             # fallback اگر club مستقیم تو پروفایل نیست
@@ -953,12 +751,12 @@ def board_students(board_id=None, belt_id=None, coach_id=None, club_id=None, nat
         base_qs = UserProfile.objects.none()
 
     # 2) فقط بازیکن‌ها
-    if _field_exists(UserProfile, ROLE_FIELD_NAME):
+    if sch.role_field == ROLE_FIELD_NAME:
         role_q = Q()
         for v in ROLE_VALUES["player"]:
             role_q |= Q(**{f"{ROLE_FIELD_NAME}__iexact": v})
         base_qs = base_qs.filter(role_q)
-    elif _field_exists(UserProfile, "is_player"):
+    elif "is_player" in sch.flag_fields:
         base_qs = base_qs.filter(is_player=True)
 
     # 3) فیلتر کمربند
@@ -967,84 +765,56 @@ def board_students(board_id=None, belt_id=None, coach_id=None, club_id=None, nat
     # 4) فیلتر مربی (اختیاری)
     if coach_id:
         cq = Q()
-        for name in ("coach", "coach_user", "teacher", "mentor", "master", "main_coach", "head_coach"):
-            if _field_exists(UserProfile, name):
-                cq |= Q(**{f"{name}_id": coach_id})
+        for name in sch.coach_fields:
+            cq |= Q(**{f"{name}_id": coach_id})
         if cq:
             base_qs = base_qs.filter(cq)
 
     # 5) فیلتر کدملی
     if national_code:
-        for cand in ("national_code", "nid", "national_id"):
-            if _field_exists(UserProfile, cand):
-                base_qs = base_qs.filter(**{f"{cand}__iexact": national_code})
-                break
-
-    players = list(base_qs)
-
-    # شمارش مسابقات و … (مثل بقیه سرویس‌ها)
-    EnrollmentModel = None
-    try:
-        from competitions.models import Enrollment as _E
-        EnrollmentModel = _E
-    except Exception:
-        pass
-
-    def _count_competitions(pid):
-        if not EnrollmentModel:
-            return 0
-        pf = next((c for c in ("player","athlete","user","profile") if _field_exists(EnrollmentModel, c)), None)
-        if not pf:
-            return 0
-        return EnrollmentModel.objects.filter(**{f"{pf}_id": pid}).count()
-
-    rows = []
-    for p in players:
-        fname = getattr(p, "first_name", "") or ""
-        lname = getattr(p, "last_name", "") or ""
-        full_name = (fname + " " + lname).strip() or getattr(p, "name", "") or str(p)
-        belt_val = _belt_text(p)
-        nid = next((getattr(p, cand) for cand in ("national_code","nid","national_id") if getattr(p, cand, None)), "")
-
-        # coach_name برای جدول
-        coach_name = ""
-        for cfield in ("coach","coach_user","teacher","mentor","master","main_coach","head_coach"):
-            if hasattr(p, cfield) and getattr(p, cfield, None):
-                cobj = getattr(p, cfield)
-                cf = getattr(cobj, "first_name", "") or ""
-                cl = getattr(cobj, "last_name", "") or ""
-                coach_name = (cf + " " + cl).strip() or getattr(cobj, "coach_name", "") or str(cobj)
-                if coach_name:
-                    break
-
-        birth_str = ""; birth_jalali = ""
-        for dob_field in ("birth_date","date_of_birth","dob","birthdate","birthday","dateBirth","datebirth","birth"):
-            if hasattr(p, dob_field):
-                _dv = getattr(p, dob_field)
-                if hasattr(_dv, "strftime"):
-                    birth_str = _dv.strftime("%Y-%m-%d")
-                elif _dv:
-                    birth_str = str(_dv)
-                break
-
-        comp_cnt = _count_competitions(p.id)
-        g, s, b = _medals_for_player(p.id)
-        r_comp, r_total = _rankings_for_player(p.id)
-
-        rows.append({
-            "full_name": full_name,
-            "belt": belt_val,
-            "national_code": nid,
-            "coach_name": coach_name,
-            "birth_date": birth_str,
-            "birth_date_jalali": birth_jalali,
-            "competitions": comp_cnt,
-            "medal_gold": g, "medal_silver": s, "medal_bronze": b,
-            "rank_comp": r_comp, "rank_total": r_total,
-        })
+        if sch.national_code_field:
+            base_qs = base_qs.filter(**{f"{sch.national_code_field}__iexact": national_code})
+
+    return annotate_player_stats(base_qs.select_related("coach")).order_by("id")
+
+
+def board_student_row(p):
+    sch = get_schema()
+    fname = getattr(p, "first_name", "") or ""
+    lname = getattr(p, "last_name", "") or ""
+    full_name = (fname + " " + lname).strip() or getattr(p, "name", "") or str(p)
+    birth_str, _ = _birth_display(p, sch.dob_field, jalali=False)
+
+    comp_cnt, g, s, b, r_comp, r_total = _player_stats(p)
 
     return {
-        "rows": rows,
+        "full_name": full_name,
+        "belt": _belt_text(p),
+        "national_code": _attr(p, sch.national_code_field),
+        "coach_name": _coach_name(p, sch),
+        "birth_date": birth_str,
+        "birth_date_jalali": "",
+        "competitions": comp_cnt,
+        "medal_gold": g, "medal_silver": s, "medal_bronze": b,
+        "rank_comp": r_comp, "rank_total": r_total,
+    }
+
+
+def board_students(board_id=None, belt_id=None, coach_id=None, club_id=None, national_code=None):
+    """
+    لیست شاگردان زیرمجموعه‌ی یک هیئت:
+      - اگر club_id داده شود، از همان باشگاه فیلتر می‌کنیم؛
+        وگرنه از هیئت → باشگاه‌ها استخراج می‌کنیم.
+    """
+    if not (board_id or club_id):
+        return {"rows": [], "filters_applied": {
+            "board_id": None, "club_id": club_id, "belt_id": belt_id,
+            "coach_id": coach_id, "national_code": national_code
+        }}
+
+    qs = board_students_qs(board_id, belt_id, coach_id, club_id, national_code)
+    return {
+        "rows": [board_student_row(p) for p in qs],
         "filters_applied": {
             "board_id": board_id,
             "club_id": club_id,
@@ -1064,40 +834,15 @@ def _role_label(val: str) -> str:
     return s or "—"
 
 
-def _created_or_approved_field(model):
-    """به ترتیب approved_at، created_at، date_joined، created، joined_at را برمی‌گرداند اگر وجود داشته باشد."""
-    for name in ("approved_at", "created_at", "date_joined", "created", "joined_at"):
-        try:
-            model._meta.get_field(name)
-            return name
-        except Exception:
-            continue
-    return None
-
-
-def _board_field_name(model):
-    """نام فیلد FK/M2M احتمالی به هیئت روی UserProfile یا Club را حدس می‌زند."""
-    for nm in ("board", "tkd_board", "federation_board", "province_board", "hyat", "heyat"):
-        if _field_exists(model, nm):
-            return nm
-    for nm in ("boards", "tkd_boards", "related_boards"):
-        try:
-            f = model._meta.get_field(nm)
-            if getattr(f, "many_to_many", False):
-                return nm
-        except Exception:
-            continue
-    return None
-
 # --- جدید: نقش ترکیبی ---
 def _has_role_val(val: str, bucket: str) -> bool:
     s = (str(val or "")).strip().lower()
     return any(s == str(v).strip().lower() for v in ROLE_VALUES[bucket])
 
-def _role_combo(up, UserProfile):
+def _role_combo(up, sch):
     # بر اساس فیلد role یا بولی‌ها
     coach = ref = False
-    if _field_exists(UserProfile, ROLE_FIELD_NAME):
+    if sch.role_field == ROLE_FIELD_NAME:
         rv = getattr(up, ROLE_FIELD_NAME, "")
         coach = _has_role_val(rv, "coach")
         ref   = _has_role_val(rv, "referee")
@@ -1120,26 +865,25 @@ def _clubs_list_for_profile(up):
         c = up.club
         names.add(getattr(c, "name", str(c)))
     # چند به چندهای رایج
-    for m in ("coaching_clubs","clubs","related_clubs","managed_clubs"):
-        try:
-            rel = getattr(up, m, None)
-            if rel and hasattr(rel, "all"):
-                for c in rel.all():
-                    names.add(getattr(c, "name", str(c)))
-        except Exception:
-            continue
+    for m in get_schema().club_m2m_fields:
+        for c in getattr(up, m).all():
+            names.add(getattr(c, "name", str(c)))
     return "، ".join([n for n in names if n]) or ""
 
-# --- جدید: شمارش بازیکنانِ این مربی (اگر مربی است) ---
-def _players_count_for_person(up_id: int) -> int:
-    try:
-        qs = _students_qs_by_user_coach(up_id)
-        return qs.count()
-    except Exception:
-        return 0
-def board_coaches_referees(board_id=None, role=None, club_id=None, national_code=None):
-
-    from accounts.models import UserProfile
+# --- جدید: شمارش بازیکنانِ هر مربی (اگر مربی است) به‌صورت Subquery ---
+def _students_count_subquery(UserProfile):
+    q = _coach_link_q(UserProfile, OuterRef("pk"))
+    if not q:
+        return Value(0)
+    return Coalesce(Subquery(
+        UserProfile.objects.filter(q).order_by()
+        .annotate(_c=Func(F("pk"), function="COUNT")).values("_c")[:1],
+        output_field=IntegerField(),
+    ), 0)
+def board_coaches_referees_qs(board_id=None, role=None, club_id=None, national_code=None):
+    """QuerySet مربی‌ها/داورهای یک هیئت یا باشگاه (با آمار) برای جدول و خروجی‌ها."""
+    sch = get_schema()
+    UserProfile = sch.UserProfile
 
     # 1) مبنا: UserProfile
     base_qs = UserProfile.objects.all()
@@ -1147,16 +891,16 @@ def board_coaches_referees(board_id=None, role=None, club_id=None, national_code
     # فیلتر براساس باشگاه/هیئت
     if club_id:
         # مستقیم club_id روی پروفایل
-        if _field_exists(UserProfile, "club"):
+        if sch.has_club_fk:
             base_qs = base_qs.filter(club_id=club_id)
         else:
             # fallback اگر رابطه غیرمستقیم باشد
-            base_qs = base_qs.filter(club__id=club_id) if _field_exists(UserProfile, "club") else base_qs.none()
+            base_qs = base_qs.filter(club__id=club_id) if sch.has_club_fk else base_qs.none()
     elif board_id:
         # الف) اگر خود پروفایل فیلد board دارد
-        bfield = _board_field_name(UserProfile)
+        bfield = sch.board_field
         if bfield:
-            if "__" in bfield or getattr(UserProfile._meta.get_field(bfield), "many_to_many", False):
+            if sch.board_field_is_m2m:
                 base_qs = base_qs.filter(**{f"{bfield}__id": board_id})
             else:
                 base_qs = base_qs.filter(**{f"{bfield}_id": board_id})
@@ -1166,7 +910,7 @@ def board_coaches_referees(board_id=None, role=None, club_id=None, national_code
             if cqs is not None:
                 club_ids = list(cqs.values_list("id", flat=True))
                 if club_ids:
-                    if _field_exists(UserProfile, "club"):
+                    if sch.has_club_fk:
                         base_qs = base_qs.filter(club_id__in=club_ids)
                     else:
                         try:
@@ -1183,7 +927,7 @@ def board_coaches_referees(board_id=None, role=None, club_id=None, national_code
 
     # 2) فیلتر نقش (coach/referee)
     # اگر فیلد نقش داری:
-    if _field_exists(UserProfile, ROLE_FIELD_NAME):
+    if sch.role_field == ROLE_FIELD_NAME:
         rq = Q()
         if not role:
             for v in set(ROLE_VALUES["coach"])|set(ROLE_VALUES["referee"]):
@@ -1195,81 +939,63 @@ def board_coaches_referees(board_id=None, role=None, club_id=None, national_code
     else:
         # fallback: فیلدهای boolean
         if role == "coach":
-            if _field_exists(UserProfile, "is_coach"):
+            if "is_coach" in sch.flag_fields:
                 base_qs = base_qs.filter(is_coach=True)
         elif role == "referee":
-            if _field_exists(UserProfile, "is_referee"):
+            if "is_referee" in sch.flag_fields:
                 base_qs = base_qs.filter(is_referee=True)
         else:
             # هرکدام که در دسترس‌اند
             q = Q()
-            if _field_exists(UserProfile, "is_coach"): q |= Q(is_coach=True)
-            if _field_exists(UserProfile, "is_referee"): q |= Q(is_referee=True)
+            if "is_coach" in sch.flag_fields: q |= Q(is_coach=True)
+            if "is_referee" in sch.flag_fields: q |= Q(is_referee=True)
             base_qs = base_qs.filter(q) if q else base_qs.none()
 
     # 3) فیلتر کد ملی (اختیاری)
     if national_code:
-        for cand in ("national_code","nid","national_id"):
-            if _field_exists(UserProfile, cand):
-                base_qs = base_qs.filter(**{f"{cand}__iexact": national_code})
-                break
+        if sch.national_code_field:
+            base_qs = base_qs.filter(**{f"{sch.national_code_field}__iexact": national_code})
 
     # 4) آماده‌سازی فیلدهای نام، تماس، باشگاه/هیئت
-    created_field = _created_or_approved_field(UserProfile)
-    base_qs = base_qs.select_related("club").order_by("last_name", "first_name", "id")
-
-    rows = []
-    for p in base_qs:
-        fname = getattr(p, "first_name", "") or ""
-        lname = getattr(p, "last_name", "") or ""
-        full_name = (fname + " " + lname).strip() or getattr(p, "name", "") or str(p)
-
-        role_label = _role_combo(p, UserProfile)  # 👈 ترکیبی
-        nid = next((getattr(p, cand) for cand in ("national_code", "nid", "national_id") if getattr(p, cand, None)), "")
-        phone = ""
-        for cand in ("phone", "mobile", "phone_number", "cellphone"):
-            if getattr(p, cand, None): phone = getattr(p, cand); break
-
-        club_names = _clubs_list_for_profile(p)  # 👈 همه باشگاه‌ها
-
-        joined = getattr(p, created_field, None) if created_field else None
-        joined_jalali = ""
-        if joined and _HAS_JDATETIME:
-            try:
-                d = joined.date() if isinstance(joined, _dt.datetime) else joined
-                j = jdatetime.date.fromgregorian(date=d)
-                joined_jalali = f"{j.year:04d}/{j.month:02d}/{j.day:02d}"
-            except Exception:
-                pass
+    return annotate_player_stats(
+        base_qs.select_related("club").prefetch_related(*sch.club_m2m_fields)
+    ).annotate(_players_count=_students_count_subquery(UserProfile)).order_by("last_name", "first_name", "id")
 
-        # تعداد بازیکنان شخص (اگر مربی نباشد احتمالاً 0 می‌ماند)
-        players_count = _players_count_for_person(p.id)
 
-        g = s = b = 0
-        try:
-            g, s, b = _medals_for_player(p.id)
-        except Exception:
-            pass
-        r_comp, r_total = _rankings_for_player(p.id)
-
-        rows.append({
-            "full_name": full_name,
-            "role_label": role_label,
-            "national_code": nid or "",
-            "phone": phone or "",
-            "club_name": club_names,  # 👈 لیستی
-            "players_count": players_count,  # 👈 جایگزین ستون هیئت
-            "joined_jalali": joined_jalali or "",
-            "medal_gold": g, "medal_silver": s, "medal_bronze": b,
-            "rank_total": r_total or 0,
-        })
+def board_coach_referee_row(p):
+    sch = get_schema()
+    fname = getattr(p, "first_name", "") or ""
+    lname = getattr(p, "last_name", "") or ""
+    full_name = (fname + " " + lname).strip() or getattr(p, "name", "") or str(p)
+
+    created_field = sch.created_or_approved_field
+    joined = getattr(p, created_field, None) if created_field else None
+    joined_jalali = jalali_str(joined) or ""
+
+    _, g, s, b, r_comp, r_total = _player_stats(p)
 
     return {
-        "rows": rows,
+        "full_name": full_name,
+        "role_label": _role_combo(p, sch),  # 👈 ترکیبی
+        "national_code": _attr(p, sch.national_code_field),
+        "phone": _attr(p, sch.phone_field),
+        "club_name": _clubs_list_for_profile(p),  # 👈 همه باشگاه‌ها
+        "players_count": p._players_count,  # 👈 جایگزین ستون هیئت
+        "joined_jalali": joined_jalali,
+        "medal_gold": g, "medal_silver": s, "medal_bronze": b,
+        "rank_total": r_total or 0,
+    }
+
+
+def board_coaches_referees(board_id=None, role=None, club_id=None, national_code=None):
+    qs = board_coaches_referees_qs(board_id, role, club_id, national_code)
+    return {
+        "rows": [board_coach_referee_row(p) for p in qs],
         "filters_applied": {
             "board_id": board_id,
             "club_id": club_id,
             "role": role or "",
             "national_code": national_code,
         }
-    }
\ No newline at end of file
+    }
+
@@ -1,3 +1,256 @@
+import csv
+import io
+import zipfile
+from datetime import date, datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import DateField, Value
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
 from django.test import TestCase
+from django.db.models.options import Options
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import TkdBoard, TkdClub, UserProfile
+from competitions.models import (
+    AgeCategory, BeltGroup, Enrollment, KyorugiCompetition, KyorugiResult,
+    RankingTransaction, Seminar, SeminarRegistration, WeightCategory,
+)
+from competitions.services.player_stats_service import refresh_player_stats
+from reports import exports, services
+from reports.schema import get_schema
+
+
+class ReportTestBase(TestCase):
+    def setUp(self):
+        self.board = TkdBoard.objects.create(name="هیئت", province="-", city="-")
+        self.club = TkdClub.objects.create(
+            club_name="باشگاه", founder_name="-", founder_national_code="1", founder_phone="09120000000",
+            province="-", county="-", city="-", tkd_board=self.board, license_number="1",
+            federation_id="1", club_type="private", phone="0380000000", address="-",
+        )
+        age = AgeCategory.objects.create(name="بزرگسالان", from_date=date(1990, 1, 1), to_date=date(2005, 1, 1))
+        self.comp = KyorugiCompetition.objects.create(
+            title="جام", age_category=age, belt_level="all", gender="male", city="-", address="-",
+            registration_start=date(2025, 1, 1), registration_end=date(2025, 1, 10),
+            weigh_date=date(2025, 1, 11), draw_date=date(2025, 1, 12), competition_date=date(2025, 1, 13),
+        )
+        self.bg = BeltGroup.objects.create(label="گروه")
+        self.wc = WeightCategory.objects.create(name="-54", gender="male", min_weight=50, max_weight=54)
+        self.result = KyorugiResult.objects.create(competition=self.comp, weight_category=self.wc)
+        self._n = 0
+
+    def _profile(self, **kw):
+        self._n += 1
+        defaults = dict(
+            first_name=f"نفر{self._n}", last_name="تست", father_name="-",
+            national_code=f"{self._n:010d}", birth_date="1380/01/01", gender="male",
+            phone=f"09{self._n:09d}", address="-", province="-", county="-", city="-",
+            belt_grade="سبز", belt_certificate_number="1", belt_certificate_date="1400/01/01",
+            tkd_board=self.board, club=self.club,
+        )
+        defaults.update(kw)
+        return UserProfile.objects.create(**defaults)
+
+    def _students(self, coach, count):
+        players = [self._profile(coach=coach) for _ in range(count)]
+        for p in players:
+            for medal in ("gold", ""):
+                Enrollment.objects.create(
+                    competition=self.comp, player=p, coach=coach, belt_group=self.bg, weight_category=self.wc,
+                    declared_weight=52, insurance_number="1", insurance_issue_date=date(2025, 1, 1),
+                    status="paid", medal=medal,
+                )
+            RankingTransaction.objects.create(
+                competition=self.comp, result=self.result, subject_type="player",
+                subject_id=p.id, medal="gold", points=3.0,
+            )
+        refresh_player_stats(p.id for p in players)
+        return players
+
+    def _queries(self, fn, **kw):
+        with CaptureQueriesContext(connection) as ctx:
+            out = fn(**kw)
+        return out, len(ctx.captured_queries)
+
+
+class StudentReportQueryTests(ReportTestBase):
+    def test_student_reports_use_constant_queries(self):
+        small_coach = self._profile(role="coach", is_coach=True)
+        large_coach = self._profile(role="coach", is_coach=True)
+        self._students(small_coach, 2)
+        self._students(large_coach, 25)
+
+        small, q_small = self._queries(services.coach_students, coach_id=small_coach.id)
+        large, q_large = self._queries(services.coach_students, coach_id=large_coach.id)
+        self.assertEqual(len(small["rows"]), 2)
+        self.assertEqual(len(large["rows"]), 25)
+        self.assertEqual(q_small, q_large)
+
+        for fn, kw in (
+            (services.club_students, {"club_id": self.club.id}),
+            (services.board_students, {"board_id": self.board.id}),
+            (services.board_coaches_referees, {"board_id": self.board.id}),
+        ):
+            _, q = self._queries(fn, **kw)
+            self.assertLessEqual(q, 5, fn.__name__)
+
+    def test_student_row_stats(self):
+        coach = self._profile(role="coach", is_coach=True)
+        self._students(coach, 3)
+
+        row = services.coach_students(coach_id=coach.id)["rows"][0]
+        self.assertEqual(row["competitions"], 1)   # دو ثبت‌نام در یک مسابقه
+        self.assertEqual((row["medal_gold"], row["medal_silver"], row["medal_bronze"]), (1, 0, 0))
+        self.assertEqual((row["rank_comp"], row["rank_total"]), (3.0, 3.0))
+
+        coaches = services.board_coaches_referees(board_id=self.board.id)["rows"]
+        self.assertEqual([r["players_count"] for r in coaches], [3])
+
+    def test_national_code_filter_is_exact(self):
+        target = self._profile(national_code="0912345678")
+        self._profile(phone="09123456789")
+        self._profile(first_name="0912345678")
+        self._profile(national_code="0912345679")
+        rows = services.board_students(board_id=self.board.id, national_code="0912345678")["rows"]
+        self.assertEqual([r["national_code"] for r in rows], [target.national_code])
+        self.assertEqual(services.board_students(board_id=self.board.id, national_code="091234")["rows"], [])
+
+    def test_schema_resolves_profile_fields(self):
+        sch = get_schema()
+        self.assertIs(sch.UserProfile, UserProfile)
+        self.assertIs(sch.Club, TkdClub)
+        self.assertEqual(sch.role_field, "role")
+        self.assertEqual(sch.national_code_field, "national_code")
+        self.assertEqual(sch.club_board_field, "tkd_board")
+        self.assertIn("coach", sch.coach_fields)
+
+    def test_rows_do_not_introspect_models(self):
+        small_coach = self._profile(role="coach", is_coach=True)
+        large_coach = self._profile(role="coach", is_coach=True)
+        self._students(small_coach, 2)
+        self._students(large_coach, 25)
+
+        # گرم‌کردن cached_property های داخلی جنگو
+        services.coach_students(coach_id=small_coach.id)
+        services.board_coaches_referees(board_id=self.board.id)
+        calls = []
+        for coach in (small_coach, large_coach):
+            with mock.patch.object(Options, "get_field", autospec=True, side_effect=Options.get_field) as m:
+                services.coach_students(coach_id=coach.id)
+                services.board_coaches_referees(board_id=self.board.id)
+            calls.append(m.call_count)
+        self.assertEqual(calls[0], calls[1])
+
+
+class StreamingExportTests(ReportTestBase):
+    def _body(self, response):
+        self.assertIsInstance(response, StreamingHttpResponse)
+        return b"".join(response.streaming_content)
+
+    def test_csv_export_streams_every_row(self):
+        coach = self._profile(role="coach", is_coach=True)
+        self._students(coach, 30)
+
+        with mock.patch.object(exports, "EXPORT_CHUNK_SIZE", 7):
+            body = self._body(exports.streaming_export("coach_students", "csv", coach_id=coach.id))
+        rows = list(csv.reader(io.StringIO(body.decode("utf-8-sig"))))
+        self.assertEqual(rows[0][0], "نام و نام‌خانوادگی")
+        self.assertEqual(len(rows), 31)
+        self.assertEqual(rows[1][5:7], ["1", "1"])
+
+    def test_xlsx_export_is_valid_workbook(self):
+        coach = self._profile(role="coach", is_coach=True)
+        self._students(coach, 12)
+
+        body = self._body(exports.streaming_export("board_students", "xlsx", board_id=self.board.id))
+        with zipfile.ZipFile(io.BytesIO(body)) as zf:
+            self.assertIsNone(zf.testzip())
+            sheet = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+        self.assertEqual(sheet.count("<row>"), 13)
+        self.assertTrue(sheet.endswith("</worksheet>"))
+
+    def test_export_view_reads_page_filters(self):
+        coach = self._profile(role="coach", is_coach=True)
+        self._students(coach, 3)
+        staff = get_user_model().objects.create_user(username="staff", password="x", is_staff=True)
+        self.client.force_login(staff)
+
+        url = reverse("reports:export_table", args=["board_coaches_referees", "csv"])
+        response = self.client.get(url, {"cr-board": self.board.id}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(io.StringIO(self._body(response).decode("utf-8-sig"))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][5], "3")
+
+
+class SummaryReportTests(ReportTestBase):
+    def _paid(self, when, amount):
+        p = self._profile()
+        e = Enrollment.objects.create(
+            competition=self.comp, player=p, belt_group=self.bg, weight_category=self.wc,
+            declared_weight=52, insurance_number="1", insurance_issue_date=date(2025, 1, 1),
+        )
+        Enrollment.objects.filter(pk=e.pk).update(
+            is_paid=True, status="paid", paid_amount=amount,
+            paid_at=timezone.make_aware(when, timezone.get_current_timezone()),
+        )
+
+    def test_finance_summary_groups_by_jalali_month(self):
+        self._paid(datetime(2024, 3, 19, 23, 30), 1000)   # 1402/12/29 (ساعت تهران)
+        self._paid(datetime(2024, 3, 20, 10, 0), 2000)    # 1403/01/01
+        self._paid(datetime(2024, 3, 20, 23, 59), 3000)
+        self._paid(datetime(2024, 3, 21, 0, 1), 9999)     # خارج از بازه
+        seminar = Seminar.objects.create(
+            title="سمینار", registration_start=date(2024, 1, 1), registration_end=date(2024, 3, 1),
+            event_date=date(2024, 3, 25),
+        )
+        user = get_user_model().objects.create_user(username="u1", password="x")
+        SeminarRegistration.objects.create(
+            seminar=seminar, user=user, roles=["coach"], is_paid=True, paid_amount=500,
+            paid_at=timezone.make_aware(datetime(2024, 3, 20, 12, 0), timezone.get_current_timezone()),
+        )
+
+        res, q = self._queries(services.finance_summary, start=date(2024, 3, 19), end=date(2024, 3, 20))
+        self.assertEqual(q, 3)
+        self.assertEqual((res["enrollment_paid_count"], res["enrollment_paid_sum"]), (3, 6000))
+        self.assertEqual((res["seminar_paid_count"], res["seminar_paid_sum"]), (1, 500))
+        self.assertEqual((res["poomsae_paid_count"], res["poomsae_paid_sum"]), (0, 0))
+        self.assertEqual(res["total_paid_sum"], 6500)
+        self.assertEqual([r["jalali"] for r in res["by_day"]], ["1402/12/29", "1403/01/01"])
+        self.assertEqual(
+            [(m["jalali"], m["sum"], m.get("seminar_sum", 0)) for m in res["by_month"]],
+            [("1402/12", 1000, 0), ("1403/01", 5500, 500)],
+        )
+
+    def test_finance_summary_without_database_time_zones(self):
+        # MySQL بدون جدول‌های منطقهٔ زمانی: CONVERT_TZ → NULL
+        self._paid(datetime(2024, 3, 19, 23, 30), 1000)
+        self._paid(datetime(2024, 3, 20, 10, 0), 2000)
+        null_day = lambda expr: Value(None, output_field=DateField())
+        with mock.patch.object(services, "TruncDate", null_day):
+            res = services.finance_summary(date(2024, 3, 19), date(2024, 3, 20))
+        self.assertEqual((res["enrollment_paid_count"], res["total_paid_sum"]), (2, 3000))
+        self.assertEqual([r["jalali"] for r in res["by_day"]], ["1402/12/29", "1403/01/01"])
+        self.assertEqual([(m["jalali"], m["sum"]) for m in res["by_month"]], [("1402/12", 1000), ("1403/01", 2000)])
+
+    def test_competitions_summary(self):
+        coach = self._profile(role="coach", is_coach=True)
+        self._students(coach, 2)    # هر شاگرد دو ثبت‌نام
+
+        res = services.competitions_summary(date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(res["total"], 1)
+        self.assertEqual(res["by_status"], [{"key": "finished", "status": "برگزار شده", "c": 1}])
+        self.assertEqual(res["top_by_enroll"], [{"competition": "جام", "count": 4}])
 
-# Create your tests here.
+    def test_summary_pages_render(self):
+        staff = get_user_model().objects.create_user(username="staff", password="x", is_staff=True)
+        self.client.force_login(staff)
+        for name in ("reports:competitions", "reports:finance"):
+            self.assertEqual(self.client.get(reverse(name), secure=True).status_code, 200, name)
+        for kind in ("competitions", "finance"):
+            url = reverse("reports:export_csv", args=[kind])
+            self.assertEqual(self.client.get(url, secure=True).status_code, 200, kind)
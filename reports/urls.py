@@ -9,4 +9,5 @@ urlpatterns = [
     path("competitions/", views.competitions_report, name="competitions"),
     path("finance/", views.finance_report, name="finance"),
     path("export/<str:kind>/", views.export_csv, name="export_csv"),
+    path("export/table/<str:kind>.<str:fmt>", views.export_table, name="export_table"),
 ]
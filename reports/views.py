@@ -10,6 +10,7 @@ from django.shortcuts import render, redirect
 from .forms import DateRangeForm, CoachStudentsForm, ClubStudentsForm, BoardStudentsForm
 from .forms import BoardCoachesRefereesForm   # ← جدید
 from . import services
+from .exports import FORMATS, streaming_export
 
 
 def _admin_ctx(request):
@@ -197,7 +198,7 @@ def export_csv(request, kind: str):
         response["Content-Disposition"] = 'attachment; filename="competitions_report.csv"'
         w = csv.writer(response)
         w.writerow(["from", "to", "total"])
-        w.writerow([res["start"], res["end"]])
+        w.writerow([res["start"], res["end"], res["total"]])
         w.writerow([])
         w.writerow(["status", "count"])
         for row in res["by_status"]:
@@ -221,6 +222,67 @@ def export_csv(request, kind: str):
         w.writerow(["enrollment_paid_sum",  res["enrollment_paid_sum"]])
         w.writerow(["seminar_paid_count",   res["seminar_paid_count"]])
         w.writerow(["seminar_paid_sum",     res["seminar_paid_sum"]])
+        w.writerow(["poomsae_paid_count",   res["poomsae_paid_count"]])
+        w.writerow(["poomsae_paid_sum",     res["poomsae_paid_sum"]])
+        w.writerow([])
+        w.writerow(["month", "enrollment_sum", "poomsae_sum", "seminar_sum", "total_sum", "count"])
+        for row in res["by_month"]:
+            w.writerow([row["jalali"], row.get("enrollment_sum", 0), row.get("poomsae_sum", 0),
+                        row.get("seminar_sum", 0), row["sum"], row["count"]])
         return response
 
     return redirect("reports:center")
+
+
+# ---------- خروجی جریانی جدول‌های گزارش کاربران (CSV/XLSX) ----------
+def _coach_students_filters(cd):
+    club = cd.get("club")
+    return dict(
+        coach_id=getattr(cd.get("coach"), "id", None),
+        belt_id=cd.get("belt"),
+        club_id=getattr(club, "id", None),
+        national_code=cd.get("national_code") or None,
+    )
+
+def _club_students_filters(cd):
+    return dict(
+        club_id=getattr(cd.get("club"), "id", None),
+        belt_id=cd.get("belt"),
+        coach_id=getattr(cd.get("coach"), "id", None),
+        national_code=cd.get("national_code") or None,
+    )
+
+def _board_students_filters(cd):
+    return dict(
+        board_id=getattr(cd.get("board"), "id", None),
+        belt_id=cd.get("belt"),
+        coach_id=getattr(cd.get("coach"), "id", None),
+        club_id=getattr(cd.get("club"), "id", None),
+        national_code=cd.get("national_code") or None,
+    )
+
+def _board_coaches_referees_filters(cd):
+    return dict(
+        board_id=getattr(cd.get("board"), "id", None),
+        role=cd.get("role") or None,
+        club_id=getattr(cd.get("club"), "id", None),
+        national_code=cd.get("national_code") or None,
+    )
+
+# kind → (فرم، prefix همان فرم در صفحهٔ گزارش کاربران، تبدیل cleaned_data به فیلترهای سرویس)
+EXPORT_FORMS = {
+    "coach_students":         (CoachStudentsForm,        "cs", _coach_students_filters),
+    "club_students":          (ClubStudentsForm,         "cl", _club_students_filters),
+    "board_students":         (BoardStudentsForm,        "bd", _board_students_filters),
+    "board_coaches_referees": (BoardCoachesRefereesForm, "cr", _board_coaches_referees_filters),
+}
+
+@staff_member_required
+def export_table(request, kind: str, fmt: str):
+    if kind not in EXPORT_FORMS or fmt not in FORMATS:
+        return redirect("reports:users")
+    form_cls, prefix, to_filters = EXPORT_FORMS[kind]
+    form = form_cls(request.GET or None, prefix=prefix)
+    if not form.is_valid():
+        return redirect("reports:users")
+    return streaming_export(kind, fmt, **to_filters(form.cleaned_data))
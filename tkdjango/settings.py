@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -162,6 +163,21 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# ───────────── Cache ─────────────
+# کش مشترک بین workerها (پیش‌فرض: فایل در پوشهٔ موقت سیستم)؛ با CACHE_BACKEND قابل تغییر است.
+CACHES = {
+    "default": {
+        "BACKEND": env_str("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": env_str("CACHE_LOCATION", os.path.join(tempfile.gettempdir(), "tkdchb-cache")),
+    }
+}
+# سند آمادهٔ جدول عمومی؛ با هر تغییر باطل می‌شود، این فقط سقف عمر آن است.
+BRACKET_CACHE_TIMEOUT = env_int("BRACKET_CACHE_TIMEOUT", 24 * 3600)
+# شمارنده‌های داشبورد باشگاه/هیئت؛ با تأیید پروفایل و ثبت نتیجه باطل می‌شوند.
+DASHBOARD_CACHE_TIMEOUT = env_int("DASHBOARD_CACHE_TIMEOUT", 120)
+# پروفایل شرایط ثبت‌نام هر مسابقه (کمربند/سن/وزن)؛ با تغییر قواعد مسابقه باطل می‌شود.
+ELIGIBILITY_CACHE_TIMEOUT = env_int("ELIGIBILITY_CACHE_TIMEOUT", 24 * 3600)
+
 # ───────────── Jalali ─────────────
 JALALI_DATE_DEFAULTS = {
     "Strftime": {"date": "%Y/%m/%d", "datetime": "%Y/%m/%d _ %H:%M:%S"}
@@ -296,6 +312,21 @@ BANK_GATEWAYS = {
     "CALLBACK_URL": PAY_CALLBACK_URL,
 }
 
+# ───────────── Draw / pair history retention ─────────────
+# اجرای روزانهٔ `manage.py cleanup_pair_history` (cron) با این تنظیمات؛ مسیر قرعه‌کشی دیگر پاک‌سازی نمی‌کند.
+PAIR_HISTORY_RETENTION = {
+    "MODE": env_str("PAIR_HISTORY_RETENTION_MODE", "persian_year"),  # persian_year | months
+    "MONTHS": env_int("PAIR_HISTORY_RETENTION_MONTHS", 12),
+    "KEEP_LAST": env_int("PAIR_HISTORY_KEEP_LAST", 5),
+}
+
+# ───────────── Match schedule ─────────────
+# زمان تخمینی هر مسابقه = تاریخ برگزاری + START_TIME + (شماره روی زمین − ۱) × MATCH_MINUTES
+MATCH_SCHEDULE = {
+    "START_TIME": env_str("MATCH_SCHEDULE_START_TIME", "09:00"),
+    "MATCH_MINUTES": env_int("MATCH_SCHEDULE_MATCH_MINUTES", 8),
+}
+
 # ───────────── SMS (Melipayamak) ─────────────
 POOMSAE_ALLOW_TEST_REG = env_bool("POOMSAE_ALLOW_TEST_REG", True)
 SMS_DRY_RUN = env_bool("SMS_DRY_RUN", False)